@@ -1,9 +1,11 @@
 import streamlit as st
 import requests
 import os
+import json
 from requests.exceptions import ConnectionError, Timeout
 import subprocess
 import threading
+import time
 
 def run_backend():
     subprocess.Popen(["uvicorn", "backend.main:app", "--host", "0.0.0.0", "--port", "8000"])
@@ -19,10 +21,80 @@ st.caption("Upload a PDF, ask a question, and the backend will decide which agen
 with st.sidebar:
     st.header("Settings")
     backend = st.text_input("Backend URL", BACKEND_URL)
+    stream_answer = st.checkbox("Stream answer", value=True)
     if st.button("Reconnect"):
         st.experimental_rerun()
 
 
+def iter_sse(resp):
+    """Yield (event, data) pairs from a server-sent events response."""
+    event, data = None, []
+    for line in resp.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if event is not None:
+                yield event, json.loads("\n".join(data))
+            event, data = None, []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def ask_streaming(backend, query, uploaded_pdf_path):
+    """Render the /ask/stream response progressively as tokens arrive."""
+    with requests.post(
+        f"{backend}/ask/stream",
+        json={"query": query, "uploaded_pdf_path": uploaded_pdf_path},
+        stream=True,
+        timeout=60,
+    ) as resp:
+        if resp.status_code != 200:
+            st.error(f"Backend error: {resp.status_code}")
+            st.text(resp.text)
+            return
+
+        st.subheader("Final Answer")
+        answer_box = st.empty()
+        meta_box = st.container()
+        answer = ""
+        agents = []
+        for event, data in iter_sse(resp):
+            if event == "decision":
+                with meta_box:
+                    st.subheader("Controller Rationale")
+                    st.write(data.get("rationale"))
+            elif event == "agent":
+                agents.append(f"{data['agent']} ({data['status']}, {data['wall_time_s']}s)")
+            elif event == "token":
+                answer += data.get("text", "")
+                answer_box.markdown(answer + "▌")
+            elif event == "done":
+                answer_box.markdown(answer or "No answer received.")
+                st.subheader("Agents Used")
+                st.write(data.get("agents_used") or agents)
+                st.subheader("Trace")
+                st.code(data.get("trace_id"))
+
+
+def wait_for_indexing(backend, job_id, timeout_s=600):
+    """Poll /jobs/{job_id} until the uploaded PDF is indexed; returns an error message, or None once it is."""
+    deadline = time.time() + timeout_s
+    with st.spinner("Indexing the uploaded PDF..."):
+        while time.time() < deadline:
+            resp = requests.get(f"{backend}/jobs/{job_id}", timeout=10)
+            if resp.status_code != 200:
+                return f"Could not get the indexing status ({resp.status_code})."
+            job = resp.json()
+            if job["status"] == "done":
+                return None
+            if job["status"] == "failed":
+                return job.get("error") or "Indexing failed."
+            time.sleep(1)
+    return "Timed out waiting for the PDF to be indexed."
+
+
 # Main UI
 uploaded_file = st.file_uploader(" Upload a PDF (optional)", type=["pdf"])
 
@@ -51,6 +123,12 @@ if st.button("Ask"):
                 upload_json = upload_resp.json()
                 uploaded_pdf_path = upload_json.get("saved_path")
                 st.success(f" Uploaded `{uploaded_file.name}` successfully!")
+                # new PDFs are indexed in the background; already indexed duplicates come without a job
+                if upload_json.get("job_id"):
+                    error = wait_for_indexing(backend, upload_json["job_id"])
+                    if error:
+                        st.error(f" Indexing failed: {error}")
+                        st.stop()
             else:
                 st.error(f" Upload failed: {upload_resp.status_code}")
                 st.json(upload_resp.text)
@@ -67,6 +145,15 @@ if st.button("Ask"):
 
     st.info("Sending query to controller agent...")
 
+    if stream_answer:
+        try:
+            ask_streaming(backend, query, uploaded_pdf_path)
+        except (ConnectionError, Timeout):
+            st.error(" Could not connect to backend `/ask/stream`. Is it running?")
+        except Exception as e:
+            st.error(f" Error while querying backend: {e}")
+        st.stop()
+
     try:
         resp = requests.post(
             f"{backend}/ask",
@@ -85,8 +172,8 @@ if st.button("Ask"):
             st.subheader("Controller Rationale")
             st.write(out.get("rationale"))
 
-            st.subheader("Trace File")
-            st.code(out.get("trace_file"))
+            st.subheader("Trace")
+            st.code(out.get("trace_id"))
         else:
             st.error(f"Backend error: {resp.status_code}")
             st.text(resp.text)
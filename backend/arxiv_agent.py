@@ -1,44 +1,41 @@
 import arxiv
-from typing import Dict
+import asyncio
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from .utils.arxiv_store import ArxivStore
+from .utils.config import ARXIV_API_URL, ARXIV_STORE_PATH, ARXIV_CACHE_TTL_S, ARXIV_REFRESH_MAX, ARXIV_PAGE_SIZE
+from .utils.http_clients import get_async_client
+from .utils.lazy import Lazy
 from .utils.logger import append_log
-from .utils.llm_model import generate_summary
+from .utils.metrics import stage, count_cache
+from .utils.llm_model import generate_summary, agenerate_summary
 
+_ATOM = "{http://www.w3.org/2005/Atom}"
 
-def query_arxiv(query: str, max_results: int = 5) -> Dict:
-    """
-    Query ArXiv for recent papers related to a given topic.
-    Uses GROQ to summarize results into a readable paragraph.
-    """
-    append_log(f"ArXiv query: {query}")
+ARXIV_STORE = Lazy(lambda: ArxivStore(ARXIV_STORE_PATH), "arXiv store")
 
-    try:
-        search = arxiv.Search(
-            query=f"{query} OR {query} AI OR {query} research",
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.SubmittedDate
-        )
-
-        results = []
-        for r in search.results():
-            results.append({
-                "id": r.entry_id,
-                "title": r.title,
-                "summary": r.summary[:800],
-                "published": r.published.isoformat(),
-                "authors": [a.name for a in r.authors],
-                "pdf_url": r.pdf_url
-            })
-
-        append_log(f"ArXiv returned {len(results)} results for '{query}'.")
 
-        if not results:
-            return {"query": query, "source": "arxiv", "summary": "No relevant papers found."}
+def _make_client() -> arxiv.Client:
+    client = arxiv.Client(page_size=ARXIV_PAGE_SIZE)
+    client.query_url_format = ARXIV_API_URL + "?{}"
+    return client
+
 
-        paper_summaries = "\n".join(
-            [f"- {r['title']} ({r['published'][:10]}): {r['summary']}" for r in results[:max_results]]
-        )
+ARXIV_CLIENT = Lazy(_make_client, "arXiv client")
 
-        groq_prompt = f"""
+
+def _search_query(query: str) -> str:
+    return f"{query} OR {query} AI OR {query} research"
+
+
+def _summary_prompt(query: str, results: List[Dict], max_results: int) -> str:
+    paper_summaries = "\n".join(
+        [f"- {r['title']} ({r['published'][:10]}): {r['summary']}" for r in results[:max_results]]
+    )
+
+    return f"""
         You are an AI research assistant.
         The user asked for recent papers on: "{query}"
 
@@ -47,14 +44,162 @@ def query_arxiv(query: str, max_results: int = 5) -> Dict:
 
         Please summarize the main research trends, goals, and findings in 5-6 sentences.
         """
-        summary = generate_summary(groq_prompt)
 
-        return {
-            "query": query,
-            "source": "arxiv",
-            "summary": summary,
-            "results": results
+
+def _parse_atom(feed: str) -> List[Dict]:
+    """Parse an arXiv Atom feed into the same result dicts the arxiv client produces."""
+    results = []
+    for entry in ET.fromstring(feed).iter(f"{_ATOM}entry"):
+        published = entry.findtext(f"{_ATOM}published", "").replace("Z", "+00:00")
+        pdf_url = None
+        for link in entry.findall(f"{_ATOM}link"):
+            if link.get("title") == "pdf":
+                pdf_url = link.get("href")
+        results.append({
+            "id": entry.findtext(f"{_ATOM}id", ""),
+            "title": " ".join(entry.findtext(f"{_ATOM}title", "").split()),
+            "summary": " ".join(entry.findtext(f"{_ATOM}summary", "").split())[:800],
+            "published": datetime.fromisoformat(published).isoformat() if published else "",
+            "authors": [a.findtext(f"{_ATOM}name", "") for a in entry.findall(f"{_ATOM}author")],
+            "pdf_url": pdf_url
+        })
+    return results
+
+
+def _plan(store: ArxivStore, query: str, max_results: int) -> Tuple[str, Optional[Dict]]:
+    """
+    Decide how to serve a topic from the local store:
+      "hit"     - fetched recently enough, no API call
+      "refresh" - known topic past the TTL, fetch only submissions newer than the stored ones
+      "full"    - unknown topic (or more results requested than stored), regular API query
+    """
+    state = store.query_state(query)
+    if state is None or state["max_results"] < max_results:
+        return "full", state
+    if time.time() - state["fetched_at"] < ARXIV_CACHE_TTL_S:
+        return "hit", state
+    return ("refresh" if state["newest_published"] else "full"), state
+
+
+def _fetch(query: str, limit: int, newer_than: str = None) -> List[Dict]:
+    """Newest-first results from the arXiv client, stopping at the first already-known submission."""
+    search = arxiv.Search(
+        query=_search_query(query),
+        max_results=limit,
+        sort_by=arxiv.SortCriterion.SubmittedDate
+    )
+
+    results = []
+    for r in ARXIV_CLIENT.get().results(search):
+        paper = {
+            "id": r.entry_id,
+            "title": r.title,
+            "summary": r.summary[:800],
+            "published": r.published.isoformat(),
+            "authors": [a.name for a in r.authors],
+            "pdf_url": r.pdf_url
         }
+        if newer_than and paper["published"] <= newer_than:
+            break
+        results.append(paper)
+    return results
+
+
+async def _afetch(query: str, limit: int, newer_than: str = None) -> List[Dict]:
+    """Async _fetch over the Atom API, one page at a time."""
+    results = []
+    start = 0
+    while start < limit:
+        page = min(ARXIV_PAGE_SIZE, limit - start)
+        params = {
+            "search_query": _search_query(query),
+            "start": start,
+            "max_results": page,
+            "sortBy": "submittedDate",
+            "sortOrder": "descending",
+        }
+        resp = await get_async_client().get(ARXIV_API_URL, params=params, timeout=30)
+        resp.raise_for_status()
+        entries = _parse_atom(resp.text)
+        for paper in entries:
+            if newer_than and paper["published"] <= newer_than:
+                return results
+            results.append(paper)
+        if len(entries) < page:
+            break
+        start += page
+    return results
+
+
+def _no_results(query: str) -> Dict:
+    return {"query": query, "source": "arxiv", "summary": "No relevant papers found.", "results": []}
+
+
+def query_arxiv(query: str, max_results: int = 5, summarize: bool = False) -> Dict:
+    """
+    Query ArXiv for recent papers related to a given topic.
+    Results come from the local store when the topic was fetched recently; known
+    topics are refreshed with only newer submissions.
+    If summarize is set, GROQ summarizes the abstracts into a readable paragraph.
+    """
+    append_log(f"ArXiv query: {query}")
+
+    try:
+        store = ARXIV_STORE.get()
+        mode, state = _plan(store, query, max_results)
+        count_cache("arxiv", mode)
+        if mode == "full":
+            with stage("arxiv_api"):
+                papers = _fetch(query, max_results)
+            store.record(query, papers, max_results)
+        elif mode == "refresh":
+            with stage("arxiv_api"):
+                papers = _fetch(query, ARXIV_REFRESH_MAX, state["newest_published"])
+            store.record(query, papers)
+        results = store.results(query, max_results)
+
+        append_log(f"ArXiv returned {len(results)} results for '{query}' ({mode}).")
+
+        if not results:
+            return _no_results(query)
+
+        out = {"query": query, "source": "arxiv", "cache": mode, "results": results}
+        if summarize:
+            out["summary"] = generate_summary(_summary_prompt(query, results, max_results))
+        return out
+
+    except Exception as e:
+        append_log(f"ArXiv error: {e}")
+        return {"query": query, "source": "error", "summary": f"Error: {e}", "results": []}
+
+
+async def aquery_arxiv(query: str, max_results: int = 5, summarize: bool = False) -> Dict:
+    """Async variant of query_arxiv: reads the arXiv Atom API over the shared httpx client."""
+    append_log(f"ArXiv query: {query}")
+
+    try:
+        store = ARXIV_STORE.get()
+        mode, state = await asyncio.to_thread(_plan, store, query, max_results)
+        count_cache("arxiv", mode)
+        if mode == "full":
+            with stage("arxiv_api"):
+                papers = await _afetch(query, max_results)
+            await asyncio.to_thread(store.record, query, papers, max_results)
+        elif mode == "refresh":
+            with stage("arxiv_api"):
+                papers = await _afetch(query, ARXIV_REFRESH_MAX, state["newest_published"])
+            await asyncio.to_thread(store.record, query, papers)
+        results = await asyncio.to_thread(store.results, query, max_results)
+
+        append_log(f"ArXiv returned {len(results)} results for '{query}' ({mode}).")
+
+        if not results:
+            return _no_results(query)
+
+        out = {"query": query, "source": "arxiv", "cache": mode, "results": results}
+        if summarize:
+            out["summary"] = await agenerate_summary(_summary_prompt(query, results, max_results))
+        return out
 
     except Exception as e:
         append_log(f"ArXiv error: {e}")
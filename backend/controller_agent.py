@@ -1,9 +1,34 @@
-from typing import Dict, Any, List
-from .pdf_rag_agent import query_rag
-from .web_search_agent import web_search
-from .arxiv_agent import query_arxiv
-from .utils.logger import save_trace, append_log
-from .utils.config import LLM_PROVIDER
+import asyncio
+import contextvars
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Any, List, Callable, Optional, Tuple, Awaitable, AsyncIterator
+from .pdf_rag_agent import (
+    query_rag,
+    query_rag_batch,
+    hash_file,
+    find_document,
+    enqueue_ingest,
+    ensure_index,
+)
+from .web_search_agent import web_search, aweb_search
+from .arxiv_agent import query_arxiv, aquery_arxiv
+from .utils.llm_model import generate_summary, agenerate_summary, astream_summary
+from .utils.logger import append_log
+from .utils.metrics import stage, start_request, request_breakdown, count_request
+from .utils.trace_store import save_trace
+from .utils.config import (
+    LLM_PROVIDER,
+    AGENT_POOL_SIZE,
+    AGENT_TIMEOUT_S,
+    AGENT_TIMEOUTS,
+    BATCH_LLM_CONCURRENCY,
+    RAG_CONTEXT_TOKENS,
+    RAG_MMR_LAMBDA,
+    SAMPLE_PDFS_DIR,
+)
+from .utils.context_builder import build_context
 
 
 def simple_rule_router(user_input: str, uploaded_pdf: bool = False) -> Dict[str, Any]:
@@ -42,83 +67,416 @@ def simple_rule_router(user_input: str, uploaded_pdf: bool = False) -> Dict[str,
     return decision
 
 
-def handle_query(user_input: str, uploaded_pdf_path: str = None) -> Dict:
+def _rag_context(rag_res: Dict) -> Tuple[List[Dict], str, Dict]:
+    documents = [
+        {
+            "source": r["meta"]["source"],
+            "chunk_id": r["meta"]["chunk_id"],
+            "page_start": r["meta"].get("page_start"),
+            "page_end": r["meta"].get("page_end"),
+        }
+        for r in rag_res["results"]
+    ]
+    # context for LLM: merged, diverse passages within the token budget, ranked with the
+    # vectors retrieval already has (lexical retrieval has none: passages keep BM25 order);
+    # popped because rag_res is returned as JSON
+    query_vec, result_vecs = rag_res.pop("query_vec", None), rag_res.pop("result_vecs", None)
+    with stage("context_build"):
+        context, prompt = build_context(
+            query_vec, rag_res["results"], result_vecs, RAG_CONTEXT_TOKENS, RAG_MMR_LAMBDA
+        )
+    return documents, context, prompt
+
+
+def resolve_upload(uploaded_pdf_path: str) -> str:
     """
-    Main controller function — decides which agent(s) to call and combines their outputs.
+    Absolute path of a PDF saved by /upload_pdf. Any other path (outside the upload
+    directory, missing, not a PDF) raises ValueError with the same message, so
+    clients cannot use it to read or probe other files on the server.
+    """
+    root = Path(SAMPLE_PDFS_DIR).resolve()
+    path = Path(uploaded_pdf_path).resolve() if isinstance(uploaded_pdf_path, str) and uploaded_pdf_path else None
+    if path is None or root not in path.parents or path.suffix.lower() != ".pdf" or not path.is_file():
+        raise ValueError("uploaded_pdf_path must be a saved_path returned by /upload_pdf.")
+    return str(path)
+
+
+def _uploaded_doc(uploaded_pdf_path: str) -> Tuple[str, Optional[str]]:
+    """
+    Return (doc_id, job_id) for an uploaded PDF. job_id is None when the PDF is
+    already indexed; otherwise its ingestion is queued and the caller must not wait for it.
+    """
+    uploaded_pdf_path = resolve_upload(uploaded_pdf_path)
+    doc_id = hash_file(uploaded_pdf_path)
+    if find_document(doc_id) is not None:
+        return doc_id, None
+    return doc_id, enqueue_ingest(uploaded_pdf_path, doc_id=doc_id).id
+
+
+def _corpus_job() -> Optional[str]:
+    """Id of the job building the RAG corpus index, or None once the index exists."""
+    job = ensure_index()
+    return job.id if job is not None else None
+
+
+def _indexing_answer(job_id: str, what: str = "The uploaded PDF") -> str:
+    return f"{what} is still being indexed (job {job_id}). Please ask again in a moment."
+
+
+def _retrieve_pdf(user_input: str, uploaded_pdf_path: str) -> Dict:
+    # search only the uploaded PDF; if it is not indexed yet, queue it instead of waiting
+    doc_id, job_id = _uploaded_doc(uploaded_pdf_path)
+    if job_id is not None:
+        return {"query": user_input, "results": [], "indexing_job": job_id}
+    return query_rag(user_input, doc_id=doc_id)
+
+
+def _web_context(web: Dict) -> Tuple[List[Dict], str]:
+    documents = [
+        {"source": "web", "title": r.get("title"), "link": r.get("link")}
+        for r in web.get("results", [])[:3]
+    ]
+    # web search context for LLM
+    context_parts = []
+    for r in web.get("results", [])[:3]:
+        context_parts.append(f"[Web Result: {r.get('title')}]\n{r.get('snippet')}\nSource: {r.get('link')}\n")
+    return documents, "\n".join(context_parts)
+
+
+def _arxiv_result(arx: Dict) -> Dict:
+    documents = [{"source": "arxiv", "id": r.get("id")} for r in arx.get("results", [])[:3]]
+    arxiv_summary = "\n".join([f"- {r['title']} ({r['published']})" for r in arx.get("results", [])[:3]])
+    return {"output": arx, "documents": documents, "answer": "ArXiv Papers Found:\n" + arxiv_summary}
+
+
+def _run_pdf_rag(user_input: str, uploaded_pdf_path: str) -> Dict:
+    rag_res = _retrieve_pdf(user_input, uploaded_pdf_path)
+    if "indexing_job" in rag_res:
+        return {"output": rag_res, "documents": [], "answer": _indexing_answer(rag_res["indexing_job"])}
+    documents, context, prompt = _rag_context(rag_res)
+    summary = generate_summary(user_input, context=context)
+    return {"output": rag_res, "documents": documents, "prompt": prompt, "answer": summary}
+
+
+def _run_web_search(user_input: str, uploaded_pdf_path: str) -> Dict:
+    web = web_search(user_input)
+    documents, context = _web_context(web)
+    web_summary = generate_summary(user_input, context=context)
+    return {"output": web, "documents": documents, "answer": web_summary}
+
+
+def _run_arxiv(user_input: str, uploaded_pdf_path: str) -> Dict:
+    return _arxiv_result(query_arxiv(user_input))
+
+
+async def _aprepare_pdf_rag(user_input: str, uploaded_pdf_path: str) -> Dict:
+    # hashing and FAISS search are CPU-bound; keep them off the event loop
+    rag_res = await asyncio.to_thread(_retrieve_pdf, user_input, uploaded_pdf_path)
+    if "indexing_job" in rag_res:
+        return {"output": rag_res, "documents": [], "answer": _indexing_answer(rag_res["indexing_job"])}
+    documents, context, prompt = await asyncio.to_thread(_rag_context, rag_res)
+    return {"output": rag_res, "documents": documents, "prompt": prompt, "context": context}
+
+
+async def _aprepare_web_search(user_input: str, uploaded_pdf_path: str) -> Dict:
+    web = await aweb_search(user_input)
+    documents, context = _web_context(web)
+    return {"output": web, "documents": documents, "context": context}
+
+
+async def _aprepare_arxiv(user_input: str, uploaded_pdf_path: str) -> Dict:
+    return _arxiv_result(await aquery_arxiv(user_input))
+
+
+AGENT_RUNNERS: Dict[str, Callable[[str, Optional[str]], Dict]] = {
+    "pdf_rag": _run_pdf_rag,
+    "web_search": _run_web_search,
+    "arxiv": _run_arxiv,
+}
+
+# async agents run in two phases: retrieval ("prepare") returns either a final
+# "answer" or an LLM "context"; the answer is then generated or streamed
+ASYNC_AGENT_PREPARERS: Dict[str, Callable[[str, Optional[str]], Awaitable[Dict]]] = {
+    "pdf_rag": _aprepare_pdf_rag,
+    "web_search": _aprepare_web_search,
+    "arxiv": _aprepare_arxiv,
+}
+
+
+async def _aprepare(agent: str, user_input: str, uploaded_pdf_path: Optional[str]) -> Dict:
+    return await ASYNC_AGENT_PREPARERS[agent](user_input, uploaded_pdf_path)
+
+
+async def _arun_agent(agent: str, user_input: str, uploaded_pdf_path: Optional[str]) -> Dict:
+    res = await _aprepare(agent, user_input, uploaded_pdf_path)
+    if "answer" not in res:
+        res["answer"] = await agenerate_summary(user_input, context=res.pop("context"))
+    return res
+
+# shared across requests; bounds the number of agent calls in flight per process
+_AGENT_POOL = ThreadPoolExecutor(max_workers=AGENT_POOL_SIZE, thread_name_prefix="agent")
+
+
+def _selected(agents: List[str], uploaded_pdf_path: Optional[str]) -> List[str]:
+    return [a for a in agents if not (a == "pdf_rag" and uploaded_pdf_path is None)]
+
+
+def _timed(runner: Callable, user_input: str, uploaded_pdf_path: Optional[str]) -> Dict:
+    start = time.perf_counter()
+    try:
+        res = runner(user_input, uploaded_pdf_path)
+        res["status"] = "ok"
+    except Exception as e:
+        res = {"status": "error", "error": str(e)}
+    res["wall_time_s"] = round(time.perf_counter() - start, 3)
+    return res
+
+
+def run_agents(agents: List[str], user_input: str, uploaded_pdf_path: str = None) -> Dict[str, Dict]:
     """
-    uploaded_pdf = uploaded_pdf_path is not None
-    decision = simple_rule_router(user_input, uploaded_pdf=uploaded_pdf)
+    Run the selected agents concurrently. Each agent has its own deadline
+    (AGENT_TIMEOUTS, measured from fan-out start); an agent that misses it is
+    reported as "timeout" and the others' results are still returned.
+    """
+    start = time.perf_counter()
+    # copy the context so agent threads log under the caller's request id
+    futures = {
+        agent: _AGENT_POOL.submit(
+            contextvars.copy_context().run, _timed, AGENT_RUNNERS[agent], user_input, uploaded_pdf_path
+        )
+        for agent in _selected(agents, uploaded_pdf_path)
+    }
+
+    outcomes: Dict[str, Dict] = {}
+    for agent, fut in futures.items():
+        remaining = start + AGENT_TIMEOUTS.get(agent, AGENT_TIMEOUT_S) - time.perf_counter()
+        try:
+            outcomes[agent] = fut.result(timeout=max(0.0, remaining))
+        except FutureTimeout:
+            # the worker thread cannot be interrupted; its late result is discarded
+            outcomes[agent] = {"status": "timeout", "wall_time_s": round(time.perf_counter() - start, 3)}
+        if outcomes[agent]["status"] != "ok":
+            append_log(f"Agent {agent} {outcomes[agent]['status']} after {outcomes[agent]['wall_time_s']}s")
+    return outcomes
+
+
+async def _atimed(agent: str, fn: Callable, user_input: str, uploaded_pdf_path: Optional[str]) -> Dict:
+    start = time.perf_counter()
+    try:
+        res = await asyncio.wait_for(
+            fn(agent, user_input, uploaded_pdf_path),
+            timeout=AGENT_TIMEOUTS.get(agent, AGENT_TIMEOUT_S),
+        )
+        res["status"] = "ok"
+    except asyncio.TimeoutError:
+        res = {"status": "timeout"}
+    except Exception as e:
+        res = {"status": "error", "error": str(e)}
+    res["wall_time_s"] = round(time.perf_counter() - start, 3)
+    if res["status"] != "ok":
+        append_log(f"Agent {agent} {res['status']} after {res['wall_time_s']}s")
+    return res
+
+
+async def arun_agents(agents: List[str], user_input: str, uploaded_pdf_path: str = None) -> Dict[str, Dict]:
+    """Async run_agents: agents run as tasks on the event loop; a missed deadline cancels the agent."""
+    selected = _selected(agents, uploaded_pdf_path)
+    results = await asyncio.gather(*(_atimed(a, _arun_agent, user_input, uploaded_pdf_path) for a in selected))
+    return dict(zip(selected, results))
+
 
+def _finalize(user_input: str, uploaded_pdf_path: Optional[str], decision: Dict, outcomes: Dict[str, Dict]):
+    """Combine agent outcomes into the API response and the trace to save."""
     agents_called = {}
     documents_retrieved = []
     final_answer_parts: List[str] = []
+    agent_timings = {}
+    prompt_sizes = {}
 
-    for agent in decision["agents"]:
-        if agent == "pdf_rag" and uploaded_pdf:
-            rag_res = query_rag(user_input)
-            agents_called["pdf_rag"] = rag_res
-            for r in rag_res["results"]:
-                documents_retrieved.append({
-                    "source": r["meta"]["source"],
-                    "chunk_id": r["meta"]["chunk_id"]
-                })
-            # context for LLM
-            context_parts = []
-            for idx, r in enumerate(rag_res["results"][:3], 1):
-                context_parts.append(f"[Excerpt {idx} from {r['meta']['source']}]:\n{r['text']}\n")
-            context = "\n".join(context_parts)
-            
-            # LLM
-            from .utils.llm_model import generate_summary
-            summary = generate_summary(user_input, context=context)
-            final_answer_parts.append(summary)
-
-        elif agent == "web_search":
-            web = web_search(user_input)
-            agents_called["web_search"] = web
-            for r in web.get("results", [])[:3]:
-                documents_retrieved.append({
-                    "source": "web",
-                    "title": r.get("title"),
-                    "link": r.get("link")
-                })
-            # web search context for LLM
-            context_parts = []
-            for r in web.get("results", [])[:3]:
-                context_parts.append(f"[Web Result: {r.get('title')}]\n{r.get('snippet')}\nSource: {r.get('link')}\n")
-            context = "\n".join(context_parts)
-            
-            # response using LLM
-            from .utils.llm_model import generate_summary
-            web_summary = generate_summary(user_input, context=context)
-            final_answer_parts.append(web_summary)
-
-        elif agent == "arxiv":
-            arx = query_arxiv(user_input)
-            agents_called["arxiv"] = arx
-            for r in arx.get("results", [])[:3]:
-                documents_retrieved.append({
-                    "source": "arxiv",
-                    "id": r.get("id")
-                })
-            arxiv_summary = "\n".join([f"- {r['title']} ({r['published']})" for r in arx.get("results", [])[:3]])
-            final_answer_parts.append("ArXiv Papers Found:\n" + arxiv_summary)
+    for agent, res in outcomes.items():
+        agent_timings[agent] = {"status": res["status"], "wall_time_s": res["wall_time_s"]}
+        if "prompt" in res:
+            prompt_sizes[agent] = res["prompt"]
+        if res["status"] != "ok":
+            continue
+        agents_called[agent] = res["output"]
+        documents_retrieved.extend(res["documents"])
+        final_answer_parts.append(res["answer"])
 
     final_answer = "\n\n".join(final_answer_parts) if final_answer_parts else "No results found."
 
     trace = {
         "input": user_input,
-        "uploaded_pdf": uploaded_pdf_path if uploaded_pdf else None,
+        "uploaded_pdf": uploaded_pdf_path,
         "decision": decision,
         "agents_called": list(agents_called.keys()),
+        "agent_timings": agent_timings,
+        "prompt_sizes": prompt_sizes,
+        "stages": request_breakdown(),
         "documents_retrieved": documents_retrieved,
         "answer": final_answer
     }
-    trace_path = save_trace(trace)
-    append_log(f"Saved controller trace to {trace_path}")
-    return {
+    response = {
         "answer": final_answer,
         "agents_used": list(agents_called.keys()),
         "rationale": decision["rationale"],
-        "trace_file": trace_path
     }
+    return response, trace
+
+
+def _route(endpoint: str, user_input: str, uploaded_pdf_path: Optional[str]) -> Dict:
+    """Start the request's stage breakdown and pick the agents."""
+    start_request()
+    count_request(endpoint)
+    with stage("router"):
+        return simple_rule_router(user_input, uploaded_pdf=uploaded_pdf_path is not None)
+
+
+def _save(trace: Dict) -> str:
+    with stage("trace_save"):
+        trace_id = save_trace(trace)
+    append_log(f"Saved controller trace {trace_id}")
+    return trace_id
+
+
+def handle_query(user_input: str, uploaded_pdf_path: str = None) -> Dict:
+    """
+    Main controller function — decides which agent(s) to call and combines their outputs.
+    """
+    decision = _route("ask", user_input, uploaded_pdf_path)
+    outcomes = run_agents(decision["agents"], user_input, uploaded_pdf_path)
+    response, trace = _finalize(user_input, uploaded_pdf_path, decision, outcomes)
+    response["trace_id"] = _save(trace)
+    return response
+
+
+async def ahandle_query(user_input: str, uploaded_pdf_path: str = None) -> Dict:
+    """Non-blocking handle_query for async endpoints; network I/O uses the shared async client."""
+    decision = _route("ask", user_input, uploaded_pdf_path)
+    outcomes = await arun_agents(decision["agents"], user_input, uploaded_pdf_path)
+    response, trace = _finalize(user_input, uploaded_pdf_path, decision, outcomes)
+    response["trace_id"] = await asyncio.to_thread(_save, trace)
+    return response
+
+
+async def astream_query(user_input: str, uploaded_pdf_path: str = None) -> AsyncIterator[Dict]:
+    """
+    Streaming handle_query. Yields events in order: "decision", one "agent" event
+    per agent (metadata once its retrieval finishes), "token" events carrying answer
+    text as the LLM produces it, and finally "done" with the trace id.
+    Agent deadlines apply to retrieval; LLM tokens are forwarded as they arrive.
+    """
+    decision = _route("ask_stream", user_input, uploaded_pdf_path)
+    yield {"event": "decision", "data": {"agents": decision["agents"], "rationale": decision["rationale"]}}
+
+    selected = _selected(decision["agents"], uploaded_pdf_path)
+    prepared = await asyncio.gather(*(_atimed(a, _aprepare, user_input, uploaded_pdf_path) for a in selected))
+
+    outcomes: Dict[str, Dict] = {}
+    wrote_answer = False
+    for agent, res in zip(selected, prepared):
+        outcomes[agent] = res
+        yield {"event": "agent", "data": {
+            "agent": agent,
+            "status": res["status"],
+            "wall_time_s": res["wall_time_s"],
+            "documents": res.get("documents", []),
+        }}
+        if res["status"] != "ok":
+            continue
+
+        if wrote_answer:
+            yield {"event": "token", "data": {"text": "\n\n"}}
+        wrote_answer = True
+        if "answer" in res:
+            yield {"event": "token", "data": {"text": res["answer"]}}
+            continue
+        parts = []
+        async for token in astream_summary(user_input, context=res.pop("context")):
+            parts.append(token)
+            yield {"event": "token", "data": {"text": token}}
+        res["answer"] = "".join(parts)
+
+    response, trace = _finalize(user_input, uploaded_pdf_path, decision, outcomes)
+    if not wrote_answer:
+        yield {"event": "token", "data": {"text": response["answer"]}}
+    response["trace_id"] = await asyncio.to_thread(_save, trace)
+    yield {"event": "done", "data": {
+        "agents_used": response["agents_used"],
+        "trace_id": response["trace_id"],
+    }}
+
+
+async def astream_batch(queries: List[str], uploaded_pdf_path: str = None, top_k: int = 5,
+                        concurrency: int = None) -> AsyncIterator[Dict]:
+    """
+    Answer many questions against the RAG corpus (or one uploaded PDF).
+    Retrieval is vectorized (one encode + one FAISS search for the whole batch);
+    LLM calls run with bounded concurrency and items are yielded as they complete.
+    An item whose answer fails carries "error" instead of "answer". The last item is
+    {"done": True, "trace_id": ...}, with "error" if retrieval failed for the whole batch.
+    While the PDF or the corpus index is still being built, every item says so and
+    carries the "indexing_job" id instead of an answer from empty context.
+    """
+    start_request()
+    count_request("ask_batch")
+    doc_id = job_id = None
+    try:
+        if uploaded_pdf_path is not None:
+            doc_id, job_id = await asyncio.to_thread(_uploaded_doc, uploaded_pdf_path)
+        else:
+            job_id = await asyncio.to_thread(_corpus_job)
+        if job_id is None:
+            rag_results = await asyncio.to_thread(query_rag_batch, queries, top_k, doc_id=doc_id)
+    except Exception as e:
+        # the response is already streaming: report the failure as the final record
+        append_log(f"Batch retrieval failed: {e}")
+        yield {"done": True, "trace_id": None, "error": str(e)}
+        return
+    if job_id is not None:
+        note = _indexing_answer(job_id, "The uploaded PDF" if uploaded_pdf_path is not None else "The document index")
+        for i, q in enumerate(queries):
+            yield {"index": i, "query": q, "answer": note, "documents": [], "indexing_job": job_id}
+        yield {"done": True, "trace_id": None, "indexing_job": job_id}
+        return
+
+    sem = asyncio.Semaphore(concurrency or BATCH_LLM_CONCURRENCY)
+
+    async def answer(i: int, rag_res: Dict) -> Dict:
+        start = time.perf_counter()
+        try:
+            documents, context, prompt = await asyncio.to_thread(_rag_context, rag_res)
+            async with sem:
+                summary = await agenerate_summary(rag_res["query"], context=context)
+        except Exception as e:
+            append_log(f"Batch item {i} failed: {e}")
+            return {
+                "index": i,
+                "query": rag_res["query"],
+                "error": str(e),
+                "wall_time_s": round(time.perf_counter() - start, 3),
+            }
+        return {
+            "index": i,
+            "query": rag_res["query"],
+            "answer": summary,
+            "documents": documents,
+            "prompt": prompt,
+            "wall_time_s": round(time.perf_counter() - start, 3),
+        }
+
+    items = []
+    for task in asyncio.as_completed([answer(i, r) for i, r in enumerate(rag_results)]):
+        item = await task
+        items.append(item)
+        yield item
+
+    trace = {
+        "input": f"batch of {len(queries)} queries",
+        "uploaded_pdf": uploaded_pdf_path,
+        "decision": {"agents": ["pdf_rag"], "rationale": "Batch question answering over RAG."},
+        "agents_called": ["pdf_rag"],
+        "items": sorted(items, key=lambda it: it["index"]),
+        "stages": request_breakdown(),
+    }
+    yield {"done": True, "trace_id": await asyncio.to_thread(_save, trace)}
@@ -1,25 +1,72 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from pathlib import Path
-import uuid
+import json
+import re
+import threading
 import os
 import shutil
 import requests
 import arxiv
+from typing import List, Optional
 
-from .controller_agent import handle_query
+from .controller_agent import ahandle_query, astream_query, astream_batch, resolve_upload
+from .pdf_rag_agent import (
+    INDEX_REGISTRY,
+    INGEST_JOBS,
+    EMB_MODEL,
+    get_emb_cache,
+    enqueue_ingest,
+    enqueue_rebuild,
+    enqueue_reshard,
+    find_document,
+    warm_up,
+)
 from .utils.config import (
     LOGS_DIR,
     SAMPLE_PDFS_DIR,
     MAX_PDF_SIZE_MB,
+    UPLOAD_CHUNK_BYTES,
     ALLOWED_UPLOAD_EXTENSIONS,
     SERPAPI_KEY,
     GROQ_API_KEY,
+    GROQ_BASE_URL,
+    SERPAPI_BASE_URL,
+    WARMUP_ON_STARTUP,
+    MAX_BATCH_SIZE,
 )
-from .utils.logger import append_log
+from .utils.http_clients import aclose_clients
+from .utils.multipart_upload import UploadTooLarge, receive_file
+from .utils.trace_store import TRACE_STORE
+from .utils.metrics import render as render_metrics
+from .utils.llm_model import RESPONSE_CACHE
+from .web_search_agent import WEB_CACHE
+from .arxiv_agent import ARXIV_CLIENT, ARXIV_STORE
+from .utils.logger import append_log, flush_logs, new_request_id, set_request_id, REQUEST_ID
+
+
+def _warm_up():
+    try:
+        warm_up()
+        append_log("Background warm-up finished.")
+    except Exception as e:
+        append_log(f"Background warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # heavy resources load lazily; optionally start loading them now without blocking startup
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    yield
+    await aclose_clients()
+    flush_logs()
+
 
-app = FastAPI(title="Multi-Agent Controller API")
+app = FastAPI(title="Multi-Agent Controller API", lifespan=lifespan)
 
 # CORS setup
 app.add_middleware(
@@ -30,6 +77,39 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def upload_size_middleware(request: Request, call_next):
+    """
+    Reject oversized uploads from Content-Length before the multipart body is read;
+    bodies without one (chunked) are cut off by the streaming parser in upload_pdf.
+    """
+    if request.url.path == "/upload_pdf":
+        length = request.headers.get("content-length")
+        # allow for the multipart framing around the file
+        if length and length.isdigit() and int(length) > MAX_PDF_SIZE_MB * 1024 * 1024 + 64 * 1024:
+            return JSONResponse({"detail": f"File too large. Max {MAX_PDF_SIZE_MB} MB."}, status_code=413)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag every log record and trace written while serving a request with its id."""
+    request_id = request.headers.get("X-Request-ID") or new_request_id()
+    token = set_request_id(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        REQUEST_ID.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.get("/health")
+def health():
+    """Liveness probe; `warm` tells whether the embedding model is already loaded."""
+    return {"status": "ok", "warm": EMB_MODEL.loaded}
+
+
 # Environment Check Endpoint
 @app.get("/check_env")
 def check_environment():
@@ -40,7 +120,7 @@ def check_environment():
     if GROQ_API_KEY:
         try:
             resp = requests.post(
-                "https://api.groq.com/openai/v1/models",
+                f"{GROQ_BASE_URL}/models",
                 headers={"Authorization": f"Bearer {GROQ_API_KEY}"},
                 timeout=10,
             )
@@ -56,9 +136,11 @@ def check_environment():
     # SerpAPI Check 
     if SERPAPI_KEY:
         try:
-            from serpapi import GoogleSearch
-            search = GoogleSearch({"q": "test", "api_key": SERPAPI_KEY})
-            res = search.get_dict()
+            res = requests.get(
+                f"{SERPAPI_BASE_URL}/search",
+                params={"engine": "google", "q": "test", "api_key": SERPAPI_KEY},
+                timeout=10,
+            ).json()
             if "organic_results" in res:
                 report["SerpAPI"] = " Working"
             else:
@@ -71,7 +153,7 @@ def check_environment():
     # ArXiv Check 
     try:
         search = arxiv.Search(query="AI", max_results=1)
-        if next(search.results(), None):
+        if next(ARXIV_CLIENT.get().results(search), None):
             report["ArXiv"] = " Working"
         else:
             report["ArXiv"] = " No results"
@@ -85,29 +167,158 @@ def check_environment():
 UPLOAD_DIR = Path(SAMPLE_PDFS_DIR)
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-@app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Handle PDF upload and store it in sample directory."""
-    suffix = Path(file.filename).suffix.lower()
-    if suffix not in ALLOWED_UPLOAD_EXTENSIONS:
-        raise HTTPException(status_code=400, detail="Invalid file type.")
-
-    contents = await file.read()
-    size_mb = len(contents) / (1024 * 1024)
-    if size_mb > MAX_PDF_SIZE_MB:
-        raise HTTPException(
-            status_code=400, detail=f"File too large. Max {MAX_PDF_SIZE_MB} MB."
+def _stored_upload(doc_id: str) -> Optional[Path]:
+    """A previously saved upload with this content hash (its name starts with the hash)."""
+    return next(UPLOAD_DIR.glob(f"{doc_id[:16]}_*"), None)
+
+
+_UPLOAD_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}},
+}}}}}
+
+
+@app.post("/upload_pdf", openapi_extra=_UPLOAD_BODY)
+async def upload_pdf(request: Request):
+    """
+    Handle PDF upload and store it in sample directory.
+    Stored files are named by content hash; a PDF that was uploaded before
+    resolves to the existing copy and index entry without being reprocessed,
+    or, while it is still being indexed, to the existing copy and its job.
+    New PDFs are indexed in the background; poll /jobs/{job_id} for progress.
+    The multipart body (field "file") is parsed as it arrives rather than spooled
+    by the framework, so an upload is cut off once it passes MAX_PDF_SIZE_MB.
+    """
+    try:
+        filename, tmp_path, doc_id, size = await receive_file(
+            request, "file", UPLOAD_DIR, MAX_PDF_SIZE_MB * 1024 * 1024, ALLOWED_UPLOAD_EXTENSIONS, UPLOAD_CHUNK_BYTES
         )
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"File too large. Max {MAX_PDF_SIZE_MB} MB.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = Path(filename).name
 
-    filename = f"{uuid.uuid4().hex}_{file.filename}"
-    saved_path = UPLOAD_DIR / filename
-    with open(saved_path, "wb") as f:
-        f.write(contents)
+    existing = await run_in_threadpool(find_document, doc_id)
+    if existing is not None and Path(existing["path"]).exists():
+        tmp_path.unlink()
+        append_log(f"Upload of {filename} matches indexed document {doc_id[:12]}; reusing {existing['path']}.")
+        return JSONResponse({
+            "status": "ok",
+            "filename": filename,
+            "saved_path": existing["path"],
+            "doc_id": doc_id,
+            "duplicate": True,
+        })
 
-    append_log(f"Saved uploaded PDF to {saved_path}")
-    return JSONResponse(
-        {"status": "ok", "filename": file.filename, "saved_path": str(saved_path)}
-    )
+    # no await from here to the save: concurrent uploads of the same content see each other's file
+    stored = _stored_upload(doc_id)
+    if stored is not None:
+        tmp_path.unlink()
+        # returns the ingest job already queued or running for this content, or queues one
+        job = enqueue_ingest(str(stored), doc_id=doc_id)
+        append_log(f"Upload of {filename} matches stored upload {stored.name}; indexing job {job.id}.")
+        return JSONResponse({
+            "status": "queued",
+            "filename": filename,
+            "saved_path": str(stored),
+            "doc_id": doc_id,
+            "duplicate": True,
+            "job_id": job.id,
+        })
+
+    saved_path = UPLOAD_DIR / f"{doc_id[:16]}_{filename}"
+    os.replace(tmp_path, saved_path)
+    append_log(f"Saved uploaded PDF to {saved_path} ({size} bytes)")
+
+    # embed only this document's chunks into the shared index, off the request path
+    job = enqueue_ingest(str(saved_path), doc_id=doc_id)
+    return JSONResponse({
+        "status": "queued",
+        "filename": filename,
+        "saved_path": str(saved_path),
+        "doc_id": doc_id,
+        "duplicate": False,
+        "job_id": job.id,
+    })
+
+
+# Background ingestion jobs
+@app.get("/jobs")
+def list_jobs(limit: int = 50):
+    """Most recent ingestion jobs, newest first."""
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000.")
+    return {"jobs": INGEST_JOBS.recent(limit), "counts": INGEST_JOBS.stats()}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status (queued, running, done, failed) and progress counters of an ingestion job."""
+    # jobs run in the worker process that queued them; others read the saved state
+    job = INGEST_JOBS.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _upload_path(payload: dict) -> Optional[str]:
+    """The payload's uploaded_pdf_path, checked to be a PDF saved by /upload_pdf (400 otherwise)."""
+    path = payload.get("uploaded_pdf_path")
+    if path is None:
+        return None
+    try:
+        return resolve_upload(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _int_field(payload: dict, name: str, default: Optional[int], low: int, high: int) -> Optional[int]:
+    """An integer payload field within [low, high] (400 otherwise); default when absent."""
+    value = payload.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        value = None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"{name} must be an integer.")
+    if not low <= value <= high:
+        raise HTTPException(status_code=400, detail=f"{name} must be between {low} and {high}.")
+    return value
+
+
+def _reindex_paths(pdf_paths) -> Optional[List[str]]:
+    """pdf_paths of /reindex, each required to be a PDF in the upload directory (400 otherwise)."""
+    if pdf_paths is None:
+        return None
+    if not isinstance(pdf_paths, list) or not pdf_paths:
+        raise HTTPException(status_code=400, detail="pdf_paths must be a non-empty list of paths.")
+    try:
+        return [resolve_upload(p) for p in pdf_paths]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"pdf_paths must be PDFs stored in {UPLOAD_DIR.name}/.")
+
+
+@app.post("/reindex")
+def reindex(payload: Optional[dict] = None):
+    """
+    Rebuild an index from the sample PDFs (or the given uploaded/sample paths) in the background.
+    With "shards" (and optionally "shard_by": doc | hash), re-split the existing index instead.
+    """
+    payload = payload or {}
+    index_name = payload.get("index_name", "nebula_rag")
+    # the name becomes part of the index file names
+    if not isinstance(index_name, str) or not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", index_name):
+        raise HTTPException(status_code=400, detail="index_name must be 1-64 letters, digits, '_' or '-'.")
+    if payload.get("shards") is not None:
+        shards = _int_field(payload, "shards", None, 1, 64)
+        if payload.get("shard_by") not in (None, "doc", "hash"):
+            raise HTTPException(status_code=400, detail="shard_by must be 'doc' or 'hash'.")
+        job = enqueue_reshard(index_name, shards, payload.get("shard_by"))
+    else:
+        job = enqueue_rebuild(index_name, _reindex_paths(payload.get("pdf_paths")))
+    return {"status": job.status, "job_id": job.id}
 
 # Main query endpoint
 @app.post("/ask")
@@ -117,23 +328,116 @@ async def ask(payload: dict):
     if not query:
         raise HTTPException(status_code=400, detail="query is required.")
 
-    uploaded_pdf_path = payload.get("uploaded_pdf_path")
-    result = handle_query(query, uploaded_pdf_path)
+    uploaded_pdf_path = _upload_path(payload)
+    # async path: the event loop stays free while Groq/SerpAPI/arXiv respond
+    result = await ahandle_query(query, uploaded_pdf_path)
     return JSONResponse(result)
 
 
+@app.post("/ask/stream")
+async def ask_stream(payload: dict):
+    """
+    Server-sent events variant of /ask: `decision` and `agent` metadata events,
+    `token` events as the answer is generated, then `done` with the trace file.
+    """
+    query = payload.get("query")
+    if not query:
+        raise HTTPException(status_code=400, detail="query is required.")
+    uploaded_pdf_path = _upload_path(payload)
+
+    async def events():
+        async for ev in astream_query(query, uploaded_pdf_path):
+            yield f"event: {ev['event']}\ndata: {json.dumps(ev['data'])}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/ask_batch")
+async def ask_batch(payload: dict):
+    """
+    Answer a list of questions against the RAG corpus in one request.
+    Streams newline-delimited JSON, one object per question as it completes
+    (with its input `index`), followed by {"done": true, "trace_id": ...}.
+    """
+    queries = payload.get("queries")
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        raise HTTPException(status_code=400, detail="queries must be a non-empty list of strings.")
+    if len(queries) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} queries per batch.")
+    # validated before the response starts: errors after the headers can only be streamed records
+    uploaded_pdf_path = _upload_path(payload)
+    top_k = _int_field(payload, "top_k", 5, 1, 50)
+    concurrency = _int_field(payload, "concurrency", None, 1, 64)
+
+    async def lines():
+        async for item in astream_batch(
+            queries,
+            uploaded_pdf_path=uploaded_pdf_path,
+            top_k=top_k,
+            concurrency=concurrency,
+        ):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+def metrics():
+    """Per-stage latency histograms, error and cache counters in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# RAG index cache stats
+@app.get("/rag/stats")
+def rag_stats():
+    """Counters of the in-memory RAG index registry and the embedding cache."""
+    stats = INDEX_REGISTRY.stats()
+    cache = get_emb_cache() if EMB_MODEL.loaded else None
+    stats["embedding_cache"] = cache.stats() if cache is not None else None
+    stats["ingest_jobs"] = INGEST_JOBS.stats()
+    return stats
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit-rate counters of the LLM response cache and the web search cache."""
+    llm, web = RESPONSE_CACHE.get(), WEB_CACHE.get()
+    return {
+        "llm": llm.stats() if llm is not None else None,
+        "web_search": web.stats() if web is not None else None,
+        "arxiv_store": ARXIV_STORE.get().stats(),
+    }
+
 
 # Logs endpoints
 @app.get("/logs")
-def list_logs():
-    p = Path(LOGS_DIR)
-    files = [str(x.name) for x in p.glob("*") if x.is_file()]
-    return {"logs": files}
+def list_logs(limit: int = 50, cursor: Optional[str] = None, agent: Optional[str] = None,
+              source: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None):
+    """
+    Page through controller traces, newest first. Filter by agent, source
+    document and time range (unix seconds); pass next_cursor back as cursor
+    for the next page.
+    """
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000.")
+    return TRACE_STORE.get().query(limit=limit, cursor=cursor, agent=agent, source=source, since=since, until=until)
+
+
+# log files and their rotations (app.log, app.log.3); nothing else in LOGS_DIR is served
+_LOG_FILE_NAME = re.compile(r"[A-Za-z0-9_-]+\.log(\.\d+)?")
 
 
-@app.get("/logs/{filename}")
-def get_log(filename: str):
-    p = Path(LOGS_DIR) / filename
-    if not p.exists():
+@app.get("/logs/{name}")
+def get_log(name: str):
+    """A trace by id, or a log file (app.log or one of its rotations) by name."""
+    trace = TRACE_STORE.get().get(name)
+    if trace is not None:
+        return trace
+    p = Path(LOGS_DIR) / name
+    if not _LOG_FILE_NAME.fullmatch(name) or not p.is_file():
         raise HTTPException(status_code=404, detail="Log not found")
     return FileResponse(str(p))
@@ -1,25 +1,98 @@
 import os
+import re
 from pathlib import Path
 import fitz  # PyMuPDF
-from sentence_transformers import SentenceTransformer
 import faiss
+import hashlib
+import numpy as np
 import pickle
-from typing import List, Dict
-from .utils.config import RAG_INDEX_DIR, SAMPLE_PDFS_DIR, EMBEDDING_MODEL
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Dict, Tuple, Iterable, Iterator, Optional
+from .utils.config import (
+    RAG_INDEX_DIR,
+    SAMPLE_PDFS_DIR,
+    EMBEDDING_MODEL,
+    RAG_BUILD_WORKERS,
+    RAG_CHUNK_WORDS,
+    RAG_CHUNK_OVERLAP,
+    RAG_STREAM_MIN_PAGES,
+    RAG_EMBED_BATCH_SIZE,
+    RAG_INDEX_TYPE,
+    RAG_VECTOR_DTYPE,
+    RAG_SHARDS,
+    RAG_SHARD_BY,
+    RAG_SHARD_THREADS,
+    RAG_INDEX_MMAP,
+    RAG_INDEX_KEEP_VERSIONS,
+    RAG_RETRIEVAL_MODE,
+    RAG_HYBRID_DEPTH,
+    RAG_KEYWORD_MAX_TERMS,
+    RAG_BM25_K1,
+    RAG_BM25_B,
+    RAG_IVF_NLIST,
+    RAG_IVF_NPROBE,
+    RAG_HNSW_M,
+    RAG_HNSW_EF_CONSTRUCTION,
+    RAG_HNSW_EF_SEARCH,
+    RAG_PQ_M,
+    RAG_PQ_NBITS,
+    RAG_TRAIN_SIZE,
+    EMB_CACHE_ENABLED,
+    INGEST_WORKERS,
+    JOB_HISTORY,
+    JOB_STORE_PATH,
+)
+from .utils.bm25 import BM25Index, is_keyword_query, rrf
+from .utils.chunk_store import ChunkTable, doc_index, read_header, store_paths, write_header
+from .utils.embedding_cache import EmbeddingCache
+from .utils.file_lock import FileLock
+from .utils.job_queue import Job, JobQueue
+from .utils.job_store import JobStore
+from .utils.lazy import Lazy
 from .utils.logger import append_log
+from .utils.metrics import stage
+from .utils.shards import ShardedIndex, route
 
-EMB_MODEL = SentenceTransformer(EMBEDDING_MODEL)
+def _load_emb_model():
+    # imported here: pulling in torch dominates backend import time
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+def _load_emb_cache():
+    if not EMB_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(EMBEDDING_MODEL, get_emb_model().get_sentence_embedding_dimension())
+
+EMB_MODEL = Lazy(_load_emb_model, "embedding model")
+EMB_CACHE = Lazy(_load_emb_cache, "embedding cache")
+
+def get_emb_model():
+    return EMB_MODEL.get()
+
+def get_emb_cache():
+    return EMB_CACHE.get()
+
+# serializes writers (rebuild / append / remove / reshard) across threads and worker processes
+_WRITE_LOCK = FileLock(Path(RAG_INDEX_DIR) / ".write.lock")
+
+def iter_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """Yield (page number, text) for every page, loading one page at a time."""
+    doc = fitz.open(path)
+    try:
+        for page in doc:
+            yield page.number + 1, page.get_text().strip()
+    finally:
+        doc.close()
+
+def extract_pages(path: str) -> List[str]:
+    """Text of every page (empty string for pages without text)."""
+    return [text for _, text in iter_pages(path)]
 
 def extract_text_from_pdf(path: str) -> str:
     """Extract text from each page and return combined text."""
-    doc = fitz.open(path)
-    pages = []
-    for p in doc:
-        text = p.get_text().strip()
-        if text:
-            pages.append(text)
-    doc.close()
-    return "\n\n".join(pages)
+    return "\n\n".join(text for text in extract_pages(path) if text)
 
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
     """Split text into overlapping chunks for embedding."""
@@ -32,58 +105,1020 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]
         i += chunk_size - overlap
     return chunks
 
-def build_or_update_index(pdf_paths: List[str], index_name: str = "nebula_rag"):
-    """Create FAISS index + metadata store from PDFs."""
-    texts, meta = [], []
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
 
-    for p in pdf_paths:
-        text = extract_text_from_pdf(p)
-        chunks = chunk_text(text)
-        for idx, ch in enumerate(chunks):
-            texts.append(ch)
-            meta.append({"source": os.path.basename(p), "chunk_id": idx})
+def _sentences(text: str, max_words: int) -> Iterator[List[str]]:
+    """Split text into sentences (as word lists); sentences over max_words are cut into pieces."""
+    for sentence in _SENTENCE_END.split(text):
+        words = sentence.split()
+        for i in range(0, len(words), max_words):
+            yield words[i:i + max_words]
 
-    append_log(f"Embedding {len(texts)} chunks for RAG.")
-    embeddings = EMB_MODEL.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+def iter_chunks(pages: Iterable[Tuple[int, str]], chunk_size: int = None,
+                overlap: int = None) -> Iterator[Dict]:
+    """
+    Chunk page texts incrementally into {"text", "page_start", "page_end"}.
+    Chunks end on sentence boundaries and hold at most chunk_size words; each
+    chunk starts with the last whole sentences (up to overlap words) of the
+    previous one. Only the current page and chunk are held in memory.
+    """
+    chunk_size = chunk_size or RAG_CHUNK_WORDS
+    overlap = RAG_CHUNK_OVERLAP if overlap is None else overlap
+    # current chunk as (page, words) per sentence
+    current: List[Tuple[int, List[str]]] = []
+    size = 0
 
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
+    def emit() -> Dict:
+        return {
+            "text": " ".join(w for _, words in current for w in words),
+            "page_start": current[0][0],
+            "page_end": current[-1][0],
+        }
 
+    for page_no, text in pages:
+        for words in _sentences(text, chunk_size):
+            if current and size + len(words) > chunk_size:
+                yield emit()
+                # carry trailing sentences over as overlap, leaving room for the new one
+                keep, kept = [], 0
+                for sent in reversed(current):
+                    if kept + len(sent[1]) > min(overlap, chunk_size - len(words)):
+                        break
+                    keep.append(sent)
+                    kept += len(sent[1])
+                current, size = keep[::-1], kept
+            current.append((page_no, words))
+            size += len(words)
+    if current:
+        yield emit()
+
+def _index_paths(index_name: str) -> Tuple[Path, Path]:
+    """
+    (unversioned FAISS index, chunk store header). The header is replaced last on
+    every save and names the published version; see _save_index.
+    """
     idx_path = Path(RAG_INDEX_DIR) / f"{index_name}.index"
-    faiss.write_index(index, str(idx_path))
-    with open(Path(RAG_INDEX_DIR) / f"{index_name}_meta.pkl", "wb") as f:
-        pickle.dump({"texts": texts, "meta": meta}, f)
+    header_path, _, _ = store_paths(Path(RAG_INDEX_DIR) / index_name)
+    return idx_path, header_path
+
+def hash_file(path: str) -> str:
+    """Content hash of a file; used as the stable document id in the index."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _empty_meta() -> Dict:
+    # chunks and bm25 are keyed by FAISS vector id, docs by content hash
+    return {"chunks": ChunkTable(), "bm25": BM25Index(RAG_BM25_K1, RAG_BM25_B), "docs": {}, "next_id": 0,
+            "generation": 0}
+
+def _add_chunk(meta: Dict, vid: int, text: str, m: Dict):
+    meta["chunks"].add(vid, text, m)
+    meta["bm25"].add(vid, text)
+
+def _remove_chunk(meta: Dict, vid: int):
+    meta["chunks"].remove(vid)
+    meta["bm25"].remove(vid)
+
+def _version_prefix(index_name: str, generation: int) -> Path:
+    """Path prefix of one published version's files; generation 0 is the unversioned layout of older builds."""
+    return Path(RAG_INDEX_DIR) / (f"{index_name}.v{generation}" if generation else index_name)
+
+def _bm25_path(index_name: str, generation: int = 0) -> Path:
+    prefix = _version_prefix(index_name, generation)
+    return prefix.with_name(prefix.name + "_bm25.npz")
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+VECTOR_DTYPES = {"float32": None, "float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+def needs_training(index_type: str = None, vector_dtype: str = None) -> bool:
+    index_type = (index_type or RAG_INDEX_TYPE).lower()
+    # int8 scalar quantization learns per-dimension ranges
+    return index_type in ("ivf_flat", "ivf_pq") or (vector_dtype or RAG_VECTOR_DTYPE) == "int8"
+
+def make_index(dim: int, index_type: str = None, n_train: int = None, vector_dtype: str = None):
+    """
+    Create an empty FAISS index of the given type (defaults to RAG_INDEX_TYPE) that
+    takes vector ids: flat and hnsw are wrapped in IndexIDMap2, IVF types store the
+    ids in their inverted lists, so remove_ids keeps the remaining ids valid.
+    n_train is the number of vectors available for training; it caps nlist for IVF types.
+    vector_dtype (defaults to RAG_VECTOR_DTYPE) sets how flat, hnsw and ivf_flat store
+    vectors: float32, or scalar-quantized float16 / int8; ivf_pq is always PQ-coded.
+    """
+    index_type = (index_type or RAG_INDEX_TYPE).lower()
+    vector_dtype = vector_dtype or RAG_VECTOR_DTYPE
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown RAG vector dtype '{vector_dtype}'. Choose one of {tuple(VECTOR_DTYPES)}.")
+    qtype = VECTOR_DTYPES[vector_dtype]
+    if index_type == "flat":
+        inner = faiss.IndexFlatL2(dim) if qtype is None else faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+    elif index_type == "hnsw":
+        inner = faiss.IndexHNSWFlat(dim, RAG_HNSW_M) if qtype is None else faiss.IndexHNSWSQ(dim, qtype, RAG_HNSW_M)
+        inner.hnsw.efConstruction = RAG_HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = RAG_HNSW_EF_SEARCH
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = RAG_IVF_NLIST
+        if n_train:
+            # ~39 training points per centroid keeps k-means well-conditioned
+            nlist = max(1, min(nlist, n_train // 39))
+        if index_type == "ivf_pq" and n_train is not None and n_train < (1 << RAG_PQ_NBITS):
+            append_log(f"Only {n_train} vectors to train PQ codebooks; using ivf_flat instead.")
+            index_type = "ivf_flat"
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat" and qtype is None:
+            inner = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        elif index_type == "ivf_flat":
+            inner = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, faiss.METRIC_L2)
+        else:
+            if dim % RAG_PQ_M:
+                raise ValueError(f"RAG_PQ_M={RAG_PQ_M} must divide the embedding dimension {dim}.")
+            inner = faiss.IndexIVFPQ(quantizer, dim, nlist, RAG_PQ_M, RAG_PQ_NBITS)
+        inner.nprobe = min(RAG_IVF_NPROBE, nlist)
+        return inner
+    else:
+        raise ValueError(f"Unknown RAG index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+    return faiss.IndexIDMap2(inner)
+
+def new_index(dim: int, n_train: int = None, shards: int = None, shard_by: str = None, **kwargs):
+    """
+    make_index, split into `shards` (default RAG_SHARDS) ID-mapped indexes of the same
+    type when more than one; vectors are routed by document or id hash (RAG_SHARD_BY).
+    """
+    shards = shards or RAG_SHARDS
+    if shards <= 1:
+        return make_index(dim, n_train=n_train, **kwargs)
+    return ShardedIndex(
+        [make_index(dim, n_train=n_train, **kwargs) for _ in range(shards)],
+        shard_by or RAG_SHARD_BY,
+        RAG_SHARD_THREADS,
+    )
+
+def _add_with_ids(index, vectors: np.ndarray, ids: np.ndarray, docs: List[str]):
+    if isinstance(index, ShardedIndex):
+        index.add_with_ids(vectors, ids, docs)
+    else:
+        index.add_with_ids(vectors, ids)
+
+def _shard_paths(index_name: str, shards: int, generation: int = 0) -> List[Path]:
+    prefix = _version_prefix(index_name, generation)
+    if shards <= 1:
+        return [prefix.with_name(f"{prefix.name}.index")]
+    return [prefix.with_name(f"{prefix.name}.shard{i}of{shards}.index") for i in range(shards)]
+
+def _inner_index(index):
+    return faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+
+def search_params(index, sel=None):
+    """Per-query search parameters carrying the configured nprobe / efSearch and an optional id filter."""
+    if isinstance(index, ShardedIndex):
+        # one per shard: a shard built while empty may be flat while the others are not
+        return [search_params(shard, sel) for shard in index.shards]
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=min(RAG_IVF_NPROBE, inner.nlist))
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=RAG_HNSW_EF_SEARCH)
+    return faiss.SearchParameters(sel=sel) if sel is not None else None
+
+def _rebuild_without(index, ids: np.ndarray):
+    """Rebuild an IndexIDMap2 from its stored vectors minus ids."""
+    keep = np.setdiff1d(faiss.vector_to_array(index.id_map), ids)
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        # ID-mapped IVF of older builds: keep its training, store the ids natively
+        inner.make_direct_map()
+        rebuilt = faiss.clone_index(inner)
+        rebuilt.reset()
+        rebuilt.set_direct_map_type(faiss.DirectMap.NoMap)
+    else:
+        rebuilt = make_index(index.d, "hnsw")
+    if len(keep):
+        vectors = np.vstack([index.reconstruct(int(i)) for i in keep])
+        if not rebuilt.is_trained:
+            rebuilt.train(vectors)
+        rebuilt.add_with_ids(vectors, keep.astype("int64"))
+    return rebuilt, index.ntotal - rebuilt.ntotal
+
+def _remove_ids(index, ids: np.ndarray):
+    """Remove ids from index; returns (index, removed) since some indexes need rebuilding."""
+    if isinstance(index, ShardedIndex):
+        removed = 0
+        for i, shard in enumerate(index.shards):
+            index.shards[i], n = _remove_ids(shard, ids)
+            removed += n
+        return index, removed
+    if isinstance(_inner_index(index), (faiss.IndexHNSW, faiss.IndexIVF)) and hasattr(index, "id_map"):
+        # HNSW graphs do not support deletion; an ID-mapped IVF would compact its
+        # id map while the inverted lists keep the old positions
+        return _rebuild_without(index, ids)
+    return index, index.remove_ids(ids)
+
+def _write_shard(index, path: Path):
+    # unique temporary name: concurrent builders of the same file must not share it
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    faiss.write_index(index, str(tmp))
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _layout(index) -> Dict:
+    if isinstance(index, ShardedIndex):
+        return {"shards": len(index.shards), "shard_by": index.by}
+    return {"shards": 1}
+
+def _current_generation(index_name: str) -> int:
+    _, header_path = _index_paths(index_name)
+    if not header_path.exists():
+        return 0
+    return int(read_header(header_path).get("generation", 0))
+
+def _version_files(index_name: str) -> Iterator[Tuple[int, Path]]:
+    """(generation, path) of every index file on disk, temporary files included."""
+    root = Path(RAG_INDEX_DIR)
+    # published versions ({name}.v{N}...) and unpublished shard builds ({name}.build{N}...)
+    versioned = re.compile(re.escape(index_name) + r"\.(?:v|build)(\d+)[._]")
+    for p in root.glob(f"{index_name}.[vb]*"):
+        m = versioned.match(p.name)
+        if m:
+            yield int(m.group(1)), p
+    for pattern in (f"{index_name}.index", f"{index_name}.shard*.index", f"{index_name}_chunks.*", f"{index_name}_bm25.npz"):
+        for p in root.glob(pattern):
+            yield 0, p
+
+def _drop_old_versions(index_name: str, generation: int):
+    """
+    Remove files of versions older than the newest RAG_INDEX_KEEP_VERSIONS. Readers
+    that mapped them keep their pages; one still opening the previous version finds it.
+    """
+    for gen, p in _version_files(index_name):
+        if gen <= generation - RAG_INDEX_KEEP_VERSIONS:
+            try:
+                p.unlink()
+            except OSError:  # still open on Windows; retried on the next publish
+                pass
+
+def _link(src: Path, dst: Path):
+    """Give an unchanged file a name in a new version (hard link, copy where links are unsupported)."""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def _publish(index_name: str, docs: Dict[str, Dict], next_id: int, generation: int, layout: Dict):
+    """Point the header at a fully written version; the atomic header replace is the commit."""
+    _, header_path = _index_paths(index_name)
+    write_header(header_path, docs, next_id, {"generation": generation, **layout})
+    _drop_old_versions(index_name, generation)
+
+def _save_index(index, meta: Dict, index_name: str) -> str:
+    """
+    Publish index and meta as a new version: every file is written under the next
+    generation's names and fsynced, then the header is switched to it. Readers see
+    either the old or the new version, never a mix. Callers hold _WRITE_LOCK.
+    """
+    generation = _current_generation(index_name) + 1
+    prefix = _version_prefix(index_name, generation)
+    _, rows_path, text_path = store_paths(prefix)
+    layout = _layout(index)
+    paths = _shard_paths(index_name, layout["shards"], generation)
+    for shard, path in zip(index.shards if isinstance(index, ShardedIndex) else [index], paths):
+        _write_shard(shard, path)
+    meta["chunks"].save(rows_path, text_path, doc_index(meta["docs"]))
+    meta["bm25"].save(_bm25_path(index_name, generation))
+    _publish(index_name, meta["docs"], meta["next_id"], generation, layout)
+    meta["generation"] = generation
+    return str(prefix)
+
+def embed_chunks(texts: List[str], batch_size: int = None) -> np.ndarray:
+    """Encode chunk texts, reusing cached vectors and encoding only cache misses."""
+    batch_size = batch_size or RAG_EMBED_BATCH_SIZE
+    model, cache = get_emb_model(), get_emb_cache()
+    if cache is None:
+        with stage("embed_chunks"):
+            vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.ascontiguousarray(vectors, dtype="float32")
+
+    cache.refresh()  # another worker process may have added entries
+    vectors, missing = cache.get_many(texts)
+    if missing:
+        miss_texts = [texts[i] for i in missing]
+        with stage("embed_chunks"):
+            encoded = model.encode(miss_texts, batch_size=batch_size, convert_to_numpy=True)
+        vectors[missing] = encoded
+        cache.put_many(miss_texts, encoded)
+    return vectors
+
+def embed_query(query: str) -> np.ndarray:
+    with stage("embed_query"):
+        return get_emb_model().encode([query], convert_to_numpy=True)[0]
+
+def _page_count(path: str) -> int:
+    doc = fitz.open(path)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+def _stream_chunks(path: str) -> Iterator[Dict]:
+    """Chunks of one PDF, extracted page by page as they are consumed."""
+    chunks = iter_chunks(iter_pages(path))
+    while True:
+        # extraction happens lazily inside next(); time it as such
+        with stage("pdf_extract"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+def _extract_and_chunk(path: str) -> Tuple[List[Dict], int]:
+    """Worker entry point: extract one PDF and split it into chunks. Returns (chunks, pages)."""
+    return list(iter_chunks(iter_pages(path))), _page_count(path)
+
+def _iter_chunked(pdf_paths: List[str], workers: int) -> Iterator[Tuple[str, Iterable[Dict], int]]:
+    """
+    Yield (path, chunks, pages) for each PDF, in input order.
+    Small PDFs are extracted in a process pool with a bounded number of documents
+    in flight. PDFs with RAG_STREAM_MIN_PAGES pages or more (and every PDF when
+    there is a single worker) are streamed in-process instead: their chunks are
+    an iterator, so only about one page of their text is in memory at a time.
+    """
+    if workers <= 1 or len(pdf_paths) <= 1:
+        for p in pdf_paths:
+            yield p, _stream_chunks(p), _page_count(p)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit(p):
+            pages = _page_count(p)
+            if pages >= RAG_STREAM_MIN_PAGES:
+                return p, None, pages
+            return p, pool.submit(_extract_and_chunk, p), pages
+
+        pending = []
+        paths = iter(pdf_paths)
+        for p in paths:
+            pending.append(submit(p))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            p, fut, pages = pending.pop(0)
+            nxt = next(paths, None)
+            if nxt is not None:
+                pending.append(submit(nxt))
+            if fut is None:
+                yield p, _stream_chunks(p), pages
+                continue
+            # time spent waiting on the workers is what extraction costs the caller
+            with stage("pdf_extract"):
+                chunks, _ = fut.result()
+            yield p, chunks, pages
+
+def _add_documents_to(index, meta: Dict, pdf_paths: List[str],
+                      workers: int = None, batch_size: int = None, known_ids: Dict[str, str] = None,
+                      progress: Callable[..., None] = None):
+    """
+    Embed and add every PDF whose content hash is not already in meta.
+    known_ids maps paths to already computed content hashes, which are not recomputed.
+    progress, if given, is called with counter increments (documents, pages, chunks, vectors).
+    Chunks are embedded and added in fixed-size batches as extraction finishes.
+    Returns (index, added doc ids, {path: doc_id}); index is created if None.
+    """
+    workers = RAG_BUILD_WORKERS if workers is None else workers
+    batch_size = batch_size or RAG_EMBED_BATCH_SIZE
+    progress = progress or (lambda **counters: None)
+    added: Dict[str, Dict] = {}
+    doc_ids: Dict[str, str] = {}
+
+    todo, seen = [], set(meta["docs"])
+    for p in pdf_paths:
+        doc_id = (known_ids or {}).get(str(p)) or hash_file(p)
+        doc_ids[str(p)] = doc_id
+        if doc_id in seen:
+            append_log(f"Skipping already indexed PDF {p} ({doc_id[:12]}).")
+            continue
+        seen.add(doc_id)
+        todo.append((p, doc_id))
+    progress(documents_total=len(todo))
+
+    dim = get_emb_model().get_sentence_embedding_dimension()
+    if index is None and not needs_training():
+        index = new_index(dim)
+
+    batch_texts, batch_meta = [], []
+    # vectors held back until there are enough to train an IVF index
+    untrained_vecs, untrained_ids, untrained_docs = [], [], []
+    total = 0
+
+    def add_vectors(vectors: np.ndarray, ids: np.ndarray, docs: List[str], final: bool = False):
+        nonlocal index
+        if index is not None and index.is_trained:
+            _add_with_ids(index, vectors, ids, docs)
+            progress(vectors=len(ids))
+            return
+        untrained_vecs.append(vectors)
+        untrained_ids.append(ids)
+        untrained_docs.extend(docs)
+        n = sum(len(v) for v in untrained_vecs)
+        if n < RAG_TRAIN_SIZE and not final:
+            return
+        all_vecs = np.vstack(untrained_vecs)
+        all_ids = np.concatenate(untrained_ids)
+        all_docs = list(untrained_docs)
+        untrained_vecs.clear()
+        untrained_ids.clear()
+        untrained_docs.clear()
+        if index is None:
+            # an empty corpus cannot train anything; fall back to a float32 flat index
+            index = new_index(dim, n_train=n) if n else new_index(dim, index_type="flat", vector_dtype="float32")
+        if not index.is_trained:
+            append_log(f"Training {RAG_INDEX_TYPE} RAG index on {n} vectors.")
+            index.train(all_vecs)
+        if n:
+            _add_with_ids(index, all_vecs, all_ids, all_docs)
+            progress(vectors=n)
+
+    def flush():
+        nonlocal total
+        if not batch_texts:
+            return
+        embeddings = embed_chunks(batch_texts, batch_size)
+        ids = np.arange(meta["next_id"], meta["next_id"] + len(batch_texts), dtype="int64")
+        add_vectors(embeddings, ids, [m["doc_id"] for m in batch_meta])
+        for vid, text, m in zip(ids.tolist(), batch_texts, batch_meta):
+            _add_chunk(meta, vid, text, m)
+        meta["next_id"] += len(batch_texts)
+        total += len(batch_texts)
+        batch_texts.clear()
+        batch_meta.clear()
+
+    doc_for_path = dict(todo)
+    for p, chunks, pages in _iter_chunked([p for p, _ in todo], workers):
+        doc_id = doc_for_path[p]
+        source = os.path.basename(p)
+        first_id = meta["next_id"] + len(batch_texts)
+        n_chunks = 0
+        for ch in chunks:
+            batch_texts.append(ch["text"])
+            batch_meta.append({
+                "source": source,
+                "chunk_id": n_chunks,
+                "doc_id": doc_id,
+                "page_start": ch["page_start"],
+                "page_end": ch["page_end"],
+            })
+            n_chunks += 1
+            if len(batch_texts) >= batch_size:
+                flush()
+        added[doc_id] = {
+            "source": source,
+            "path": str(p),
+            "ids": list(range(first_id, first_id + n_chunks)),
+            "pages": pages,
+        }
+        progress(documents=1, pages=pages, chunks=n_chunks)
+    flush()
+    if index is None or not index.is_trained:
+        add_vectors(np.empty((0, dim), dtype="float32"), np.empty(0, dtype="int64"), [], final=True)
+
+    if get_emb_cache() is not None:
+        get_emb_cache().flush()
+    if total:
+        append_log(f"Embedded {total} chunks from {len(added)} PDF(s) for RAG.")
+    meta["docs"].update(added)
+    return index, list(added), doc_ids
+
+def build_or_update_index(pdf_paths: List[str], index_name: str = "nebula_rag", progress: Callable[..., None] = None):
+    """Create FAISS index + metadata store from PDFs (full rebuild)."""
+    with _WRITE_LOCK:
+        meta = _empty_meta()
+        index, _, _ = _add_documents_to(None, meta, pdf_paths, progress=progress)
+        idx_path = _save_index(index, meta, index_name)
 
     append_log(f"Saved RAG index to {idx_path}")
-    return str(idx_path)
+    return idx_path
 
-def load_index(index_name: str = "nebula_rag"):
-    idx_path = Path(RAG_INDEX_DIR) / f"{index_name}.index"
-    meta_path = Path(RAG_INDEX_DIR) / f"{index_name}_meta.pkl"
-
-    if not idx_path.exists() or not meta_path.exists():
-        sample_paths = [str(p) for p in Path(SAMPLE_PDFS_DIR).glob("*.pdf")]
-        build_or_update_index(sample_paths, index_name=index_name)
-
-    index = faiss.read_index(str(idx_path))
-    with open(meta_path, "rb") as f:
-        meta = pickle.load(f)
-    return index, meta
-
-def query_rag(query: str, top_k: int = 5, index_name: str = "nebula_rag") -> Dict:
-    """Return top_k text chunks for a query using FAISS."""
-    index, meta = load_index(index_name)
-    q_emb = EMB_MODEL.encode([query], convert_to_numpy=True)
-    D, I = index.search(q_emb, top_k)
-
-    results = []
-    for score, idx in zip(D[0], I[0]):
-        results.append({
-            "score": float(score),
-            "text": meta["texts"][idx],
-            "meta": meta["meta"][idx]
-        })
-
-    append_log(f"RAG query '{query}' returned {len(results)} results.")
-    return {"query": query, "results": results}
+def _upgrade_legacy(index, meta: Dict):
+    """Convert a positional IndexFlatL2 + list metadata into the ID-mapped layout."""
+    upgraded = _empty_meta()
+    new_index = make_index(index.d, "flat", vector_dtype="float32")
+    if index.ntotal:
+        new_index.add_with_ids(index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype="int64"))
+    for vid, (text, m) in enumerate(zip(meta["texts"], meta["meta"])):
+        # legacy entries carry no content hash; key them by source name
+        m["doc_id"] = m["source"]
+        _add_chunk(upgraded, vid, text, m)
+        doc = upgraded["docs"].setdefault(m["source"], {"source": m["source"], "path": None, "ids": []})
+        doc["ids"].append(vid)
+    upgraded["next_id"] = index.ntotal
+    return new_index, upgraded
+
+def _migrate_pickle(index_name: str) -> bool:
+    """
+    Convert an index saved with pickled metadata ({index_name}_meta.pkl) to the
+    chunk store, once. Returns whether there was anything to migrate.
+    """
+    legacy = Path(RAG_INDEX_DIR) / f"{index_name}_meta.pkl"
+    idx_path, header_path = _index_paths(index_name)
+    if not legacy.exists():
+        return False
+    with _WRITE_LOCK:
+        if header_path.exists() or not legacy.exists() or not idx_path.exists():
+            return False
+        index = faiss.read_index(str(idx_path))
+        # trusted file written by earlier versions of this module
+        with open(legacy, "rb") as f:
+            old = pickle.load(f)
+        if "docs" not in old:
+            index, meta = _upgrade_legacy(index, old)
+        else:
+            meta = _empty_meta()
+            meta.update(docs=old["docs"], next_id=old["next_id"])
+            for vid, text in old["texts"].items():
+                _add_chunk(meta, vid, text, old["meta"][vid])
+        _save_index(index, meta, index_name)
+        legacy.unlink()
+    append_log(f"Migrated RAG index '{index_name}' metadata from pickle to the chunk store.")
+    return True
+
+def _read_shard(path: Path, mmap: bool):
+    if mmap:
+        # read-only and mapped: pages come from the page cache shared by all processes
+        return faiss.read_index(str(path), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    return faiss.read_index(str(path))
+
+def load_index(index_name: str = "nebula_rag", mmap: bool = False):
+    """
+    Read the published version of an index and its metadata from disk.
+    Chunk texts and metadata are memory-mapped and decoded per row on access;
+    with mmap, FAISS index files are too, and the index must not be modified.
+    A missing index is returned as (None, empty meta); building it is left to
+    the ingestion jobs (see ensure_index) so readers never pay for it.
+    """
+    _, header_path = _index_paths(index_name)
+    if not header_path.exists():
+        _migrate_pickle(index_name)
+    for _ in range(3):
+        if not header_path.exists():
+            return None, _empty_meta()
+        header = read_header(header_path)
+        generation = header.get("generation", 0)
+        paths = _shard_paths(index_name, header.get("shards", 1), generation)
+        try:
+            shards = [_read_shard(p, mmap) for p in paths]
+            meta = _load_meta(index_name, header)
+        except (FileNotFoundError, RuntimeError):  # FAISS reports missing files as RuntimeError
+            if _current_generation(index_name) != generation:
+                # newer versions were published since the header was read; read the latest
+                continue
+            raise
+        if len(shards) == 1:
+            return shards[0], meta
+        return ShardedIndex(shards, header.get("shard_by", "doc"), RAG_SHARD_THREADS), meta
+    return None, _empty_meta()
+
+def _load_meta(index_name: str, header: Dict) -> Dict:
+    generation = header.get("generation", 0)
+    _, rows_path, text_path = store_paths(_version_prefix(index_name, generation))
+    chunks = ChunkTable.open(rows_path, text_path, [(d["doc_id"], d["source"]) for d in header["docs"]])
+    ids = chunks.doc_ids()
+    docs = {
+        d["doc_id"]: {**{k: v for k, v in d.items() if k != "doc_id"}, "ids": ids.get(d["doc_id"], np.empty(0, "int64"))}
+        for d in header["docs"]
+    }
+    bm25_path = _bm25_path(index_name, generation)
+    if bm25_path.exists():
+        bm25 = BM25Index.load(bm25_path, RAG_BM25_K1, RAG_BM25_B)
+    else:
+        # index saved before BM25 existed: build it in memory; the next save persists it
+        bm25 = BM25Index(RAG_BM25_K1, RAG_BM25_B)
+        for vid, text in chunks.items():
+            bm25.add(vid, text)
+        bm25.stats()  # computes the term weights now, as BM25Index.load does
+        append_log(f"Built missing BM25 index for RAG index '{index_name}' ({len(bm25)} chunks).")
+    return {"chunks": chunks, "bm25": bm25, "docs": docs, "next_id": header["next_id"], "generation": generation}
+
+def add_documents(pdf_paths: List[str], index_name: str = "nebula_rag", known_ids: Dict[str, str] = None,
+                  progress: Callable[..., None] = None) -> Dict:
+    """
+    Append PDFs to an existing index (creating it if missing), embedding only documents not seen before.
+    Returns {"added": [doc ids], "doc_ids": {path: doc_id}}.
+    """
+    with _WRITE_LOCK:
+        # mutate a private copy so in-flight searches on the cached index are untouched
+        index, meta = load_index(index_name)
+        index, added, doc_ids = _add_documents_to(index, meta, pdf_paths, known_ids=known_ids, progress=progress)
+        if added:
+            _save_index(index, meta, index_name)
+            INDEX_REGISTRY.invalidate(index_name)
+            append_log(f"Added {len(added)} document(s) to RAG index '{index_name}'.")
+    return {"added": added, "doc_ids": doc_ids}
+
+def ingest_document(pdf_path: str, index_name: str = "nebula_rag", doc_id: str = None,
+                    progress: Callable[..., None] = None) -> str:
+    """Make sure a single PDF is indexed and return its document id (its content hash, if already known)."""
+    known_ids = {str(pdf_path): doc_id} if doc_id else None
+    with stage("ingest"):
+        res = add_documents([pdf_path], index_name=index_name, known_ids=known_ids, progress=progress)
+    return res["doc_ids"][str(pdf_path)]
+
+def find_document(doc_id: str, index_name: str = "nebula_rag") -> Optional[Dict]:
+    """Index entry ({"source", "path", "ids"}) of an already indexed document, or None."""
+    _, meta = INDEX_REGISTRY.get(index_name)
+    return meta["docs"].get(doc_id)
+
+def remove_document(doc_id: str, index_name: str = "nebula_rag") -> int:
+    """Drop a document's vectors and metadata from the index. Returns vectors removed."""
+    with _WRITE_LOCK:
+        index, meta = load_index(index_name)
+        doc = meta["docs"].pop(doc_id, None)
+        if doc is None:
+            return 0
+        removed = 0
+        if len(doc["ids"]):
+            index, removed = _remove_ids(index, np.asarray(doc["ids"], dtype="int64"))
+        for vid in np.asarray(doc["ids"]).tolist():
+            _remove_chunk(meta, vid)
+        _save_index(index, meta, index_name)
+        INDEX_REGISTRY.invalidate(index_name)
+
+    append_log(f"Removed document {doc_id[:12]} ({removed} vectors) from RAG index '{index_name}'.")
+    return int(removed)
+
+def _build_path(index_name: str, shard: int, shards: int, shard_by: str, source: int) -> Path:
+    """Where build_shard leaves a shard built from version `source` until publish_shards takes it."""
+    return Path(RAG_INDEX_DIR) / f"{index_name}.build{source}.{shard_by}.shard{shard}of{shards}.index"
+
+def build_shard(index_name: str, shard: int, shards: int, shard_by: str = None) -> int:
+    """
+    Build shard `shard` of a `shards`-way split of index_name from its published chunk
+    store. Shards do not depend on each other, so they can be built in parallel or in
+    separate processes without the writer lock: each is written to a build file named
+    after the version it was built from, which nothing reads until publish_shards()
+    moves the complete set into a new version.
+    Chunk vectors come from the embedding cache when present. Returns the shard's size.
+    """
+    shard_by = shard_by or RAG_SHARD_BY
+    header = read_header(_index_paths(index_name)[1])
+    source = header.get("generation", 0)
+    meta = _load_meta(index_name, header)
+    chunks = meta["chunks"]
+    all_ids, all_docs = [], []
+    for vid, _ in chunks.items():
+        all_ids.append(vid)
+        all_docs.append(chunks.meta(vid)["doc_id"])
+    all_ids = np.asarray(all_ids, dtype="int64")
+    ids = all_ids[route(all_ids, all_docs, shards, shard_by) == shard]
+
+    dim = get_emb_model().get_sentence_embedding_dimension()
+    if not len(ids):
+        index = make_index(dim, "flat", vector_dtype="float32")
+    else:
+        index = make_index(dim, n_train=len(ids) if needs_training() else None)
+    pending = []  # vectors held back until the index is trained
+    for start in range(0, len(ids), RAG_EMBED_BATCH_SIZE):
+        batch = ids[start:start + RAG_EMBED_BATCH_SIZE]
+        vectors = embed_chunks([chunks.text(v) for v in batch.tolist()])
+        if index.is_trained:
+            index.add_with_ids(vectors, batch)
+            continue
+        pending.append((vectors, batch))
+        if sum(len(b) for _, b in pending) < RAG_TRAIN_SIZE and start + len(batch) < len(ids):
+            continue
+        index.train(np.vstack([v for v, _ in pending]))
+        for v, b in pending:
+            index.add_with_ids(v, b)
+        pending.clear()
+
+    _write_shard(index, _build_path(index_name, shard, shards, shard_by, source))
+    append_log(f"Built shard {shard + 1}/{shards} of RAG index '{index_name}' ({index.ntotal} vectors).")
+    return int(index.ntotal)
+
+def publish_shards(index_name: str = "nebula_rag", shards: int = None, shard_by: str = None) -> int:
+    """
+    Publish a complete set of shards left by build_shard() as the next version of
+    index_name and return it. Fails if a shard is missing, or if the index was
+    changed since they were built (their build files are then of an older version
+    and are removed with it).
+    """
+    shards = shards or RAG_SHARDS
+    shard_by = shard_by or RAG_SHARD_BY
+    _, header_path = _index_paths(index_name)
+    with _WRITE_LOCK:
+        header = read_header(header_path)
+        current = header.get("generation", 0)
+        built = [_build_path(index_name, i, shards, shard_by, current) for i in range(shards)]
+        missing = [p.name for p in built if not p.exists()]
+        if missing:
+            raise FileNotFoundError(
+                f"No shards of RAG index '{index_name}' version {current} to publish: {', '.join(missing)} "
+                f"(built from an older version, or not built yet)."
+            )
+        # the header names the newest version and only lock holders move it, so this one is unpublished
+        generation = current + 1
+        for src, dst in zip(built, _shard_paths(index_name, shards, generation)):
+            os.replace(src, dst)
+        # chunks and BM25 postings are unchanged: the new version shares their files
+        _, *old_store = store_paths(_version_prefix(index_name, current))
+        _, *new_store = store_paths(_version_prefix(index_name, generation))
+        for src, dst in zip(old_store, new_store):
+            _link(src, dst)
+        if _bm25_path(index_name, current).exists():
+            _link(_bm25_path(index_name, current), _bm25_path(index_name, generation))
+        else:
+            _load_meta(index_name, header)["bm25"].save(_bm25_path(index_name, generation))
+        docs = {d["doc_id"]: {k: v for k, v in d.items() if k != "doc_id"} for d in header["docs"]}
+        layout = {"shards": shards, "shard_by": shard_by} if shards > 1 else {"shards": 1}
+        _publish(index_name, docs, header["next_id"], generation, layout)
+        INDEX_REGISTRY.invalidate(index_name)
+    return generation
+
+def reshard(index_name: str = "nebula_rag", shards: int = None, shard_by: str = None) -> Dict:
+    """Split index_name into `shards` shards (default RAG_SHARDS), building them in parallel, then switch to them."""
+    shards = shards or RAG_SHARDS
+    shard_by = shard_by or RAG_SHARD_BY
+    with _WRITE_LOCK:
+        with ThreadPoolExecutor(max_workers=max(1, min(shards, RAG_SHARD_THREADS))) as pool:
+            sizes = list(pool.map(lambda i: build_shard(index_name, i, shards, shard_by), range(shards)))
+        if get_emb_cache() is not None:
+            get_emb_cache().flush()
+        publish_shards(index_name, shards, shard_by)
+    append_log(f"RAG index '{index_name}' now has {shards} shard(s) by {shard_by}: {sizes}.")
+    return {"shards": shards, "shard_by": shard_by, "sizes": sizes}
+
+
+def _enable_reconstruct(index):
+    """Give IVF indexes an id -> list position map so stored vectors can be read back (readers only)."""
+    for shard in index.shards if isinstance(index, ShardedIndex) else [index]:
+        inner = _inner_index(shard)
+        if isinstance(inner, faiss.IndexIVF):
+            inner.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+class IndexRegistry:
+    """
+    Process-wide cache of loaded FAISS indexes keyed by index name.
+    An entry is reused until the files on disk change (mtime/size stamp), so every
+    worker process swaps to a newly published version on its next query. Indexes
+    are memory-mapped read-only (RAG_INDEX_MMAP); in-flight searches keep the
+    version they started on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _stamp(index_name: str):
+        # the header is replaced last on every publish, so it versions all index files
+        try:
+            st = _index_paths(index_name)[1].stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, index_name: str = "nebula_rag"):
+        """
+        Return (index, meta) for index_name, loading from disk only when needed.
+        index is None while the index has not been built yet.
+        """
+        # outside self._lock: migrating takes the writer lock, and writers invalidate under it
+        _migrate_pickle(index_name)
+        with self._lock:
+            entry = self._entries.get(index_name)
+            stamp = self._stamp(index_name)
+            if stamp is None:
+                self._entries.pop(index_name, None)
+                return None, _empty_meta()
+            if entry is not None and stamp is not None and entry["stamp"] == stamp:
+                self.hits += 1
+                return entry["index"], entry["meta"]
+
+            index, meta = load_index(index_name, mmap=RAG_INDEX_MMAP)
+            if index is not None:
+                _enable_reconstruct(index)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+                append_log(f"RAG index '{index_name}' changed on disk; reloaded v{meta['generation']}.")
+            # stamped before loading: a version published meanwhile triggers another reload
+            self._entries[index_name] = {"index": index, "meta": meta, "stamp": stamp}
+            return index, meta
+
+    def invalidate(self, index_name: str = None):
+        """Drop one cached index (or all of them) so the next get() reloads."""
+        with self._lock:
+            if index_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(index_name, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "loaded": sorted(self._entries),
+                "versions": {name: e["meta"]["generation"] for name, e in self._entries.items()},
+            }
+
+
+INDEX_REGISTRY = IndexRegistry()
+
+# ingestion runs here, off the request path; writers are serialized by _WRITE_LOCK anyway
+INGEST_JOBS = JobQueue(
+    "ingest", INGEST_WORKERS, JOB_HISTORY, store=Lazy(lambda: JobStore(JOB_STORE_PATH, JOB_HISTORY), "job store")
+)
+
+def _sample_paths() -> List[str]:
+    return [str(p) for p in Path(SAMPLE_PDFS_DIR).glob("*.pdf")]
+
+def enqueue_ingest(pdf_path: str, index_name: str = "nebula_rag", doc_id: str = None) -> Job:
+    """Queue indexing of one PDF; a job already queued for the same content is reused."""
+    doc_id = doc_id or hash_file(pdf_path)
+    return INGEST_JOBS.submit(
+        "ingest",
+        lambda job: ingest_document(pdf_path, index_name, doc_id=doc_id, progress=job.advance),
+        key=f"{index_name}:{doc_id}",
+        path=str(pdf_path),
+        index_name=index_name,
+        doc_id=doc_id,
+    )
+
+def enqueue_rebuild(index_name: str = "nebula_rag", pdf_paths: List[str] = None) -> Job:
+    """Queue a full rebuild of an index (from the sample PDFs by default)."""
+    def run(job: Job):
+        paths = pdf_paths if pdf_paths is not None else _sample_paths()
+        build_or_update_index(paths, index_name, progress=job.advance)
+        return {"documents": len(paths)}
+    return INGEST_JOBS.submit("rebuild", run, key=f"{index_name}:build", index_name=index_name)
+
+def enqueue_reshard(index_name: str = "nebula_rag", shards: int = None, shard_by: str = None) -> Job:
+    """Queue re-splitting an index into shards."""
+    return INGEST_JOBS.submit(
+        "reshard",
+        lambda job: reshard(index_name, shards, shard_by),
+        key=f"{index_name}:build",
+        index_name=index_name,
+        shards=shards,
+        shard_by=shard_by,
+    )
+
+def ensure_index(index_name: str = "nebula_rag") -> Optional[Job]:
+    """
+    If the index has not been built yet, queue building it from the sample PDFs
+    and return that job; None when the index exists.
+    """
+    if INDEX_REGISTRY.get(index_name)[0] is not None:
+        return None
+
+    def run(job: Job):
+        return add_documents(_sample_paths(), index_name, progress=job.advance)["added"]
+    # appends rather than rebuilds, so documents ingested meanwhile are kept
+    return INGEST_JOBS.submit("build", run, key=f"{index_name}:build", index_name=index_name)
+
+def warm_up(index_name: str = "nebula_rag"):
+    """Load the embedding model and the default index (or queue its build) ahead of the first query."""
+    get_emb_model()
+    ensure_index(index_name)
+
+def retrieval_mode(query: str, mode: str = None, bm25: BM25Index = None, allowed: np.ndarray = None) -> str:
+    """
+    Resolve the retrieval mode for a query: dense, lexical or hybrid.
+    auto picks lexical for keyword-like queries with matches among the allowed ids
+    (the whole corpus by default), hybrid otherwise; without a lexical index every
+    mode falls back to dense.
+    """
+    mode = (mode or RAG_RETRIEVAL_MODE).lower()
+    if bm25 is None or not len(bm25):
+        return "dense"
+    if mode == "auto":
+        if is_keyword_query(query, RAG_KEYWORD_MAX_TERMS) and bm25.matches(query, allowed):
+            return "lexical"
+        return "hybrid"
+    return mode
+
+def _stored_vectors(index, ids: List[int]) -> Optional[np.ndarray]:
+    """Vectors of the given ids as stored in the index (decoded from its codes); None if it cannot reconstruct."""
+    if not ids:
+        return np.empty((0, index.d), dtype="float32")
+    try:
+        return np.vstack([index.reconstruct(vid) for vid in ids]).astype("float32")
+    except RuntimeError as e:
+        append_log(f"Cannot reconstruct stored RAG vectors ({str(e).splitlines()[-1]}).")
+        return None
+
+def _search(queries: List[str], top_k: int, index_name: str, doc_id: str = None,
+            mode: str = None) -> List[Tuple[str, List[Dict], Optional[np.ndarray], Optional[np.ndarray]]]:
+    """
+    Retrieve top_k chunks per query; returns (mode used, results, query vector,
+    result vectors) per query. Queries that need vectors are embedded in one
+    batch and searched with a single multi-row FAISS call; lexical queries skip
+    both and have no vectors, unless BM25 finds nothing and they fall back to
+    dense. Result vectors are read back from the index, so
+    callers can rank passages without re-encoding the chunks.
+    Results are best first; score is the L2 distance (dense), BM25 score
+    (lexical) or reciprocal-rank-fusion score (hybrid).
+    """
+    index, meta = INDEX_REGISTRY.get(index_name)
+    if index is None:
+        job = ensure_index(index_name)
+        append_log(f"RAG index '{index_name}' is not built yet (job {job.id if job else '-'}); no results.")
+        return [("dense", [], None, None) for _ in queries]
+
+    sel = allowed = None
+    if doc_id is not None:
+        ids = meta["docs"].get(doc_id, {}).get("ids", [])
+        if not len(ids):
+            append_log(f"RAG query restricted to unknown document {doc_id[:12]}; no results.")
+            return [("dense", [], None, None) for _ in queries]
+        allowed = np.asarray(ids, dtype="int64")
+        sel = faiss.IDSelectorBatch(allowed)
+
+    bm25 = meta.get("bm25")
+    modes = [retrieval_mode(q, mode, bm25, allowed) for q in queries]
+    depth = max(top_k, RAG_HYBRID_DEPTH)
+
+    lexical: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    for i, m in enumerate(modes):
+        if m == "lexical":
+            with stage("bm25_search"):
+                lexical[i] = bm25.search(queries[i], top_k, allowed)
+            if not len(lexical[i][0]):
+                # no term matched (e.g. only stopwords in the scope): fall back to vectors
+                modes[i] = "dense"
+
+    dense: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    q_vecs: Dict[int, np.ndarray] = {}
+    rows = [i for i, m in enumerate(modes) if m != "lexical"]
+    if rows:
+        k = depth if any(modes[i] == "hybrid" for i in rows) else top_k
+        with stage("embed_query"):
+            q_emb = get_emb_model().encode(
+                [queries[i] for i in rows], batch_size=RAG_EMBED_BATCH_SIZE, convert_to_numpy=True
+            )
+        kwargs = {}
+        if doc_id is not None and isinstance(index, ShardedIndex):
+            kwargs["shards"] = index.shards_for_doc(doc_id)
+        with stage("faiss_search"):
+            D, I = index.search(
+                np.ascontiguousarray(q_emb, dtype="float32"), k, params=search_params(index, sel), **kwargs
+            )
+        for i, row_d, row_i, q in zip(rows, D, I, q_emb):
+            found = row_i >= 0
+            dense[i] = (row_i[found], row_d[found])
+            q_vecs[i] = np.asarray(q, dtype="float32")
+
+    out = []
+    for i, (query, m) in enumerate(zip(queries, modes)):
+        if m == "dense":
+            ids, scores = dense[i][0][:top_k], dense[i][1][:top_k]
+        elif m == "lexical":
+            ids, scores = lexical[i]
+        else:
+            with stage("bm25_search"):
+                lex_ids, _ = bm25.search(query, depth, allowed)
+            ids, scores = rrf([dense[i][0], lex_ids], top_k)
+        ids = ids.tolist()
+        out.append((m, [
+            {
+                "id": vid,
+                "score": float(score),
+                "text": meta["chunks"].text(vid),
+                "meta": meta["chunks"].meta(vid),
+            }
+            for vid, score in zip(ids, scores.tolist())
+        ], q_vecs.get(i), _stored_vectors(index, ids) if i in q_vecs else None))
+    return out
+
+def query_rag(query: str, top_k: int = 5, index_name: str = "nebula_rag", doc_id: str = None,
+              mode: str = None) -> Dict:
+    """
+    Return top_k text chunks for a query using FAISS and/or BM25 (see retrieval_mode).
+    If doc_id is given, only chunks of that document are searched.
+    Unless the search was lexical, "query_vec" and "result_vecs" (numpy arrays, not
+    JSON-serializable) hold the query embedding and the results' stored vectors.
+    """
+    used, results, query_vec, result_vecs = _search([query], top_k, index_name, doc_id, mode)[0]
+    append_log(f"RAG query '{query}' ({used}) returned {len(results)} results.")
+    return {"query": query, "mode": used, "results": results, "query_vec": query_vec, "result_vecs": result_vecs}
+
+def query_rag_batch(queries: List[str], top_k: int = 5, index_name: str = "nebula_rag",
+                    doc_id: str = None, mode: str = None) -> List[Dict]:
+    """query_rag for many queries at once: one batched encode and one FAISS search."""
+    if not queries:
+        return []
+    rows = _search(queries, top_k, index_name, doc_id, mode)
+    append_log(f"RAG batch of {len(queries)} queries returned {sum(len(r[1]) for r in rows)} results.")
+    return [
+        {"query": q, "mode": m, "results": r, "query_vec": qv, "result_vecs": rv}
+        for q, (m, r, qv, rv) in zip(queries, rows)
+    ]
@@ -0,0 +1,104 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+def normalize_topic(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class ArxivStore:
+    """
+    Local SQLite store of arXiv metadata.
+
+    papers:        one row per entry id
+    query_papers:  which papers a (normalized) query returned
+    queries:       when a query was last fetched, how many results were requested
+                   and the newest submission seen, so refreshes only pull newer papers
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS papers (
+                id TEXT PRIMARY KEY, title TEXT, summary TEXT, published TEXT,
+                authors TEXT, pdf_url TEXT
+            );
+            CREATE TABLE IF NOT EXISTS query_papers (
+                query TEXT, paper_id TEXT, PRIMARY KEY (query, paper_id)
+            );
+            CREATE TABLE IF NOT EXISTS queries (
+                query TEXT PRIMARY KEY, fetched_at REAL, max_results INTEGER, newest_published TEXT
+            );
+            CREATE INDEX IF NOT EXISTS papers_published ON papers(published);
+            """
+        )
+        self._db.commit()
+
+    def query_state(self, query: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fetched_at, max_results, newest_published FROM queries WHERE query = ?",
+                (normalize_topic(query),),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"fetched_at": row[0], "max_results": row[1], "newest_published": row[2]}
+
+    def results(self, query: str, limit: int) -> List[Dict]:
+        """Newest-first papers recorded for a query."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT p.id, p.title, p.summary, p.published, p.authors, p.pdf_url"
+                " FROM query_papers q JOIN papers p ON p.id = q.paper_id"
+                " WHERE q.query = ? ORDER BY p.published DESC LIMIT ?",
+                (normalize_topic(query), limit),
+            ).fetchall()
+        return [
+            {
+                "id": r[0],
+                "title": r[1],
+                "summary": r[2],
+                "published": r[3],
+                "authors": json.loads(r[4]),
+                "pdf_url": r[5],
+            }
+            for r in rows
+        ]
+
+    def record(self, query: str, papers: List[Dict], max_results: int = None):
+        """Upsert papers, link them to the query and stamp the fetch time."""
+        key = normalize_topic(query)
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO papers VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (p["id"], p["title"], p["summary"], p["published"], json.dumps(p["authors"]), p["pdf_url"])
+                    for p in papers
+                ],
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO query_papers VALUES (?, ?)", [(key, p["id"]) for p in papers]
+            )
+            (newest,) = self._db.execute(
+                "SELECT MAX(p.published) FROM query_papers q JOIN papers p ON p.id = q.paper_id"
+                " WHERE q.query = ?",
+                (key,),
+            ).fetchone()
+            prev = self._db.execute("SELECT max_results FROM queries WHERE query = ?", (key,)).fetchone()
+            max_results = max(max_results or 0, prev[0] if prev else 0)
+            self._db.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)", (key, time.time(), max_results, newest)
+            )
+            self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            (papers,) = self._db.execute("SELECT COUNT(*) FROM papers").fetchone()
+            (queries,) = self._db.execute("SELECT COUNT(*) FROM queries").fetchone()
+        return {"papers": papers, "queries": queries}
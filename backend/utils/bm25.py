@@ -0,0 +1,221 @@
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# words, keeping joined forms such as e-1042, gpt-4o or v2.1 together
+_TOKEN = re.compile(r"\w+(?:[-.]\w+)*")
+_SPLIT = re.compile(r"[-.]")
+# product names, acronyms and error codes: digits, inner separators or 2+ capitals
+_CODE_LIKE = re.compile(r"\d|\w[-._]\w|[A-Z].*[A-Z]")
+# function words, and words describing the request rather than the content ("summarize this PDF")
+STOPWORDS = frozenset("""
+a an and are as at be by can do for from how i in is it me my of on or our please that the this to was
+what when where which who why with you about give show tell find summarize summarise summary explain
+describe overview pdf document doc file paper text page pages
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; joined forms are indexed whole and by their parts."""
+    terms = []
+    for tok in _TOKEN.findall(text.lower()):
+        terms.append(tok)
+        if "-" in tok or "." in tok:
+            terms.extend(p for p in _SPLIT.split(tok) if p)
+    return terms
+
+
+def is_keyword_query(query: str, max_terms: int) -> bool:
+    """A short lookup of a code-like term (product name, acronym, error code) rather than a question or request."""
+    query = query.strip()
+    words = query.split()
+    if not words or len(words) > max_terms or query.endswith("?"):
+        return False
+    content = [w for w in words if w.lower().strip(".,;:!\"'()") not in STOPWORDS]
+    return any(_CODE_LIKE.search(w) for w in content)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts keyed by FAISS vector id.
+
+    Postings are kept term-major in flat arrays: offsets[t]:offsets[t+1]
+    indexes the (vector id, term frequency) pairs of term t. Chunks added or
+    removed since loading are merged into the arrays on the next search or save.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._terms: List[str] = []
+        self._vocab: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype="int64")
+        self._post_ids = np.empty(0, dtype="int64")
+        self._post_tf = np.empty(0, dtype="uint16")
+        self._doc_ids = np.empty(0, dtype="int64")  # sorted
+        self._doc_len = np.empty(0, dtype="int32")
+        self._added: Dict[int, Counter] = {}
+        self._deleted = set()
+        self._weights = None
+        self._idf = None
+
+    @classmethod
+    def load(cls, path: Path, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        idx = cls(k1, b)
+        with np.load(path, allow_pickle=False) as data:
+            blob = data["terms"].tobytes().decode("utf-8")
+            idx._terms = blob.split("\n") if blob else []
+            idx._offsets = data["offsets"]
+            idx._post_ids = data["post_ids"]
+            idx._post_tf = data["post_tf"]
+            idx._doc_ids = data["doc_ids"]
+            idx._doc_len = data["doc_len"]
+        idx._vocab = {t: i for i, t in enumerate(idx._terms)}
+        # weights are computed up front so concurrent readers never race to build them
+        idx._prepare()
+        return idx
+
+    def save(self, path: Path):
+        self._compact()
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                terms=np.frombuffer("\n".join(self._terms).encode("utf-8"), dtype="uint8"),
+                offsets=self._offsets,
+                post_ids=self._post_ids,
+                post_tf=self._post_tf,
+                doc_ids=self._doc_ids,
+                doc_len=self._doc_len,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def __len__(self) -> int:
+        return len(self._doc_ids) - len(self._deleted) + len(self._added)
+
+    def add(self, vid: int, text: str):
+        self._added[vid] = Counter(tokenize(text))
+
+    def remove(self, vid: int):
+        if self._added.pop(vid, None) is None:
+            self._deleted.add(vid)
+
+    def _compact(self):
+        """Merge pending additions and removals into the postings arrays."""
+        if not self._added and not self._deleted:
+            return
+        terms, vocab = list(self._terms), dict(self._vocab)
+        new_t, new_ids, new_tf = [], [], []
+        for vid, counts in self._added.items():
+            for term, tf in counts.items():
+                t = vocab.get(term)
+                if t is None:
+                    t = vocab[term] = len(terms)
+                    terms.append(term)
+                new_t.append(t)
+                new_ids.append(vid)
+                new_tf.append(min(tf, 65535))
+
+        post_t = np.concatenate([
+            np.repeat(np.arange(len(self._terms), dtype="int64"), np.diff(self._offsets)),
+            np.asarray(new_t, dtype="int64"),
+        ])
+        post_ids = np.concatenate([self._post_ids, np.asarray(new_ids, dtype="int64")])
+        post_tf = np.concatenate([self._post_tf, np.asarray(new_tf, dtype="uint16")])
+        doc_ids = np.concatenate([self._doc_ids, np.fromiter(self._added, dtype="int64", count=len(self._added))])
+        doc_len = np.concatenate([
+            self._doc_len,
+            np.fromiter((sum(c.values()) for c in self._added.values()), dtype="int32", count=len(self._added)),
+        ])
+        # re-added ids replace their old postings
+        dropped = np.fromiter(self._deleted | set(self._added), dtype="int64")
+        if len(dropped):
+            keep = ~np.isin(post_ids[:len(self._post_ids)], dropped)
+            keep = np.concatenate([keep, np.ones(len(new_ids), dtype=bool)])
+            post_t, post_ids, post_tf = post_t[keep], post_ids[keep], post_tf[keep]
+            keep = ~np.isin(doc_ids[:len(self._doc_ids)], dropped)
+            keep = np.concatenate([keep, np.ones(len(self._added), dtype=bool)])
+            doc_ids, doc_len = doc_ids[keep], doc_len[keep]
+
+        counts = np.bincount(post_t, minlength=len(terms))
+        live = np.flatnonzero(counts)
+        if len(live) < len(terms):
+            # drop terms whose postings were all removed
+            remap = np.full(len(terms), -1, dtype="int64")
+            remap[live] = np.arange(len(live))
+            post_t, counts = remap[post_t], counts[live]
+            terms = [terms[t] for t in live.tolist()]
+            vocab = {t: i for i, t in enumerate(terms)}
+
+        order = np.lexsort((post_ids, post_t))
+        self._post_ids, self._post_tf = post_ids[order], post_tf[order]
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype("int64")
+        order = np.argsort(doc_ids)
+        self._doc_ids, self._doc_len = doc_ids[order], doc_len[order]
+        self._terms, self._vocab = terms, vocab
+        self._added.clear()
+        self._deleted.clear()
+        self._weights = self._idf = None
+
+    def _prepare(self):
+        self._compact()
+        if self._weights is not None:
+            return
+        n = len(self._doc_ids)
+        df = np.diff(self._offsets).astype("float64")
+        self._idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype("float32")
+        lens = self._doc_len[np.searchsorted(self._doc_ids, self._post_ids)].astype("float32")
+        avg = float(self._doc_len.mean()) if n else 1.0
+        tf = self._post_tf.astype("float32")
+        # per-posting term weight; a query score is the idf-weighted sum over its terms
+        self._weights = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * lens / max(avg, 1.0)))
+
+    def matches(self, query: str, allowed: np.ndarray = None) -> bool:
+        """Whether any query term other than a stopword occurs in the corpus (or in the allowed ids)."""
+        self._prepare()
+        for t in set(tokenize(query)) - STOPWORDS:
+            if t not in self._vocab:
+                continue
+            postings = self._post_ids[self._offsets[self._vocab[t]]:self._offsets[self._vocab[t] + 1]]
+            if len(postings) and (allowed is None or np.isin(postings, allowed).any()):
+                return True
+        return False
+
+    def search(self, query: str, k: int, allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (vector ids, scores), best first; allowed restricts the candidate ids."""
+        self._prepare()
+        terms = [self._vocab[t] for t in set(tokenize(query)) if t in self._vocab]
+        if not terms:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        ids = np.concatenate([self._post_ids[self._offsets[t]:self._offsets[t + 1]] for t in terms])
+        scores = np.concatenate([
+            self._idf[t] * self._weights[self._offsets[t]:self._offsets[t + 1]] for t in terms
+        ])
+        if allowed is not None:
+            mask = np.isin(ids, allowed)
+            ids, scores = ids[mask], scores[mask]
+        uniq, inverse = np.unique(ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+        top = np.argsort(-totals, kind="stable")[:k]
+        return uniq[top], totals[top].astype("float32")
+
+    def stats(self) -> Dict:
+        self._prepare()
+        return {"chunks": len(self._doc_ids), "terms": len(self._terms), "postings": len(self._post_ids)}
+
+
+def rrf(rankings: List[np.ndarray], k: int, c: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Reciprocal rank fusion of id rankings (best first); returns the top-k (ids, fused scores)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, vid in enumerate(ranking.tolist()):
+            fused[vid] = fused.get(vid, 0.0) + 1.0 / (c + rank + 1)
+    best = sorted(fused.items(), key=lambda kv: -kv[1])[:k]
+    return (np.asarray([v for v, _ in best], dtype="int64"),
+            np.asarray([s for _, s in best], dtype="float32"))
@@ -0,0 +1,202 @@
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# one row per chunk, sorted by vector id; text lives in a separate UTF-8 blob
+ROW_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("text_off", "<i8"),
+    ("text_len", "<i4"),
+    ("doc", "<i4"),  # position in the header's document list
+    ("chunk_id", "<i4"),
+    ("page_start", "<i4"),  # -1 when unknown
+    ("page_end", "<i4"),
+])
+
+
+def store_paths(prefix: Path) -> Tuple[Path, Path, Path]:
+    """(header, row table, text blob) files of the chunk store at prefix."""
+    return (
+        prefix.with_name(prefix.name + "_meta.json"),
+        prefix.with_name(prefix.name + "_chunks.npy"),
+        prefix.with_name(prefix.name + "_chunks.txt"),
+    )
+
+
+def _replace(tmp: Path, path: Path):
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _fsync_dir(path: Path):
+    """Persist a rename in path's directory (POSIX only)."""
+    if os.name != "posix":
+        return
+    fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ChunkTable:
+    """
+    Chunk texts and metadata keyed by FAISS vector id.
+
+    Saved tables are columnar: a fixed-width row table (.npy) and a text blob,
+    both memory-mapped, so opening costs O(1) and rows are decoded only when
+    read. Pages are shared by every process that maps the same files. Rows
+    added or removed since loading are kept in memory until save().
+    """
+
+    def __init__(self, rows: np.ndarray = None, blob=None, doc_list: List[Tuple[str, str]] = None):
+        self._rows = rows if rows is not None else np.empty(0, dtype=ROW_DTYPE)
+        self._blob = blob if blob is not None else b""
+        self._doc_list = doc_list or []  # (doc_id, source) per doc index
+        self._added: Dict[int, Tuple[str, Dict]] = {}
+        self._deleted = set()
+
+    @classmethod
+    def open(cls, rows_path: Path, text_path: Path, doc_list: List[Tuple[str, str]]) -> "ChunkTable":
+        rows = np.load(rows_path, mmap_mode="r") if rows_path.stat().st_size else None
+        blob = None
+        if text_path.stat().st_size:
+            with open(text_path, "rb") as f:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(rows, blob, doc_list)
+
+    def _row(self, vid: int) -> Optional[int]:
+        ids = self._rows["id"]
+        pos = int(np.searchsorted(ids, vid))
+        if pos < len(ids) and ids[pos] == vid and vid not in self._deleted:
+            return pos
+        return None
+
+    def __contains__(self, vid: int) -> bool:
+        return vid in self._added or self._row(vid) is not None
+
+    def __len__(self) -> int:
+        return len(self._rows) - len(self._deleted) + len(self._added)
+
+    def add(self, vid: int, text: str, meta: Dict):
+        self._added[vid] = (text, meta)
+
+    def remove(self, vid: int):
+        if self._added.pop(vid, None) is None and self._row(vid) is not None:
+            self._deleted.add(vid)
+
+    def text(self, vid: int) -> str:
+        if vid in self._added:
+            return self._added[vid][0]
+        r = self._rows[self._row(vid)]
+        off = int(r["text_off"])
+        return self._blob[off:off + int(r["text_len"])].decode("utf-8")
+
+    def meta(self, vid: int) -> Dict:
+        if vid in self._added:
+            return self._added[vid][1]
+        r = self._rows[self._row(vid)]
+        doc_id, source = self._doc_list[int(r["doc"])]
+        m = {"source": source, "chunk_id": int(r["chunk_id"]), "doc_id": doc_id}
+        if r["page_start"] >= 0:
+            m["page_start"] = int(r["page_start"])
+            m["page_end"] = int(r["page_end"])
+        return m
+
+    def doc_ids(self) -> Dict[str, np.ndarray]:
+        """Vector ids of every saved document, grouped by doc id (in-memory edits excluded)."""
+        if not len(self._rows):
+            return {}
+        docs = np.asarray(self._rows["doc"])
+        order = np.argsort(docs, kind="stable")
+        bounds = np.flatnonzero(np.diff(docs[order])) + 1
+        ids = np.asarray(self._rows["id"])[order]
+        out = {}
+        for group, positions in zip(np.split(ids, bounds), np.split(order, bounds)):
+            out[self._doc_list[int(docs[positions[0]])][0]] = group
+        return out
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        """(vid, text) of every row in id order."""
+        for vid, data, _, _ in self._iter_rows():
+            yield vid, data.decode("utf-8")
+
+    def _iter_rows(self) -> Iterator[Tuple[int, bytes, Optional[Dict], Optional[np.void]]]:
+        """(vid, utf-8 text, meta, row) in id order: meta is set for in-memory rows, row for saved ones."""
+        added = sorted(self._added)
+        a = 0
+        ids = np.asarray(self._rows["id"])
+        for pos, vid in enumerate(ids.tolist()):
+            while a < len(added) and added[a] < vid:
+                text, m = self._added[added[a]]
+                yield added[a], text.encode("utf-8"), m, None
+                a += 1
+            if vid in self._deleted or vid in self._added:
+                continue
+            r = self._rows[pos]
+            off = int(r["text_off"])
+            yield vid, self._blob[off:off + int(r["text_len"])], None, r
+        for vid in added[a:]:
+            text, m = self._added[vid]
+            yield vid, text.encode("utf-8"), m, None
+
+    def save(self, rows_path: Path, text_path: Path, doc_index: Dict[str, int]):
+        """
+        Write all rows (saved and in-memory) as a new row table and text blob.
+        doc_index maps doc ids to their position in the header's document list.
+        """
+        rows = np.empty(len(self), dtype=ROW_DTYPE)
+        tmp_text = text_path.with_name(text_path.name + ".tmp")
+        off = 0
+        with open(tmp_text, "wb") as f:
+            for i, (vid, data, m, old) in enumerate(self._iter_rows()):
+                if m is None:
+                    doc = doc_index[self._doc_list[int(old["doc"])][0]]
+                    chunk_id, pages = int(old["chunk_id"]), (int(old["page_start"]), int(old["page_end"]))
+                else:
+                    doc = doc_index[m["doc_id"]]
+                    chunk_id, pages = m["chunk_id"], (m.get("page_start", -1), m.get("page_end", -1))
+                rows[i] = (vid, off, len(data), doc, chunk_id, *pages)
+                f.write(data)
+                off += len(data)
+        tmp_rows = rows_path.with_name(rows_path.name + ".tmp.npy")
+        np.save(tmp_rows, rows)
+        _replace(tmp_text, text_path)
+        _replace(tmp_rows, rows_path)
+
+
+def doc_index(docs: Dict[str, Dict]) -> Dict[str, int]:
+    """Position of each document in the header's document list."""
+    return {doc_id: i for i, doc_id in enumerate(docs)}
+
+
+def write_header(path: Path, docs: Dict[str, Dict], next_id: int, extra: Dict = None):
+    """
+    Atomically replace the JSON header: document list (in doc_index order, without ids),
+    next id and extra fields. The rename is made durable before returning.
+    """
+    doc_list = [
+        {"doc_id": doc_id, **{k: v for k, v in doc.items() if k != "ids"}}
+        for doc_id, doc in docs.items()
+    ]
+    header = {"version": FORMAT_VERSION, "next_id": next_id, "docs": doc_list, **(extra or {})}
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(header, f)
+    _replace(tmp, path)
+    _fsync_dir(path)
+
+
+def read_header(path: Path) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported chunk store version {header.get('version')} in {path}.")
+    return header
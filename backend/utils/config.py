@@ -10,17 +10,137 @@ SERPAPI_KEY = os.getenv("SERPAPI_KEY")
 
 ARXIV_EMAIL = os.getenv("ARXIV_EMAIL")
 
+# external API endpoints; point them at benchmarks/stubs.py for offline load tests
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
+SERPAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com").rstrip("/")
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-SAMPLE_PDFS_DIR = os.path.join(BASE_DIR, "sample_pdfs")
-LOGS_DIR = os.path.join(BASE_DIR, "logs")
-RAG_INDEX_DIR = os.path.join(BASE_DIR, "rag_index")
+# overridable so load tests can run against a scratch copy of the data
+SAMPLE_PDFS_DIR = os.getenv("SAMPLE_PDFS_DIR", os.path.join(BASE_DIR, "sample_pdfs"))
+LOGS_DIR = os.getenv("LOGS_DIR", os.path.join(BASE_DIR, "logs"))
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(BASE_DIR, "rag_index"))
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(BASE_DIR, "cache"))
 
 # Limits & security
 MAX_PDF_SIZE_MB = int(os.getenv("MAX_PDF_SIZE_MB", "10"))  
 ALLOWED_UPLOAD_EXTENSIONS = {".pdf"}
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))  # uploads are streamed to disk
 
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
+# RAG index builds
+RAG_BUILD_WORKERS = int(os.getenv("RAG_BUILD_WORKERS", str(os.cpu_count() or 1)))
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "256"))
+RAG_CHUNK_WORDS = int(os.getenv("RAG_CHUNK_WORDS", "500"))  # max words per chunk, cut at sentence ends
+RAG_CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "50"))  # words of trailing sentences repeated
+RAG_STREAM_MIN_PAGES = int(os.getenv("RAG_STREAM_MIN_PAGES", "200"))  # PDFs this long are chunked page by page in-process
+
+# background ingestion jobs (uploads, index builds); finished jobs kept for /jobs.
+# Job states are saved to SQLite so every worker process can report them.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "1000"))
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(CACHE_DIR, "jobs.sqlite"))
+
+# on-disk embedding cache (rows of EMBEDDING_MODEL vectors, LRU-evicted past the limit)
+EMB_CACHE_ENABLED = os.getenv("EMB_CACHE_ENABLED", "1") == "1"
+EMB_CACHE_MAX_ENTRIES = int(os.getenv("EMB_CACHE_MAX_ENTRIES", "500000"))
+
+# FAISS index type: flat | ivf_flat | hnsw | ivf_pq
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")
+RAG_VECTOR_DTYPE = os.getenv("RAG_VECTOR_DTYPE", "float16")  # float32 | float16 | int8 storage for flat/hnsw/ivf_flat
+RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "1024"))
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "200"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+RAG_PQ_M = int(os.getenv("RAG_PQ_M", "16"))  # sub-quantizers; must divide the embedding dim
+RAG_PQ_NBITS = int(os.getenv("RAG_PQ_NBITS", "8"))
+# vectors buffered before training IVF-based indexes
+RAG_TRAIN_SIZE = int(os.getenv("RAG_TRAIN_SIZE", "50000"))
+
+# FAISS index sharding: shards are searched in parallel threads and their top-k merged;
+# vectors go to a shard by document (doc-restricted queries touch one shard) or by id hash
+RAG_SHARDS = int(os.getenv("RAG_SHARDS", "1"))
+RAG_SHARD_BY = os.getenv("RAG_SHARD_BY", "doc")
+RAG_SHARD_THREADS = int(os.getenv("RAG_SHARD_THREADS", str(min(RAG_SHARDS, os.cpu_count() or 1))))
+
+# published index versions: readers memory-map index files read-only (pages shared by
+# every worker process); the newest RAG_INDEX_KEEP_VERSIONS versions stay on disk
+RAG_INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "1") == "1"
+RAG_INDEX_KEEP_VERSIONS = max(2, int(os.getenv("RAG_INDEX_KEEP_VERSIONS", "2")))
+
+# shared HTTP connection pools (sync requests.Session and async httpx client)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+
+# LLM response cache: exact (model, system prompt, query, context hash) + optional semantic layer
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_SEMANTIC = os.getenv("LLM_CACHE_SEMANTIC", "0") == "1"
+LLM_CACHE_SIM_THRESHOLD = float(os.getenv("LLM_CACHE_SIM_THRESHOLD", "0.92"))
+
+# SerpAPI result cache: TTL + stale-while-revalidate window, persisted across restarts
+WEB_CACHE_ENABLED = os.getenv("WEB_CACHE_ENABLED", "1") == "1"
+WEB_CACHE_PATH = os.getenv("WEB_CACHE_PATH", os.path.join(CACHE_DIR, "web_cache.sqlite"))
+WEB_CACHE_TTL_S = float(os.getenv("WEB_CACHE_TTL_S", "3600"))
+WEB_CACHE_STALE_S = float(os.getenv("WEB_CACHE_STALE_S", str(24 * 3600)))
+WEB_CACHE_MAX_ENTRIES = int(os.getenv("WEB_CACHE_MAX_ENTRIES", "10000"))
+
+# local arXiv metadata store; cached topics are refreshed incrementally after the TTL
+ARXIV_STORE_PATH = os.getenv("ARXIV_STORE_PATH", os.path.join(CACHE_DIR, "arxiv.sqlite"))
+ARXIV_CACHE_TTL_S = float(os.getenv("ARXIV_CACHE_TTL_S", str(6 * 3600)))
+ARXIV_REFRESH_MAX = int(os.getenv("ARXIV_REFRESH_MAX", "100"))  # newest entries scanned per refresh
+ARXIV_PAGE_SIZE = int(os.getenv("ARXIV_PAGE_SIZE", "25"))
+
+# controller fan-out: agents run concurrently, each with its own deadline (seconds)
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "8"))
+AGENT_TIMEOUT_S = float(os.getenv("AGENT_TIMEOUT_S", "45"))
+AGENT_TIMEOUTS = {
+    "pdf_rag": float(os.getenv("AGENT_TIMEOUT_PDF_RAG", str(AGENT_TIMEOUT_S))),
+    "web_search": float(os.getenv("AGENT_TIMEOUT_WEB_SEARCH", str(AGENT_TIMEOUT_S))),
+    "arxiv": float(os.getenv("AGENT_TIMEOUT_ARXIV", str(AGENT_TIMEOUT_S))),
+}
+
+# RAG prompt context: overlapping neighbour chunks are merged, passages are picked
+# by maximal marginal relevance (lambda weighs relevance vs. diversity) up to a token budget
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+
+# retrieval: dense (FAISS) | lexical (BM25) | hybrid (rank fusion of both) |
+# auto (lexical for short lookups of a code-like term, which then skip the query embedding; hybrid otherwise)
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "auto")
+RAG_HYBRID_DEPTH = int(os.getenv("RAG_HYBRID_DEPTH", "50"))  # candidates per retriever before fusion
+RAG_KEYWORD_MAX_TERMS = int(os.getenv("RAG_KEYWORD_MAX_TERMS", "4"))
+RAG_BM25_K1 = float(os.getenv("RAG_BM25_K1", "1.2"))
+RAG_BM25_B = float(os.getenv("RAG_BM25_B", "0.75"))
+
+# /ask_batch: max questions per request and LLM calls in flight per batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+# load the embedding model and RAG index in the background when the API starts
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+# app.log is written by a background thread: records are batched and the file
+# rotates by size or age, keeping LOG_BACKUP_COUNT old files
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL_S = float(os.getenv("LOG_FLUSH_INTERVAL_S", "0.5"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_INTERVAL_S = float(os.getenv("LOG_ROTATE_INTERVAL_S", str(24 * 3600)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "100000"))
+
+# controller traces: SQLite store, expired by age and row count every TRACE_COMPACT_EVERY writes
+TRACE_STORE_PATH = os.getenv("TRACE_STORE_PATH", os.path.join(LOGS_DIR, "traces.sqlite"))
+TRACE_RETENTION_S = float(os.getenv("TRACE_RETENTION_S", str(30 * 24 * 3600)))
+TRACE_MAX_ROWS = int(os.getenv("TRACE_MAX_ROWS", "1000000"))
+TRACE_COMPACT_EVERY = int(os.getenv("TRACE_COMPACT_EVERY", "1000"))
+
 # directories exist
 os.makedirs(LOGS_DIR, exist_ok=True)
 os.makedirs(RAG_INDEX_DIR, exist_ok=True)
+os.makedirs(CACHE_DIR, exist_ok=True)
@@ -0,0 +1,152 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def _overlap_words(a: List[str], b: List[str], max_overlap: int) -> int:
+    """Length of the longest suffix of a that is also a prefix of b."""
+    for n in range(min(len(a), len(b), max_overlap), 0, -1):
+        if a[-n:] == b[:n]:
+            return n
+    return 0
+
+
+def merge_adjacent(results: List[Dict], max_overlap: int = 200) -> List[Dict]:
+    """
+    Merge retrieved chunks that are neighbours in the same document into one
+    passage, dropping the text they share through the chunker's overlap.
+    Passages keep the best retrieval rank and score of their chunks, the ranks
+    of all their chunks and the page range they span, and are returned best
+    first. results must be best first.
+    """
+    by_doc: Dict[str, List[Dict]] = {}
+    for rank, r in enumerate(results):
+        doc = r["meta"].get("doc_id") or r["meta"]["source"]
+        by_doc.setdefault(doc, []).append({**r, "rank": rank})
+
+    passages = []
+    for chunks in by_doc.values():
+        chunks.sort(key=lambda r: r["meta"]["chunk_id"])
+        current = None
+        for r in chunks:
+            if current is not None and r["meta"]["chunk_id"] == current["chunk_ids"][-1] + 1:
+                words = r["text"].split()
+                current["words"].extend(words[_overlap_words(current["words"], words, max_overlap):])
+                current["chunk_ids"].append(r["meta"]["chunk_id"])
+                current["texts"].append(r["text"])
+                current["ranks"].append(r["rank"])
+                if r["rank"] < current["rank"]:
+                    current["rank"], current["score"] = r["rank"], r["score"]
+                current["page_end"] = r["meta"].get("page_end", current["page_end"])
+                continue
+            current = {
+                "source": r["meta"]["source"],
+                "chunk_ids": [r["meta"]["chunk_id"]],
+                "texts": [r["text"]],
+                "ranks": [r["rank"]],
+                "words": r["text"].split(),
+                "score": r["score"],
+                "rank": r["rank"],
+                "page_start": r["meta"].get("page_start"),
+                "page_end": r["meta"].get("page_end"),
+            }
+            passages.append(current)
+
+    for p in passages:
+        p["text"] = " ".join(p.pop("words"))
+    # scores differ by retrieval mode (distance, BM25, fused); ranks do not
+    return sorted(passages, key=lambda p: p["rank"])
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.where(norms == 0, 1.0, norms)
+
+
+def mmr(query_vec: np.ndarray, vecs: np.ndarray, lam: float) -> List[int]:
+    """Order candidates by maximal marginal relevance (cosine similarity)."""
+    q = _normalize(np.asarray(query_vec, dtype="float32").ravel())
+    v = _normalize(np.asarray(vecs, dtype="float32"))
+    relevance = v @ q
+    pairwise = v @ v.T
+
+    order: List[int] = []
+    remaining = list(range(len(v)))
+    while remaining:
+        if order:
+            redundancy = pairwise[np.ix_(remaining, order)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lam * relevance[remaining] - (1 - lam) * redundancy
+        order.append(remaining.pop(int(np.argmax(scores))))
+    return order
+
+
+def _pages(start, end) -> str:
+    if start is None:
+        return ""
+    return f", p. {start}" if start == end else f", pp. {start}-{end}"
+
+
+def _excerpt(idx: int, p: Dict, text: str) -> str:
+    return f"[Excerpt {idx} from {p['source']}{_pages(p.get('page_start'), p.get('page_end'))}]:\n{text}\n"
+
+
+def build_context(query_vec: Optional[np.ndarray], results: List[Dict], result_vecs: Optional[np.ndarray],
+                  budget_tokens: int, lam: float = 0.7, min_tail_tokens: int = 64) -> Tuple[str, Dict]:
+    """
+    Assemble an LLM context from retrieval results:
+      1. merge overlapping neighbouring chunks into passages,
+      2. order passages by MMR against the query using result_vecs, the chunk
+         vectors aligned with results (a passage is the mean of its chunks'
+         vectors); without vectors (lexical retrieval) they keep their retrieval order,
+      3. add passages until budget_tokens is reached; the last one is truncated
+         if at least min_tail_tokens of budget remain.
+    Returns (context, stats) where stats reports the size of the verbatim top-3
+    context this replaces and of the assembled one.
+    """
+    baseline = "\n".join(
+        f"[Excerpt {i} from {r['meta']['source']}]:\n{r['text']}\n" for i, r in enumerate(results[:3], 1)
+    )
+    stats = {"chunks": len(results), "tokens_before": estimate_tokens(baseline), "budget_tokens": budget_tokens}
+    if not results:
+        stats.update(passages=0, selected=0, tokens_after=0)
+        return "", stats
+
+    passages = merge_adjacent(results)
+    if query_vec is None or result_vecs is None:
+        order = list(range(len(passages)))
+    else:
+        vecs = [_normalize(result_vecs[p["ranks"]]).mean(axis=0) for p in passages]
+        order = mmr(query_vec, np.vstack(vecs), lam)
+
+    parts: List[str] = []
+    used = 0
+    for i in order:
+        p = passages[i]
+        part = _excerpt(len(parts) + 1, p, p["text"])
+        cost = estimate_tokens(part) + 1
+        if used + cost <= budget_tokens:
+            parts.append(part)
+            used += cost
+            continue
+        remaining = budget_tokens - used
+        if remaining >= min_tail_tokens:
+            header = estimate_tokens(_excerpt(len(parts) + 1, p, "")) + 1
+            words = p["text"].split()
+            # estimate_tokens is character based; shrink until the truncated excerpt fits
+            keep = max(1, len(words) * (remaining - header) // max(1, cost - header))
+            while keep > 0 and estimate_tokens(_excerpt(len(parts) + 1, p, " ".join(words[:keep]) + " ...")) + 1 > remaining:
+                keep = keep * 9 // 10
+            if keep > 0:
+                parts.append(_excerpt(len(parts) + 1, p, " ".join(words[:keep]) + " ..."))
+        break
+
+    context = "\n".join(parts)
+    stats.update(passages=len(passages), selected=len(parts), tokens_after=estimate_tokens(context))
+    return context, stats
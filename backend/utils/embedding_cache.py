@@ -0,0 +1,197 @@
+import hashlib
+import pickle
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .config import RAG_INDEX_DIR, EMB_CACHE_MAX_ENTRIES
+from .logger import append_log
+from .metrics import count_cache
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of chunk embeddings for one model.
+
+    Vectors live in a memory-mapped float32 file (one row per entry); a small
+    pickled index maps sha1(text) -> row and tracks last use for LRU eviction.
+    The directory is per model, so keys are effectively (model name, text hash).
+    """
+
+    def __init__(self, model_name: str, dim: int, root: str = None, max_entries: int = EMB_CACHE_MAX_ENTRIES):
+        safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.dir = Path(root or Path(RAG_INDEX_DIR) / "emb_cache") / safe
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vec_path = self.dir / "vectors.f32"
+        self._idx_path = self.dir / "index.pkl"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._dirty = False
+
+        state = self._read_state()
+        if state is None or state.get("dim") != dim:
+            state = {"dim": dim, "capacity": 0, "rows": {}, "last_used": np.zeros(0, dtype="int64"), "tick": 0}
+            self._vec_path.write_bytes(b"")
+        self._apply(state)
+
+    def _read_state(self):
+        if not (self._idx_path.exists() and self._vec_path.exists()):
+            return None
+        try:
+            with open(self._idx_path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            append_log(f"Embedding cache index unreadable ({e}); starting empty.")
+            return None
+
+    def _apply(self, state: Dict):
+        self._rows: Dict[str, int] = state["rows"]
+        self._last_used: np.ndarray = state["last_used"]
+        self._tick: int = state["tick"]
+        self._capacity: int = state["capacity"]
+        used = set(self._rows.values())
+        self._free: List[int] = [r for r in range(self._capacity) if r not in used]
+        self._vectors = self._open(self._capacity)
+        self._stamp = self._file_stamp()
+
+    def _file_stamp(self):
+        try:
+            st = self._idx_path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self):
+        """
+        Reload the key index if another process flushed the cache since this one last
+        read or wrote it. Callers hold the index writer lock, so flushes do not interleave.
+        """
+        with self._lock:
+            if self._file_stamp() == self._stamp:
+                return
+            state = self._read_state()
+            if state is None or state.get("dim") != self.dim:
+                return
+            # unflushed entries of this process may point at rows the other one reused
+            self._vectors = None
+            self._apply(state)
+            self._dirty = False
+
+    def _open(self, capacity: int):
+        if capacity == 0:
+            return None
+        return np.memmap(self._vec_path, dtype="float32", mode="r+", shape=(capacity, self.dim))
+
+    def _grow(self, needed: int):
+        new_cap = min(self.max_entries, max(needed, self._capacity * 2, 1024))
+        if new_cap <= self._capacity:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vec_path, "r+b") as f:
+            f.truncate(new_cap * self.dim * 4)
+        self._last_used = np.concatenate([self._last_used, np.zeros(new_cap - self._capacity, dtype="int64")])
+        self._free.extend(range(self._capacity, new_cap))
+        self._capacity = new_cap
+        self._vectors = self._open(new_cap)
+
+    def _evict(self, count: int):
+        """Free the `count` least recently used rows."""
+        row_to_key = {r: k for k, r in self._rows.items()}
+        rows = np.fromiter(row_to_key, dtype="int64")
+        count = min(count, len(rows))
+        if count <= 0:
+            return
+        victims = rows[np.argpartition(self._last_used[rows], count - 1)[:count]]
+        for r in victims.tolist():
+            del self._rows[row_to_key[r]]
+            self._free.append(r)
+        self.evictions += count
+
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """Return (vectors, missing positions); rows for missing texts are left as zeros."""
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        missing = []
+        with self._lock:
+            self._tick += 1
+            for i, t in enumerate(texts):
+                row = self._rows.get(text_key(t))
+                if row is None:
+                    missing.append(i)
+                    continue
+                out[i] = self._vectors[row]
+                self._last_used[row] = self._tick
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            if len(texts) > len(missing):
+                self._dirty = True
+        count_cache("embedding", "hit", len(texts) - len(missing))
+        count_cache("embedding", "miss", len(missing))
+        return out, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        with self._lock:
+            new = {}
+            for t, v in zip(texts, vectors):
+                key = text_key(t)
+                if key not in self._rows:
+                    new[key] = v
+            new = list(new.items())
+            if not new:
+                return
+            if len(self._free) < len(new):
+                self._grow(len(self._rows) + len(new))
+            if len(self._free) < len(new):
+                # at the size limit: drop an extra 10% so we don't evict on every batch
+                self._evict(len(new) - len(self._free) + self.max_entries // 10)
+            self._tick += 1
+            for key, vec in new[: len(self._free)]:
+                row = self._free.pop()
+                self._vectors[row] = vec
+                self._rows[key] = row
+                self._last_used[row] = self._tick
+            self._dirty = True
+
+    def flush(self):
+        """Persist the memmap and the key index."""
+        with self._lock:
+            if not self._dirty:
+                return
+            if self._vectors is not None:
+                self._vectors.flush()
+            state = {
+                "dim": self.dim,
+                "capacity": self._capacity,
+                "rows": self._rows,
+                "last_used": self._last_used,
+                "tick": self._tick,
+            }
+            tmp = self._idx_path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f)
+            tmp.replace(self._idx_path)
+            self._stamp = self._file_stamp()
+            self._dirty = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._rows),
+                "capacity": self._capacity,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from typing import Dict
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY_S
+from .lazy import Lazy
+
+
+def _make_session() -> requests.Session:
+    # one keep-alive session per process instead of a new connection per call
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_MAX_KEEPALIVE, pool_maxsize=HTTP_MAX_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+HTTP_SESSION = Lazy(_make_session, "HTTP session")
+
+
+def get_session() -> requests.Session:
+    return HTTP_SESSION.get()
+
+
+# httpx.AsyncClient is bound to the loop it was first used on, so keep one per loop
+_ASYNC_CLIENTS: Dict[int, httpx.AsyncClient] = {}
+_ASYNC_LOCK = threading.Lock()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared keep-alive async client for the running event loop."""
+    loop_id = id(asyncio.get_running_loop())
+    client = _ASYNC_CLIENTS.get(loop_id)
+    if client is None:
+        with _ASYNC_LOCK:
+            client = _ASYNC_CLIENTS.get(loop_id)
+            if client is None:
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+                    ),
+                    follow_redirects=True,
+                )
+                _ASYNC_CLIENTS[loop_id] = client
+    return client
+
+
+async def aclose_clients():
+    """Close the async client of the current loop and the sync session (app shutdown)."""
+    client = _ASYNC_CLIENTS.pop(id(asyncio.get_running_loop()), None)
+    if client is not None:
+        await client.aclose()
+    if HTTP_SESSION.loaded:
+        HTTP_SESSION.get().close()
+        HTTP_SESSION.reset()
@@ -0,0 +1,188 @@
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from .job_store import JobStore
+from .lazy import Lazy
+from .logger import append_log, get_request_id
+
+# seconds between saves of a running job's progress counters to the job store
+PROGRESS_SAVE_INTERVAL_S = 1.0
+
+
+class Job:
+    """A queued unit of background work with counters the worker updates as it goes."""
+
+    def __init__(self, kind: str, key: Optional[str], params: Dict, on_progress: Callable[["Job"], None] = None):
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.key = key
+        self.params = params
+        self.status = "queued"
+        self.progress: Dict[str, int] = {}
+        self.result = None
+        self.error: Optional[str] = None
+        self.request_id = get_request_id()
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._on_progress = on_progress
+        self._saved = 0.0
+
+    def advance(self, **counters: int):
+        """Add to progress counters, e.g. advance(pages=3, chunks=12)."""
+        with self._lock:
+            for name, n in counters.items():
+                self.progress[name] = self.progress.get(name, 0) + n
+            now = time.time()
+            due = self._on_progress is not None and now - self._saved >= PROGRESS_SAVE_INTERVAL_S
+            if due:
+                self._saved = now
+        if due:
+            self._on_progress(self)
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            progress = dict(self.progress)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "progress": progress,
+            "result": self.result,
+            "error": self.error,
+            "request_id": self.request_id,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+    """
+    Background job runner with a bounded number of workers.
+    Jobs submitted with a key are deduplicated while one with the same key is
+    queued or running. Finished jobs are kept (up to max_history) for status queries.
+    With a store, job states are also saved there as they change, so status
+    queries answered by other worker processes see them.
+    """
+
+    def __init__(self, name: str, workers: int, max_history: int = 1000, store: Lazy[JobStore] = None):
+        self.name = name
+        self.max_history = max_history
+        self._store = store
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"{name}-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active_keys: Dict[str, Job] = {}
+
+    def submit(self, kind: str, fn: Callable[[Job], object], key: str = None, **params) -> Job:
+        """Queue fn(job); returns the already active job instead if one has the same key."""
+        with self._lock:
+            if key is not None and key in self._active_keys:
+                return self._active_keys[key]
+            job = Job(kind, key, params, on_progress=self._save if self._store is not None else None)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active_keys[key] = job
+            self._trim()
+        # saved before the id is handed out, so polling another worker finds it
+        self._save(job)
+        if self._store is not None:
+            self._call_store(lambda store: store.trim())
+        append_log(f"Queued {self.name} job {job.id} ({kind}).")
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], object]):
+        job.status = "running"
+        job.started = time.time()
+        self._save(job)
+        try:
+            job.result = fn(job)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            append_log(f"{self.name} job {job.id} failed: {e}", level="ERROR")
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                if job.key is not None and self._active_keys.get(job.key) is job:
+                    del self._active_keys[job.key]
+            self._save(job)
+            job._done.set()
+        append_log(f"{self.name} job {job.id} {job.status} in {job.finished - job.started:.2f}s.")
+
+    def _trim(self):
+        # drop the oldest finished jobs beyond max_history
+        excess = len(self._jobs) - self.max_history
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if not self._jobs[job_id].active:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _call_store(self, fn: Callable[[JobStore], object]):
+        try:
+            return fn(self._store.get())
+        except sqlite3.Error as e:
+            # the in-process state stays authoritative; only other workers miss the update
+            append_log(f"{self.name} job store unavailable: {e}", level="WARNING")
+            return None
+
+    def _save(self, job: Job):
+        if self._store is not None:
+            self._call_store(lambda store: store.put(job.to_dict()))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """State of a job of this process, or else as saved by any worker; None if unknown."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self._store is not None:
+            return self._call_store(lambda store: store.get(job_id))
+        return None
+
+    def active(self, key: str) -> Optional[Job]:
+        with self._lock:
+            return self._active_keys.get(key)
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        if self._store is not None:
+            rows = self._call_store(lambda store: store.recent(limit))
+            if rows is not None:
+                return rows
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return [j.to_dict() for j in reversed(jobs)]
+
+    def stats(self) -> Dict:
+        if self._store is not None:
+            counts = self._call_store(lambda store: store.counts())
+            if counts is not None:
+                return counts
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
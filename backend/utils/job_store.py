@@ -0,0 +1,64 @@
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+
+class JobStore:
+    """
+    Job states shared by every worker process (SQLite).
+
+    jobs: one row per job; body is the JSON of Job.to_dict(). Rows are replaced
+    as the job moves on, so any worker can answer /jobs/{id} for a job another
+    one runs. Finished jobs beyond max_rows are dropped, oldest first.
+    """
+
+    def __init__(self, path: str, max_rows: int):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, created REAL, status TEXT, body TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_created ON jobs(created);
+            """
+        )
+        self._db.commit()
+
+    def put(self, job: Dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (id, created, status, body) VALUES (?, ?, ?, ?)",
+                (job["id"], job["created"], job["status"], json.dumps(job, default=str)),
+            )
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT body FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT body FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def trim(self) -> int:
+        """Drop the oldest finished jobs beyond max_rows; returns rows removed."""
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND id NOT IN "
+                "(SELECT id FROM jobs ORDER BY created DESC LIMIT ?)",
+                (self.max_rows,),
+            ).rowcount
+            self._db.commit()
+        return removed
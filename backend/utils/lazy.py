@@ -0,0 +1,42 @@
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+from .logger import append_log
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Thread-safe, build-once holder for an expensive resource (model, index, client).
+    The factory runs on first get(); concurrent callers wait for the same instance.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str = None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "resource")
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+
+    def get(self) -> T:
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._value = self._factory()
+                self._loaded = True
+                append_log(f"Initialized {self._name} in {time.perf_counter() - start:.2f}s")
+        return self._value
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def reset(self):
+        """Forget the current instance; the next get() builds a new one."""
+        with self._lock:
+            self._value = None
+            self._loaded = False
@@ -1,75 +1,234 @@
-import os
-import requests
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional, Tuple
+from .config import (
+    GROQ_API_KEY,
+    GROQ_BASE_URL,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL_S,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_SEMANTIC,
+    LLM_CACHE_SIM_THRESHOLD,
+)
+from .http_clients import get_session, get_async_client
+from .lazy import Lazy
 from .logger import append_log
+from .metrics import stage, record_stage, count_error
+from .response_cache import ResponseCache
 
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY not set in environment")
+MODEL_NAME = "llama-3.1-8b-instant"
+GROQ_CHAT_URL = f"{GROQ_BASE_URL}/chat/completions"
+
+SYSTEM_PROMPT = """You are an intelligent AI assistant that provides detailed, accurate, and helpful answers.
+When given context information, analyze it carefully and synthesize an informative response that:
+- Directly answers the user's question
+- Provides relevant details and examples
+- Organizes information clearly with sections if needed
+- Cites specific sources when referencing information
+- Maintains a professional but conversational tone
+
+If no context is provided, use your general knowledge to give the best possible answer."""
+
+MISSING_KEY_MESSAGE = "GROQ_API_KEY not set in environment; cannot generate an LLM answer."
+
+
+def _headers() -> dict:
+    return {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+
+def _build_payload(query: str, context: str = None) -> dict:
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+    if context:
+        messages.append({
+            "role": "user",
+            "content": f"Here is some relevant information:\n\n{context}\n\nBased on this context, please answer: {query}"
+        })
+    else:
+        messages.append({"role": "user", "content": query})
+
+    return {
+        "model": MODEL_NAME,
+        "messages": messages,
+        "max_tokens": 800,  # detailed responses degree (increment for more detail)
+        "temperature": 0.7,  # creative synthesis degree (increment for more creativity)
+        "top_p": 0.9,
+        "stop": None
+    }
+
+
+def _parse_response(status_code: int, text: str, data_fn) -> Tuple[str, bool]:
+    """Return (answer text, ok); error texts are reported to the user but never cached."""
+    if status_code != 200:
+        append_log(f"GROQ HTTP Error {status_code}: {text[:200]}")
+        count_error("groq")
+        return f"GROQ API error {status_code}: {text}", False
+
+    data = data_fn()
+    message = (
+        data.get("choices", [{}])[0]
+        .get("message", {})
+        .get("content", "")
+        .strip()
+    )
+
+    append_log(f"GROQ summary generated ({len(message)} chars)")
+    return message or "No summary generated.", bool(message)
+
+
+def _embed_query(query: str):
+    # the embedding model lives in the RAG agent; imported lazily to avoid a cycle
+    from ..pdf_rag_agent import get_emb_model
+    return get_emb_model().encode([query], convert_to_numpy=True)[0]
+
+
+def _make_cache():
+    if not LLM_CACHE_ENABLED:
+        return None
+    return ResponseCache(
+        LLM_CACHE_PATH,
+        ttl_s=LLM_CACHE_TTL_S,
+        max_entries=LLM_CACHE_MAX_ENTRIES,
+        embed_fn=_embed_query if LLM_CACHE_SEMANTIC else None,
+        threshold=LLM_CACHE_SIM_THRESHOLD,
+    )
+
+
+RESPONSE_CACHE = Lazy(_make_cache, "LLM response cache")
+
+
+def _cache_get(query: str, context: str = None) -> Optional[str]:
+    cache = RESPONSE_CACHE.get()
+    if cache is None:
+        return None
+    hit = cache.get(MODEL_NAME, SYSTEM_PROMPT, query, context)
+    if hit is not None:
+        append_log(f"LLM cache hit ({len(hit)} chars)")
+    return hit
+
+
+def _cache_put(query: str, context: str, answer: str):
+    cache = RESPONSE_CACHE.get()
+    if cache is not None:
+        cache.put(MODEL_NAME, SYSTEM_PROMPT, query, context, answer)
 
-MODEL_NAME = "llama-3.1-8b-instant"  
 
 def generate_summary(query: str, context: str = None) -> str:
     """
     Generate an intelligent response using GROQ's LLM API.
-    
+    Answers are served from / stored in the response cache when enabled.
+
     Args:
         query: User's question or request
         context: Optional context from RAG or other sources
     """
+    # checked per call so that importing the backend works without a Groq key
+    if not GROQ_API_KEY:
+        append_log("GROQ_API_KEY not set; skipping LLM call.")
+        return MISSING_KEY_MESSAGE
+
+    cached = _cache_get(query, context)
+    if cached is not None:
+        return cached
+
     try:
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        system_prompt = """You are an intelligent AI assistant that provides detailed, accurate, and helpful answers.
-When given context information, analyze it carefully and synthesize an informative response that:
-- Directly answers the user's question
-- Provides relevant details and examples
-- Organizes information clearly with sections if needed
-- Cites specific sources when referencing information
-- Maintains a professional but conversational tone
+        # failures are counted below, including those after the call (e.g. a malformed body)
+        with stage("groq", errors=False):
+            response = get_session().post(
+                GROQ_CHAT_URL, headers=_headers(), json=_build_payload(query, context), timeout=30
+            )
+        answer, ok = _parse_response(response.status_code, response.text, response.json)
+        if ok:
+            _cache_put(query, context, answer)
+        return answer
 
-If no context is provided, use your general knowledge to give the best possible answer."""
+    except Exception as e:
+        append_log(f"GROQ API Exception: {e}")
+        count_error("groq")
+        return f"Error while summarizing via GROQ: {e}"
 
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        if context:
-            messages.append({
-                "role": "user", 
-                "content": f"Here is some relevant information:\n\n{context}\n\nBased on this context, please answer: {query}"
-            })
-        else:
-            messages.append({"role": "user", "content": query})
-            
-        payload = {
-            "model": MODEL_NAME,
-            "messages": messages,
-            "max_tokens": 800,  # detailed responses degree (increment for more detail)
-            "temperature": 0.7,  # creative synthesis degree (increment for more creativity)
-            "top_p": 0.9,
-            "stop": None
-        }
-
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-
-        if response.status_code != 200:
-            append_log(f"GROQ HTTP Error {response.status_code}: {response.text[:200]}")
-            return f"GROQ API error {response.status_code}: {response.text}"
-
-        data = response.json()
-        message = (
-            data.get("choices", [{}])[0]
-            .get("message", {})
-            .get("content", "")
-            .strip()
-        )
-
-        append_log(f"GROQ summary generated ({len(message)} chars)")
-        return message or "No summary generated."
+
+async def agenerate_summary(query: str, context: str = None) -> str:
+    """Async variant of generate_summary on the shared keep-alive httpx client."""
+    if not GROQ_API_KEY:
+        append_log("GROQ_API_KEY not set; skipping LLM call.")
+        return MISSING_KEY_MESSAGE
+
+    # SQLite lookups (and the optional query embedding) stay off the event loop
+    cached = await asyncio.to_thread(_cache_get, query, context)
+    if cached is not None:
+        return cached
+
+    try:
+        # failures are counted below, including those after the call (e.g. a malformed body)
+        with stage("groq", errors=False):
+            response = await get_async_client().post(
+                GROQ_CHAT_URL, headers=_headers(), json=_build_payload(query, context), timeout=30
+            )
+        answer, ok = _parse_response(response.status_code, response.text, response.json)
+        if ok:
+            await asyncio.to_thread(_cache_put, query, context, answer)
+        return answer
 
     except Exception as e:
         append_log(f"GROQ API Exception: {e}")
+        count_error("groq")
         return f"Error while summarizing via GROQ: {e}"
+
+
+async def astream_summary(query: str, context: str = None) -> AsyncIterator[str]:
+    """Stream the Groq completion token by token (OpenAI-style SSE deltas)."""
+    if not GROQ_API_KEY:
+        append_log("GROQ_API_KEY not set; skipping LLM call.")
+        yield MISSING_KEY_MESSAGE
+        return
+
+    cached = await asyncio.to_thread(_cache_get, query, context)
+    if cached is not None:
+        yield cached
+        return
+
+    payload = _build_payload(query, context)
+    payload["stream"] = True
+    try:
+        start = time.perf_counter()
+        async with get_async_client().stream(
+            "POST", GROQ_CHAT_URL, headers=_headers(), json=payload, timeout=30
+        ) as response:
+            record_stage("groq_first_byte", time.perf_counter() - start)
+            if response.status_code != 200:
+                text = (await response.aread()).decode("utf-8", errors="replace")
+                append_log(f"GROQ HTTP Error {response.status_code}: {text[:200]}")
+                count_error("groq")
+                yield f"GROQ API error {response.status_code}: {text}"
+                return
+
+            parts = []
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data).get("choices", [{}])[0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+
+        # includes the time the consumer takes to forward tokens
+        record_stage("groq_stream", time.perf_counter() - start)
+        answer = "".join(parts).strip()
+        append_log(f"GROQ streamed summary ({len(answer)} chars)")
+        if answer:
+            await asyncio.to_thread(_cache_put, query, context, answer)
+
+    except Exception as e:
+        append_log(f"GROQ API Exception: {e}")
+        count_error("groq")
+        yield f"Error while summarizing via GROQ: {e}"
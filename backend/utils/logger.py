@@ -1,25 +1,193 @@
+import atexit
+import contextvars
 import json
+import os
+import queue
+import threading
 import time
+import uuid
 from pathlib import Path
-from .config import LOGS_DIR
+from typing import Dict, List, Optional
+from .config import (
+    LOGS_DIR,
+    LOG_BATCH_SIZE,
+    LOG_FLUSH_INTERVAL_S,
+    LOG_MAX_BYTES,
+    LOG_ROTATE_INTERVAL_S,
+    LOG_BACKUP_COUNT,
+    LOG_QUEUE_MAX,
+)
+
+# id of the request being served; set by the API middleware, copied into threads/tasks
+REQUEST_ID: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id: Optional[str]) -> contextvars.Token:
+    return REQUEST_ID.set(request_id)
+
+
+def get_request_id() -> Optional[str]:
+    return REQUEST_ID.get()
+
 
 def _ts():
     return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
-def save_trace(trace: dict, filename: str = None):
+
+class _LogFile:
+    """An open log file that rotates by size or age (app.log -> app.log.1 -> ... app.log.N)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        self.f = open(self.path, "a", encoding="utf-8")
+        self.size = self.f.tell()
+        self.opened = self.path.stat().st_ctime if self.size else time.time()
+
+    def should_rotate(self) -> bool:
+        if LOG_MAX_BYTES and self.size >= LOG_MAX_BYTES:
+            return True
+        return bool(LOG_ROTATE_INTERVAL_S) and self.size > 0 and time.time() - self.opened >= LOG_ROTATE_INTERVAL_S
+
+    def rotate(self):
+        self.f.close()
+        for i in range(LOG_BACKUP_COUNT - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if LOG_BACKUP_COUNT > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._open()
+
+    def write(self, lines: List[str]):
+        for line in lines:
+            self.f.write(line)
+            self.size += len(line.encode("utf-8"))
+            if self.should_rotate():
+                self.rotate()
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class LogWriter:
+    """
+    Background log writer. append_log only enqueues a record; a single daemon
+    thread drains the queue in batches (LOG_BATCH_SIZE records or every
+    LOG_FLUSH_INTERVAL_S), writes them to their files and rotates them.
+    If the queue is full, records are dropped rather than blocking the caller.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._files: Dict[str, _LogFile] = {}
+        self.dropped = 0
+
+    def _ensure_started(self):
+        # the thread does not survive a fork; worker processes start their own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    self._queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+                    self._files = {}
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def put(self, filename: str, record: Dict):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((filename, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def _file(self, filename: str) -> _LogFile:
+        lf = self._files.get(filename)
+        if lf is None:
+            lf = self._files[filename] = _LogFile(Path(LOGS_DIR) / filename)
+        return lf
+
+    def _write(self, batch: List):
+        lines: Dict[str, List[str]] = {}
+        for filename, record in batch:
+            lines.setdefault(filename, []).append(json.dumps(record, default=str) + "\n")
+        for filename, chunk in lines.items():
+            try:
+                self._file(filename).write(chunk)
+            except OSError:
+                self.dropped += len(chunk)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + LOG_FLUSH_INTERVAL_S
+            waiters = []
+            while len(batch) < LOG_BATCH_SIZE and batch[-1][0] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                if item[0] is None:
+                    break
+            # flush() markers are (None, Event); write everything queued before them first
+            records = []
+            for item in batch:
+                (waiters if item[0] is None else records).append(item)
+            if records:
+                self._write(records)
+            for _, event in waiters:
+                event.set()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every record queued so far is on disk."""
+        if self._pid != os.getpid():
+            return True
+        event = threading.Event()
+        self._queue.put((None, event))
+        return event.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        self.flush(timeout)
+        for lf in self._files.values():
+            lf.close()
+        self._files = {}
+
+    def stats(self) -> Dict:
+        return {"queued": self._queue.qsize(), "dropped": self.dropped}
+
+
+LOG_WRITER = LogWriter()
+atexit.register(LOG_WRITER.flush)
+
+
+def flush_logs(timeout: float = 5.0) -> bool:
+    return LOG_WRITER.flush(timeout)
+
+
+def append_log(message: str, filename: str = "app.log", level: str = "INFO", **fields):
     """
-    Save a controller trace to logs directory.
-    trace: dictionary with keys: input, decision, rationale, agents_called, documents, answer
+    Queue a structured log record ({"ts", "level", "request_id", "msg", ...fields})
+    for the background writer; never blocks on disk I/O.
     """
-    if filename is None:
-        filename = f"trace_{int(time.time())}.json"
-    path = Path(LOGS_DIR) / filename
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump({"ts": _ts(), **trace}, f, indent=2)
-    return str(path)
-
-def append_log(message: str, filename: str = "app.log"):
-    path = Path(LOGS_DIR) / filename
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(f"[{_ts()}] {message}\n")
-    return str(path)
+    record = {"ts": _ts(), "level": level, "request_id": get_request_id(), "msg": message}
+    record.update(fields)
+    LOG_WRITER.put(filename, record)
+    return str(Path(LOGS_DIR) / filename)
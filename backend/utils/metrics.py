@@ -0,0 +1,153 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# latency buckets in seconds, from cache lookups up to slow LLM calls
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# per-request stage totals; shared (by reference) with threads and tasks that copy the context
+_BREAKDOWN: contextvars.ContextVar = contextvars.ContextVar("stage_breakdown", default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """
+    Process-wide histograms and counters, rendered in Prometheus text format.
+    Metric names are fixed by the call sites; labels are small string sets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, amount: float = 1, help: str = "", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    @staticmethod
+    def _fmt(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{self._fmt(labels)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._fmt(labels, (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._fmt(labels, (('le', '+Inf'),))} {hist.total}")
+                    lines.append(f"{name}_sum{self._fmt(labels)} {hist.sum}")
+                    lines.append(f"{name}_count{self._fmt(labels)} {hist.total}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def start_request() -> Dict:
+    """Begin a per-request stage breakdown for the current context and return it."""
+    breakdown = {"_lock": threading.Lock(), "stages": {}}
+    _BREAKDOWN.set(breakdown)
+    return breakdown
+
+
+def request_breakdown() -> Optional[Dict]:
+    """Stage totals recorded so far in the current request: {stage: {"count", "total_s"}}."""
+    breakdown = _BREAKDOWN.get()
+    if breakdown is None:
+        return None
+    with breakdown["_lock"]:
+        return {
+            name: {"count": s["count"], "total_s": round(s["total_s"], 4)}
+            for name, s in breakdown["stages"].items()
+        }
+
+
+def record_stage(name: str, seconds: float, ok: bool = True):
+    REGISTRY.observe("nebula_stage_seconds", seconds, help="Time spent per pipeline stage.", stage=name)
+    if not ok:
+        count_error(name)
+    breakdown = _BREAKDOWN.get()
+    if breakdown is not None:
+        with breakdown["_lock"]:
+            s = breakdown["stages"].setdefault(name, {"count": 0, "total_s": 0.0})
+            s["count"] += 1
+            s["total_s"] += seconds
+
+
+@contextmanager
+def stage(name: str, errors: bool = True) -> Iterator[None]:
+    """
+    Time a block as pipeline stage `name`; an exception counts as an error of that
+    stage, unless errors=False for callers that count the stage's failures themselves.
+    """
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        record_stage(name, time.perf_counter() - start, ok or not errors)
+
+
+def count_error(name: str):
+    REGISTRY.inc("nebula_stage_errors_total", help="Failed pipeline stage calls.", stage=name)
+
+
+def count_cache(cache: str, result: str, amount: int = 1):
+    if amount:
+        REGISTRY.inc("nebula_cache_requests_total", amount, help="Cache lookups by outcome.", cache=cache, result=result)
+
+
+def count_request(endpoint: str):
+    REGISTRY.inc("nebula_requests_total", help="Controller requests served.", endpoint=endpoint)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+# part headers are tiny; anything larger is not a browser or requests upload
+MAX_PART_HEADER_BYTES = 16 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """The uploaded file is larger than the allowed size."""
+
+
+class _Events:
+    """python-multipart callbacks, queued so the async reader can act on them between body chunks."""
+
+    def __init__(self):
+        self.queue: List[Tuple] = []
+        self._field = b""
+        self._value = b""
+        self._header_bytes = 0
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": lambda: self.queue.append(("headers",)),
+            "on_part_data": lambda data, start, end: self.queue.append(("data", data[start:end])),
+            "on_part_end": lambda: self.queue.append(("end",)),
+        }
+
+    def _part_begin(self):
+        self._header_bytes = 0
+        self.queue.append(("begin",))
+
+    def _header_field(self, data: bytes, start: int, end: int):
+        self._grow(end - start)
+        self._field += data[start:end]
+
+    def _header_value(self, data: bytes, start: int, end: int):
+        self._grow(end - start)
+        self._value += data[start:end]
+
+    def _header_end(self):
+        self.queue.append(("header", self._field.lower(), self._value))
+        self._field = self._value = b""
+
+    def _grow(self, n: int):
+        self._header_bytes += n
+        if self._header_bytes > MAX_PART_HEADER_BYTES:
+            raise ValueError("Multipart part headers too large.")
+
+
+async def receive_file(request: Request, field: str, directory: Path, limit: int,
+                       extensions: Iterable[str], write_bytes: int) -> Tuple[str, Path, str, int]:
+    """
+    Stream the `field` file of a multipart/form-data request straight from the
+    socket to a temporary file in directory, hashing it on the way; the body is
+    never buffered or spooled first, so a chunked upload without Content-Length
+    is cut off as soon as its file data passes limit bytes (UploadTooLarge).
+    Data is written in blocks of about write_bytes. Raises ValueError for a
+    malformed body, a missing field or a file name without one of extensions.
+    Returns (file name as sent, temp path, sha256 hex digest, size in bytes).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise ValueError("Expected a multipart/form-data body.")
+    events = _Events()
+    parser = MultipartParser(params[b"boundary"], events.callbacks())
+
+    filename, tmp, digest, size = None, None, hashlib.sha256(), 0
+    buf = bytearray()
+    headers, in_file, done = {}, False, False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for event in events.queue:
+                kind = event[0]
+                if kind == "begin":
+                    headers = {}
+                elif kind == "header":
+                    headers[event[1]] = event[2]
+                elif kind == "headers":
+                    _, options = parse_options_header(headers.get(b"content-disposition", b""))
+                    in_file = not done and options.get(b"name") == field.encode() and b"filename" in options
+                    if in_file:
+                        filename = options[b"filename"].decode("utf-8", "replace")
+                        if Path(filename).suffix.lower() not in extensions:
+                            raise ValueError("Invalid file type.")
+                        tmp = tempfile.NamedTemporaryFile(dir=directory, prefix=".upload_", suffix=".part", delete=False)
+                elif kind == "data" and in_file:
+                    size += len(event[1])
+                    if size > limit:
+                        raise UploadTooLarge(f"File larger than {limit} bytes.")
+                    digest.update(event[1])
+                    buf += event[1]
+                elif kind == "end" and in_file:
+                    in_file, done = False, True
+            events.queue.clear()
+            if len(buf) >= write_bytes or (done and buf):
+                await run_in_threadpool(tmp.write, bytes(buf))
+                buf.clear()
+        parser.finalize()
+        if not done:
+            raise ValueError(f"No complete '{field}' file in the upload.")
+        tmp.close()
+    except BaseException:
+        if tmp is not None:
+            tmp.close()
+            os.unlink(tmp.name)
+        raise
+    return filename, Path(tmp.name), digest.hexdigest(), size
@@ -0,0 +1,133 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from .logger import append_log
+from .metrics import count_cache
+
+
+def _sha(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class ResponseCache:
+    """
+    Persistent LLM response cache (SQLite) with TTL and LRU eviction.
+
+    Exact layer: key = (model, system prompt, normalized query, context hash).
+    Semantic layer (optional): among entries with the same model, system prompt
+    and context hash, reuse a response whose query embedding has cosine
+    similarity >= threshold with the new query.
+    """
+
+    def __init__(self, path: str, ttl_s: float, max_entries: int,
+                 embed_fn: Callable[[str], np.ndarray] = None, threshold: float = 0.92):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, scope TEXT, query TEXT, response TEXT,"
+            " embedding BLOB, created REAL, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_scope ON llm_cache(scope)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache(last_used)")
+        self._db.commit()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def keys(model: str, system_prompt: str, query: str, context: Optional[str]):
+        context_hash = _sha(context or "")
+        scope = _sha(model, system_prompt, context_hash)
+        return _sha(scope, normalize_query(query)), scope
+
+    def _embed(self, query: str) -> Optional[np.ndarray]:
+        if self.embed_fn is None:
+            return None
+        vec = np.asarray(self.embed_fn(normalize_query(query)), dtype="float32").ravel()
+        return vec / (np.linalg.norm(vec) or 1.0)
+
+    def get(self, model: str, system_prompt: str, query: str, context: Optional[str]) -> Optional[str]:
+        key, scope = self.keys(model, system_prompt, query, context)
+        now = time.time()
+        oldest = now - self.ttl_s
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND created >= ?", (key, oldest)
+            ).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self.exact_hits += 1
+                count_cache("llm", "hit")
+                return row[0]
+
+        if self.embed_fn is not None:
+            q = self._embed(query)
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT key, response, embedding FROM llm_cache"
+                    " WHERE scope = ? AND created >= ? AND embedding IS NOT NULL",
+                    (scope, oldest),
+                ).fetchall()
+                if rows:
+                    mat = np.vstack([np.frombuffer(r[2], dtype="float32") for r in rows])
+                    sims = mat @ q
+                    best = int(np.argmax(sims))
+                    if sims[best] >= self.threshold:
+                        self._db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, rows[best][0]))
+                        self._db.commit()
+                        self.semantic_hits += 1
+                        count_cache("llm", "semantic_hit")
+                        return rows[best][1]
+
+        with self._lock:
+            self.misses += 1
+        count_cache("llm", "miss")
+        return None
+
+    def put(self, model: str, system_prompt: str, query: str, context: Optional[str], response: str):
+        key, scope = self.keys(model, system_prompt, query, context)
+        emb = self._embed(query)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, query, response, emb.tobytes() if emb is not None else None, now, now),
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_s,))
+            (count,) = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM llm_cache WHERE key IN"
+                    " (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                append_log(f"LLM cache evicted {count - self.max_entries} least recently used entries.")
+            self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": entries,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,119 @@
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SHARD_BY = ("doc", "hash")
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool(workers: int) -> ThreadPoolExecutor:
+    # FAISS releases the GIL while searching, so threads search shards in parallel
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL._max_workers < workers:
+            _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="faiss-shard")
+        return _POOL
+
+
+def shard_of_doc(doc_id: str, n: int) -> int:
+    return zlib.crc32(doc_id.encode("utf-8")) % n
+
+
+def shard_of_ids(ids: np.ndarray, n: int) -> np.ndarray:
+    # splitmix64 finalizer: sequential ids spread evenly over the shards
+    z = np.asarray(ids, dtype="uint64") + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z % np.uint64(n)).astype("int64")
+
+
+def route(ids: np.ndarray, docs: Sequence[str], n: int, by: str) -> np.ndarray:
+    """Shard number of each vector: by its document (docs, one per id) or by a hash of its id."""
+    if by == "doc":
+        return np.fromiter((shard_of_doc(d, n) for d in docs), dtype="int64", count=len(ids))
+    return shard_of_ids(ids, n)
+
+
+def merge_topk(parts: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-shard (distances, ids) rows into the global top-k (smallest distance first)."""
+    if len(parts) == 1:
+        return parts[0]
+    D = np.hstack([p[0] for p in parts])
+    I = np.hstack([p[1] for p in parts])
+    top = np.argsort(D, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(D, top, axis=1), np.take_along_axis(I, top, axis=1)
+
+
+class ShardedIndex:
+    """
+    N ID-mapped FAISS indexes of the same type used as one: vectors are routed
+    to a shard by document or by id hash, searches run on every shard in
+    parallel and their top-k lists are merged. Vector ids are global.
+    """
+
+    def __init__(self, shards: List, by: str, threads: int):
+        if by not in SHARD_BY:
+            raise ValueError(f"Unknown shard key '{by}'. Choose one of {SHARD_BY}.")
+        self.shards = shards
+        self.by = by
+        self.threads = max(1, threads)
+
+    @property
+    def d(self) -> int:
+        return self.shards[0].d
+
+    @property
+    def ntotal(self) -> int:
+        return sum(s.ntotal for s in self.shards)
+
+    @property
+    def is_trained(self) -> bool:
+        return all(s.is_trained for s in self.shards)
+
+    def train(self, x: np.ndarray):
+        for s in self.shards:
+            if not s.is_trained:
+                s.train(x)
+
+    def add_with_ids(self, x: np.ndarray, ids: np.ndarray, docs: Sequence[str] = None):
+        target = route(ids, docs, len(self.shards), self.by)
+        for i, s in enumerate(self.shards):
+            mask = target == i
+            if mask.any():
+                s.add_with_ids(np.ascontiguousarray(x[mask]), ids[mask])
+
+    def reconstruct(self, vid: int) -> np.ndarray:
+        """Stored (decoded) vector of a global id, from whichever shard holds it."""
+        if self.by == "hash":
+            return self.shards[int(shard_of_ids(np.asarray([vid]), len(self.shards))[0])].reconstruct(vid)
+        for s in self.shards[:-1]:
+            try:
+                return s.reconstruct(vid)
+            except RuntimeError:
+                continue
+        return self.shards[-1].reconstruct(vid)
+
+    def shards_for_doc(self, doc_id: str) -> List[int]:
+        """Shards that can hold a document's vectors."""
+        if self.by == "doc":
+            return [shard_of_doc(doc_id, len(self.shards))]
+        return list(range(len(self.shards)))
+
+    def search(self, x: np.ndarray, k: int, params=None, shards: List[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """params is one search-parameters object for all shards or a list with one per shard."""
+        selected = list(shards) if shards is not None else list(range(len(self.shards)))
+
+        def one(i):
+            return self.shards[i].search(x, k, params=params[i] if isinstance(params, list) else params)
+
+        if len(selected) == 1 or self.threads == 1:
+            parts = [one(i) for i in selected]
+        else:
+            parts = list(_pool(self.threads).map(one, selected))
+        return merge_topk(parts, k)
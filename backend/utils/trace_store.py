@@ -0,0 +1,185 @@
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from .config import TRACE_STORE_PATH, TRACE_RETENTION_S, TRACE_MAX_ROWS, TRACE_COMPACT_EVERY
+from .lazy import Lazy
+from .logger import append_log, get_request_id
+
+
+_SEQ = itertools.count()
+
+
+def new_trace_id(ts: float = None) -> str:
+    """Unique, time-sortable id: millisecond timestamp, per-process sequence, random hex."""
+    ms = int((ts if ts is not None else time.time()) * 1000)
+    return f"{ms:013d}-{next(_SEQ) % 1000000:06d}{uuid.uuid4().hex[:8]}"
+
+
+def _id_bound(ts: float) -> str:
+    return f"{int(ts * 1000):013d}"
+
+
+class TraceStore:
+    """
+    Append-only controller trace store (SQLite).
+
+    traces:        one row per trace; id sorts by creation time, body is the JSON trace
+    trace_agents:  agents that ran for a trace
+    trace_sources: documents a trace used (retrieved sources and the uploaded PDF)
+    Traces older than retention_s, or beyond max_rows, are expired every
+    compact_every writes and the freed pages are returned to the filesystem.
+    """
+
+    def __init__(self, path: str, retention_s: float, max_rows: int, compact_every: int = 1000):
+        self.retention_s = retention_s
+        self.max_rows = max_rows
+        self.compact_every = compact_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # must be set before the first table is created to take effect
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS traces (
+                id TEXT PRIMARY KEY, ts REAL, request_id TEXT, input TEXT, agents TEXT, body TEXT
+            );
+            CREATE TABLE IF NOT EXISTS trace_agents (
+                trace_id TEXT, agent TEXT, PRIMARY KEY (agent, trace_id)
+            );
+            CREATE TABLE IF NOT EXISTS trace_sources (
+                trace_id TEXT, source TEXT, PRIMARY KEY (source, trace_id)
+            );
+            CREATE INDEX IF NOT EXISTS trace_agents_trace ON trace_agents(trace_id);
+            CREATE INDEX IF NOT EXISTS trace_sources_trace ON trace_sources(trace_id);
+            """
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _sources(trace: Dict) -> List[str]:
+        sources = {d.get("source") for d in trace.get("documents_retrieved", []) if d.get("source")}
+        if trace.get("uploaded_pdf"):
+            sources.add(os.path.basename(trace["uploaded_pdf"]))
+        return sorted(sources)
+
+    def put(self, trace: Dict) -> str:
+        """Append a trace and return its id."""
+        now = time.time()
+        trace_id = new_trace_id(now)
+        agents = trace.get("agents_called", [])
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO traces VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    trace_id,
+                    now,
+                    trace.get("request_id"),
+                    trace.get("input"),
+                    json.dumps(agents),
+                    json.dumps({"id": trace_id, **trace}, default=str),
+                ),
+            )
+            self._db.executemany("INSERT INTO trace_agents VALUES (?, ?)", [(trace_id, a) for a in agents])
+            self._db.executemany(
+                "INSERT INTO trace_sources VALUES (?, ?)", [(trace_id, s) for s in self._sources(trace)]
+            )
+            self._db.commit()
+            self._writes += 1
+            due = self._writes % self.compact_every == 0
+        if due:
+            self.compact()
+        return trace_id
+
+    def get(self, trace_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT body FROM traces WHERE id = ?", (trace_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, limit: int = 50, cursor: str = None, agent: str = None, source: str = None,
+              since: float = None, until: float = None) -> Dict:
+        """
+        Newest-first trace summaries. Pass the returned next_cursor back as
+        cursor to get the following page; it is None on the last page.
+        """
+        where, args = [], []
+        if cursor:
+            where.append("t.id < ?")
+            args.append(cursor)
+        if until is not None:
+            where.append("t.id < ?")
+            args.append(_id_bound(until))
+        if since is not None:
+            where.append("t.id >= ?")
+            args.append(_id_bound(since))
+        if agent:
+            where.append("EXISTS (SELECT 1 FROM trace_agents a WHERE a.agent = ? AND a.trace_id = t.id)")
+            args.append(agent)
+        if source:
+            where.append("EXISTS (SELECT 1 FROM trace_sources s WHERE s.source = ? AND s.trace_id = t.id)")
+            args.append(source)
+        sql = "SELECT t.id, t.ts, t.request_id, t.input, t.agents FROM traces t"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY t.id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, (*args, limit + 1)).fetchall()
+
+        traces = [
+            {"id": r[0], "ts": r[1], "request_id": r[2], "input": r[3], "agents": json.loads(r[4])}
+            for r in rows[:limit]
+        ]
+        next_cursor = traces[-1]["id"] if len(rows) > limit else None
+        return {"traces": traces, "next_cursor": next_cursor}
+
+    def compact(self) -> int:
+        """Expire traces past the retention period or over max_rows; returns how many were removed."""
+        with self._lock:
+            bound = _id_bound(time.time() - self.retention_s) if self.retention_s else ""
+            (count,) = self._db.execute("SELECT COUNT(*) FROM traces WHERE id >= ?", (bound,)).fetchone()
+            if self.max_rows and count > self.max_rows:
+                (oldest_kept,) = self._db.execute(
+                    "SELECT id FROM traces ORDER BY id DESC LIMIT 1 OFFSET ?", (self.max_rows - 1,)
+                ).fetchone()
+                bound = max(bound, oldest_kept)
+            removed = self._db.execute("DELETE FROM traces WHERE id < ?", (bound,)).rowcount
+            if removed:
+                self._db.execute("DELETE FROM trace_agents WHERE trace_id < ?", (bound,))
+                self._db.execute("DELETE FROM trace_sources WHERE trace_id < ?", (bound,))
+            self._db.commit()
+            if removed:
+                self._db.execute("PRAGMA incremental_vacuum")
+        if removed:
+            append_log(f"Trace store expired {removed} traces.")
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM traces").fetchone()
+            oldest = self._db.execute("SELECT MIN(ts) FROM traces").fetchone()[0]
+        return {"traces": count, "oldest_ts": oldest}
+
+
+def _make_store() -> TraceStore:
+    store = TraceStore(TRACE_STORE_PATH, TRACE_RETENTION_S, TRACE_MAX_ROWS, TRACE_COMPACT_EVERY)
+    store.compact()
+    return store
+
+
+TRACE_STORE = Lazy(_make_store, "trace store")
+
+
+def save_trace(trace: dict) -> str:
+    """
+    Save a controller trace to the trace store and return its id.
+    trace: dictionary with keys: input, decision, rationale, agents_called, documents, answer
+    """
+    return TRACE_STORE.get().put({"request_id": get_request_id(), **trace})
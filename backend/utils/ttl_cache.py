@@ -0,0 +1,207 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from .logger import append_log
+from .metrics import count_cache
+
+# compute functions return (value, cacheable); uncacheable values are returned but not stored
+Computed = Tuple[Any, bool]
+
+
+class TTLCache:
+    """
+    In-memory TTL cache with a persistent SQLite write-through store.
+
+    - fresh entries (age < ttl_s) are served directly;
+    - stale entries (age < ttl_s + stale_s) are served immediately while a single
+      background refresh runs (stale-while-revalidate);
+    - concurrent misses for the same key share one in-flight computation (single-flight).
+    The store is loaded into memory on start, so hot keys survive restarts.
+    """
+
+    def __init__(self, name: str, path: str, ttl_s: float, stale_s: float, max_entries: int):
+        self.name = name
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+        self.hits = self.stale_hits = self.misses = self.coalesced = self.refreshes = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY, value TEXT, created REAL)"
+        )
+        oldest = time.time() - ttl_s - stale_s
+        self._db.execute(f"DELETE FROM {name} WHERE created < ?", (oldest,))
+        self._db.commit()
+        rows = self._db.execute(
+            f"SELECT key, value, created FROM {name} ORDER BY created DESC LIMIT ?", (max_entries,)
+        ).fetchall()
+        for key, value, created in reversed(rows):
+            self._entries[key] = (json.loads(value), created)
+
+    def _lookup(self, key: str):
+        """Return (value, state) where state is "fresh", "stale" or None (miss)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        value, created = entry
+        age = time.time() - created
+        if age < self.ttl_s:
+            self._entries.move_to_end(key)
+            return value, "fresh"
+        if age < self.ttl_s + self.stale_s:
+            return value, "stale"
+        del self._entries[key]
+        return None, None
+
+    def _store(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.name} VALUES (?, ?, ?)", (key, json.dumps(value), now)
+            )
+            if evicted:
+                self._db.executemany(f"DELETE FROM {self.name} WHERE key = ?", [(k,) for k in evicted])
+            self._db.commit()
+
+    # --- sync -----------------------------------------------------------------
+
+    def _run_leader(self, key: str, compute: Callable[[], Computed], fut: Future):
+        try:
+            value, cacheable = compute()
+            if cacheable:
+                self._store(key, value)
+            fut.set_result(value)
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Computed]) -> Any:
+        with self._lock:
+            value, state = self._lookup(key)
+            if state == "fresh":
+                self.hits += 1
+                count_cache(self.name, "hit")
+                return value
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._inflight[key] = fut
+            if state == "stale":
+                self.stale_hits += 1
+                if leader:
+                    self.refreshes += 1
+            elif leader:
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        count_cache(self.name, state or ("miss" if leader else "coalesced"))
+
+        if state == "stale":
+            if leader:
+                threading.Thread(
+                    target=self._run_leader, args=(key, compute, fut), name=f"{self.name}-refresh", daemon=True
+                ).start()
+            return value
+        if leader:
+            self._run_leader(key, compute, fut)
+        return fut.result()
+
+    # --- async ----------------------------------------------------------------
+
+    async def _arun_leader(self, key: str, compute: Callable[[], Awaitable[Computed]], fut: asyncio.Future):
+        try:
+            value, cacheable = await compute()
+            if cacheable:
+                await asyncio.to_thread(self._store, key, value)
+            fut.set_result(value)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+        finally:
+            self._ainflight.pop(key, None)
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[Computed]]) -> Any:
+        # the async in-flight map is only touched from the event loop; the lock guards
+        # the entries and the counters, which the sync path updates too
+        with self._lock:
+            value, state = self._lookup(key)
+            if state == "fresh":
+                self.hits += 1
+            else:
+                fut = self._ainflight.get(key)
+                leader = fut is None
+                if state == "stale":
+                    self.stale_hits += 1
+                    if leader:
+                        self.refreshes += 1
+                elif leader:
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+        if state == "fresh":
+            count_cache(self.name, "hit")
+            return value
+        count_cache(self.name, state or ("miss" if leader else "coalesced"))
+
+        if leader:
+            fut = asyncio.get_running_loop().create_future()
+            # followers may never await a background refresh; don't warn about unretrieved errors
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._ainflight[key] = fut
+            # detached from the caller's task: a caller hitting its deadline must not
+            # cancel the computation other callers are waiting on
+            task = asyncio.create_task(self._arun_leader(key, compute, fut))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        if state == "stale":
+            return value
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            if not fut.cancelled():
+                raise  # this caller was cancelled
+        # the shared computation itself was cancelled (e.g. loop shutdown); compute for this caller
+        value, _ = await compute()
+        return value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "refreshes": self.refreshes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._db.execute(f"DELETE FROM {self.name}")
+            self._db.commit()
+        append_log(f"Cleared {self.name} cache.")
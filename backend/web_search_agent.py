@@ -1,92 +1,162 @@
-import os
-import requests
-from typing import Dict
-from .utils.config import SERPAPI_KEY
+from typing import Dict, Tuple
+from .utils.config import (
+    SERPAPI_KEY,
+    SERPAPI_BASE_URL,
+    WEB_CACHE_ENABLED,
+    WEB_CACHE_PATH,
+    WEB_CACHE_TTL_S,
+    WEB_CACHE_STALE_S,
+    WEB_CACHE_MAX_ENTRIES,
+)
+from .utils.http_clients import get_session, get_async_client
+from .utils.lazy import Lazy
 from .utils.logger import append_log
-from serpapi import GoogleSearch
+from .utils.metrics import stage, count_error
+from .utils.ttl_cache import TTLCache
 
+SERPAPI_URL = f"{SERPAPI_BASE_URL}/search"
 
-def web_search(query: str, top_k: int = 5) -> Dict:
-    """
-    Perform a live web search using SerpAPI.
-    Returns a dictionary of search results (title, snippet, and link).
-    """
-    append_log(f"Web Search triggered for: '{query}'")
 
-    # test API key
-    if not SERPAPI_KEY:
-        append_log("No SERPAPI_KEY found. Returning fallback result.")
-        return {
-            "query": query,
-            "source": "fallback",
-            "results": [
-                {
-                    "title": "No API key provided",
-                    "snippet": "Please connect your SerpAPI key in config.py or .env for live web results.",
-                    "link": ""
-                }
-            ]
-        }
+def _make_cache():
+    if not WEB_CACHE_ENABLED:
+        return None
+    return TTLCache("web_search", WEB_CACHE_PATH, WEB_CACHE_TTL_S, WEB_CACHE_STALE_S, WEB_CACHE_MAX_ENTRIES)
 
-    #Serpapi search
-    try:
-        params = {
-            "engine": "google",
-            "q": query,
-            "api_key": SERPAPI_KEY,
-            "num": top_k
-        }
-
-        resp = requests.get("https://serpapi.com/search", params=params, timeout=20)
-
-        if resp.status_code != 200:
-            append_log(f"SerpAPI HTTP Error: {resp.status_code} - {resp.text}")
-            return {
-                "query": query,
-                "source": "serpapi",
-                "results": [
-                    {
-                        "title": "SerpAPI Error",
-                        "snippet": f"Error code: {resp.status_code}. Check API key or quota.",
-                        "link": ""
-                    }
-                ]
+
+WEB_CACHE = Lazy(_make_cache, "web search cache")
+
+
+def _cache_key(query: str, top_k: int) -> str:
+    return f"{top_k}:{' '.join(query.lower().split())}"
+
+
+def _fallback_result(query: str) -> Dict:
+    append_log("No SERPAPI_KEY found. Returning fallback result.")
+    return {
+        "query": query,
+        "source": "fallback",
+        "results": [
+            {
+                "title": "No API key provided",
+                "snippet": "Please connect your SerpAPI key in config.py or .env for live web results.",
+                "link": ""
             }
+        ]
+    }
+
 
-        data = resp.json()
-        organic_results = data.get("organic_results", [])[:top_k]
-
-        if not organic_results:
-            append_log(f"No results found for query: {query}")
-            return {
-                "query": query,
-                "source": "serpapi",
-                "results": [
-                    {"title": "No results found", "snippet": "Try another query.", "link": ""}
-                ]
+def _error_result(query: str, e: Exception) -> Dict:
+    append_log(f"Web Search Exception: {e}")
+    return {
+        "query": query,
+        "source": "error",
+        "results": [
+            {
+                "title": "Network or API Error",
+                "snippet": f"Error occurred: {e}",
+                "link": ""
             }
+        ]
+    }
 
-        results = []
-        for r in organic_results:
-            results.append({
-                "title": r.get("title", "Untitled Result"),
-                "snippet": r.get("snippet", "No description available."),
-                "link": r.get("link", "")
-            })
 
-        append_log(f"Web Search returned {len(results)} live results for: {query}")
-        return {"query": query, "source": "serpapi", "results": results}
+def _params(query: str, top_k: int) -> Dict:
+    return {
+        "engine": "google",
+        "q": query,
+        "api_key": SERPAPI_KEY,
+        "num": top_k
+    }
 
-    except Exception as e:
-        append_log(f"Web Search Exception: {e}")
+
+def _parse_response(query: str, top_k: int, status_code: int, text: str, data_fn) -> Tuple[Dict, bool]:
+    """Return (result, cacheable); HTTP errors are reported but not cached."""
+    if status_code != 200:
+        append_log(f"SerpAPI HTTP Error: {status_code} - {text}")
+        count_error("serpapi")
         return {
             "query": query,
-            "source": "error",
+            "source": "serpapi",
             "results": [
                 {
-                    "title": "Network or API Error",
-                    "snippet": f"Error occurred: {e}",
+                    "title": "SerpAPI Error",
+                    "snippet": f"Error code: {status_code}. Check API key or quota.",
                     "link": ""
                 }
             ]
-        }
+        }, False
+
+    data = data_fn()
+    organic_results = data.get("organic_results", [])[:top_k]
+
+    if not organic_results:
+        append_log(f"No results found for query: {query}")
+        return {
+            "query": query,
+            "source": "serpapi",
+            "results": [
+                {"title": "No results found", "snippet": "Try another query.", "link": ""}
+            ]
+        }, True
+
+    results = []
+    for r in organic_results:
+        results.append({
+            "title": r.get("title", "Untitled Result"),
+            "snippet": r.get("snippet", "No description available."),
+            "link": r.get("link", "")
+        })
+
+    append_log(f"Web Search returned {len(results)} live results for: {query}")
+    return {"query": query, "source": "serpapi", "results": results}, True
+
+
+def _fetch(query: str, top_k: int) -> Tuple[Dict, bool]:
+    try:
+        with stage("serpapi"):
+            resp = get_session().get(SERPAPI_URL, params=_params(query, top_k), timeout=20)
+        return _parse_response(query, top_k, resp.status_code, resp.text, resp.json)
+    except Exception as e:
+        return _error_result(query, e), False
+
+
+async def _afetch(query: str, top_k: int) -> Tuple[Dict, bool]:
+    try:
+        with stage("serpapi"):
+            resp = await get_async_client().get(SERPAPI_URL, params=_params(query, top_k), timeout=20)
+        return _parse_response(query, top_k, resp.status_code, resp.text, resp.json)
+    except Exception as e:
+        return _error_result(query, e), False
+
+
+def web_search(query: str, top_k: int = 5) -> Dict:
+    """
+    Perform a live web search using SerpAPI.
+    Returns a dictionary of search results (title, snippet, and link).
+    Results are cached per (normalized query, top_k); concurrent identical
+    searches share one SerpAPI call.
+    """
+    append_log(f"Web Search triggered for: '{query}'")
+
+    # test API key
+    if not SERPAPI_KEY:
+        return _fallback_result(query)
+
+    #Serpapi search
+    cache = WEB_CACHE.get()
+    if cache is None:
+        return _fetch(query, top_k)[0]
+    return cache.get_or_compute(_cache_key(query, top_k), lambda: _fetch(query, top_k))
+
+
+async def aweb_search(query: str, top_k: int = 5) -> Dict:
+    """Async variant of web_search on the shared keep-alive httpx client."""
+    append_log(f"Web Search triggered for: '{query}'")
+
+    if not SERPAPI_KEY:
+        return _fallback_result(query)
+
+    cache = WEB_CACHE.get()
+    if cache is None:
+        return (await _afetch(query, top_k))[0]
+    return await cache.aget_or_compute(_cache_key(query, top_k), lambda: _afetch(query, top_k))
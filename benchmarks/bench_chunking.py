@@ -0,0 +1,98 @@
+"""
+Compare whole-document extraction + chunking with the page-streaming pipeline.
+
+  * whole:   extract_text_from_pdf + chunk_text (every page joined into one string)
+  * stream:  iter_pages + iter_chunks (one page and one chunk in memory at a time)
+
+For each a synthetic PDF of --pages pages is chunked and the chunks consumed
+one by one, as the index build does. Reported per pipeline: wall time, pages
+per second, chunk count and peak Python heap (tracemalloc).
+
+    python benchmarks/bench_chunking.py --pages 2000 --runs 3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend.pdf_rag_agent import chunk_text, extract_text_from_pdf, iter_chunks, iter_pages  # noqa: E402
+
+WORDS = (
+    "the model index vector query latency memory throughput manual section figure table value "
+    "system device configuration parameter operation procedure output input signal"
+).split()
+
+
+def make_pdf(path: str, pages: int, words_per_page: int, seed: int = 0):
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        sentences = []
+        n = 0
+        while n < words_per_page:
+            k = rng.randint(6, 24)
+            sentences.append(" ".join(rng.choice(WORDS) for _ in range(k)).capitalize() + ".")
+            n += k
+        doc.new_page().insert_textbox(fitz.Rect(36, 36, 576, 806), " ".join(sentences), fontsize=7)
+    doc.save(path)
+    doc.close()
+
+
+def run_whole(path: str) -> int:
+    n = 0
+    for _ in chunk_text(extract_text_from_pdf(path)):
+        n += 1
+    return n
+
+
+def run_stream(path: str) -> int:
+    n = 0
+    for _ in iter_chunks(iter_pages(path)):
+        n += 1
+    return n
+
+
+def measure(fn, path: str, runs: int):
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        chunks = fn(path)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, chunks, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--words-per-page", type=int, default=600)
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per pipeline (best is reported)")
+    parser.add_argument("--pdf", default=None, help="use this PDF instead of generating one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf
+        if path is None:
+            path = os.path.join(tmp, "manual.pdf")
+            make_pdf(path, args.pages, args.words_per_page)
+        pages = sum(1 for _ in iter_pages(path))
+        print(f"{path}: {pages} pages, {os.path.getsize(path) / 1e6:.1f} MB")
+        print(f"{'pipeline':>10} {'time_s':>8} {'pages/s':>9} {'chunks':>7} {'peak_mb':>8}")
+        for name, fn in (("whole", run_whole), ("stream", run_stream)):
+            elapsed, chunks, peak = measure(fn, path, args.runs)
+            print(f"{name:>10} {elapsed:8.2f} {pages / elapsed:9.0f} {chunks:7d} {peak / 1e6:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
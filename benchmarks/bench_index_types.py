@@ -0,0 +1,106 @@
+"""
+Compare the RAG index types (flat, ivf_flat, hnsw, ivf_pq) on a synthetic corpus.
+
+Reports recall@k against the exact flat baseline, build time, query latency
+and serialized index size, for each vector storage dtype (float32, float16, int8). Tunables (nlist, nprobe, efSearch, PQ m/nbits) are
+read from the same RAG_* environment variables as the backend.
+
+    python benchmarks/bench_index_types.py --n 100000 --dim 384 --queries 1000 --k 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss  # noqa: E402
+from backend.pdf_rag_agent import INDEX_TYPES, VECTOR_DTYPES, make_index, needs_training, search_params  # noqa: E402
+
+
+def synthetic_corpus(n: int, dim: int, n_clusters: int, seed: int = 0) -> np.ndarray:
+    """Clustered, L2-normalized vectors — closer to sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype("float32")
+    assign = rng.integers(0, n_clusters, size=n)
+    x = centers[assign] + 0.3 * rng.standard_normal((n, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return np.ascontiguousarray(x, dtype="float32")
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(index_type: str, dtype: str, xb: np.ndarray, xq: np.ndarray, k: int, truth: np.ndarray):
+    dim = xb.shape[1]
+    ids = np.arange(len(xb), dtype="int64")
+
+    t0 = time.perf_counter()
+    n_train = len(xb) if needs_training(index_type, dtype) else None
+    index = make_index(dim, index_type, n_train=n_train, vector_dtype=dtype)
+    if not index.is_trained:
+        index.train(xb)
+    index.add_with_ids(xb, ids)
+    build_s = time.perf_counter() - t0
+
+    params = search_params(index)
+    latencies = []
+    found = np.empty((len(xq), k), dtype="int64")
+    for i in range(len(xq)):
+        t0 = time.perf_counter()
+        _, I = index.search(xq[i:i + 1], k, params=params)
+        latencies.append(time.perf_counter() - t0)
+        found[i] = I[0]
+
+    t0 = time.perf_counter()
+    index.search(xq, k, params=params)
+    batch_s = time.perf_counter() - t0
+
+    lat_ms = np.asarray(latencies) * 1000
+    return {
+        "type": index_type,
+        "dtype": dtype,
+        "recall": recall_at_k(found, truth),
+        "build_s": build_s,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+        "batch_qps": len(xq) / batch_s,
+        "size_mb": len(faiss.serialize_index(index)) / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000, help="corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="vector dimension (MiniLM is 384)")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--dtypes", nargs="+", default=list(VECTOR_DTYPES), choices=list(VECTOR_DTYPES))
+    args = parser.parse_args()
+
+    data = synthetic_corpus(args.n + args.queries, args.dim, args.clusters)
+    xb, xq = data[:args.n], data[args.n:]
+
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(xb)
+    _, truth = exact.search(xq, args.k)
+
+    print(f"corpus={args.n} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'type':<10}{'dtype':<9}{'recall@k':>10}{'build s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'batch qps':>12}{'size MB':>10}")
+    for index_type in args.types:
+        # PQ codes do not depend on the storage dtype
+        for dtype in (args.dtypes[:1] if index_type == "ivf_pq" else args.dtypes):
+            r = run(index_type, dtype, xb, xq, args.k, truth)
+            print(f"{r['type']:<10}{r['dtype']:<9}{r['recall']:>10.3f}{r['build_s']:>10.2f}{r['p50_ms']:>10.3f}"
+                  f"{r['p99_ms']:>10.3f}{r['batch_qps']:>12.0f}{r['size_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Measure query latency against shard count on a synthetic corpus.
+
+The corpus is split by id hash into 1, 2, 4, ... shards of the configured
+index type (new_index with shard_by=hash); each query searches every shard
+in parallel and merges the per-shard top-k. Reported per shard count:
+recall@k against exact search, build time, single-query p50/p99 and batch
+throughput. Tunables are read from the same RAG_* environment variables as
+the backend.
+
+    python benchmarks/bench_shards.py --n 200000 --shards 1 2 4 8 --type hnsw
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss  # noqa: E402
+from backend.pdf_rag_agent import INDEX_TYPES, VECTOR_DTYPES, needs_training, new_index, search_params  # noqa: E402
+from bench_index_types import recall_at_k, synthetic_corpus  # noqa: E402
+
+
+def run(shards: int, index_type: str, dtype: str, xb: np.ndarray, xq: np.ndarray, k: int, truth: np.ndarray,
+        threads: int):
+    ids = np.arange(len(xb), dtype="int64")
+
+    t0 = time.perf_counter()
+    n_train = len(xb) // shards if needs_training(index_type, dtype) else None
+    index = new_index(xb.shape[1], n_train=n_train, shards=shards, shard_by="hash",
+                      index_type=index_type, vector_dtype=dtype)
+    if shards > 1:
+        index.threads = threads or shards
+    if not index.is_trained:
+        index.train(xb)
+    index.add_with_ids(xb, ids)
+    build_s = time.perf_counter() - t0
+
+    params = search_params(index)
+    latencies = []
+    found = np.empty((len(xq), k), dtype="int64")
+    for i in range(len(xq)):
+        t0 = time.perf_counter()
+        _, I = index.search(xq[i:i + 1], k, params=params)
+        latencies.append(time.perf_counter() - t0)
+        found[i] = I[0]
+
+    t0 = time.perf_counter()
+    index.search(xq, k, params=params)
+    batch_s = time.perf_counter() - t0
+
+    lat_ms = np.asarray(latencies) * 1000
+    return {
+        "shards": shards,
+        "recall": recall_at_k(found, truth),
+        "build_s": build_s,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+        "batch_qps": len(xq) / batch_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000, help="corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="vector dimension (MiniLM is 384)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--shards", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, default=0, help="search threads (default: one per shard)")
+    parser.add_argument("--type", default="flat", choices=INDEX_TYPES)
+    parser.add_argument("--dtype", default="float32", choices=list(VECTOR_DTYPES))
+    args = parser.parse_args()
+
+    data = synthetic_corpus(args.n + args.queries, args.dim, args.clusters)
+    xb, xq = data[:args.n], data[args.n:]
+
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(xb)
+    _, truth = exact.search(xq, args.k)
+
+    print(f"corpus={args.n} dim={args.dim} queries={args.queries} k={args.k} type={args.type} "
+          f"dtype={args.dtype} faiss_threads={faiss.omp_get_max_threads()}")
+    print(f"{'shards':>6}{'recall@k':>10}{'build s':>10}{'p50 ms':>10}{'p99 ms':>10}{'batch qps':>12}")
+    for shards in args.shards:
+        r = run(shards, args.type, args.dtype, xb, xq, args.k, truth, args.threads)
+        print(f"{r['shards']:>6}{r['recall']:>10.3f}{r['build_s']:>10.2f}{r['p50_ms']:>10.3f}"
+              f"{r['p99_ms']:>10.3f}{r['batch_qps']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
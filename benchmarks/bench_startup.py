@@ -0,0 +1,100 @@
+"""
+Measure backend import time and cold start of `uvicorn backend.main:app`.
+
+  * import:  wall time of `import backend.main` in a fresh interpreter
+  * ready:   time from spawning uvicorn until GET /health answers
+  * warm:    time until /health reports the embedding model loaded (background warm-up)
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import backend.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import() -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_cold_start(timeout: float, wait_warm: bool):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    ready = warm = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    body = json.loads(resp.read())
+                if ready is None:
+                    ready = time.perf_counter() - start
+                if body.get("warm"):
+                    warm = time.perf_counter() - start
+                    break
+                if not wait_warm:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return ready, warm
+
+
+def summarize(label: str, values):
+    values = [v for v in values if v is not None]
+    if not values:
+        print(f"{label:<8} n/a")
+        return
+    print(f"{label:<8} min={min(values):.3f}s median={statistics.median(values):.3f}s max={max(values):.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--no-warm", action="store_true", help="do not wait for the background warm-up")
+    args = parser.parse_args()
+
+    imports, readies, warms = [], [], []
+    for _ in range(args.runs):
+        imports.append(time_import())
+        ready, warm = time_cold_start(args.timeout, wait_warm=not args.no_warm)
+        readies.append(ready)
+        warms.append(warm)
+
+    summarize("import", imports)
+    summarize("ready", readies)
+    if not args.no_warm:
+        summarize("warm", warms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Offline load test for the API: /ask, /upload_pdf and the RAG index build.
+
+Starts benchmarks/stubs.py in place of Groq, SerpAPI and arXiv, and a backend
+(uvicorn backend.main:app) whose data, index, cache and log directories live
+in a scratch directory seeded with sample_pdfs. Every route is then driven at
+a fixed concurrency and p50/p95/p99 latency and requests per second are
+reported per route.
+
+    python benchmarks/load_test.py --concurrency 16 --requests 200 --groq-ms 800 --serpapi-ms 300
+    python benchmarks/load_test.py --routes ask --base-url http://127.0.0.1:8000   # existing server
+
+Uploads use freshly generated PDFs so each one is really extracted and embedded.
+The RAG build runs in this process, building separate indexes from the sample PDFs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ("ask", "upload", "build")
+
+ASK_QUERIES = [
+    "What is the latest news on AI agents?",
+    "Find arxiv papers on retrieval augmented generation",
+    "Explain how vector embeddings enable semantic search",
+    "Recent research on scaling AI deployment",
+]
+
+WORDS = (
+    "model agent retrieval vector index embedding latency cache query document context answer "
+    "search research paper deployment scaling memory token batch server request pipeline stage"
+).split()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float, ready: Callable[[Dict], bool] = lambda body: True):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if ready(json.loads(resp.read() or b"{}")):
+                    return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def make_pdf(path: str, pages: int, rng: random.Random):
+    """A PDF of random prose, unique per call so it is never deduplicated."""
+    import fitz
+
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = " ".join(rng.choice(WORDS) for _ in range(450))
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def summarize(route: str, latencies: List[float], errors: int, elapsed: float) -> Dict:
+    lat = np.asarray(latencies) * 1000
+    n = len(latencies)
+    return {
+        "route": route,
+        "requests": n,
+        "errors": errors,
+        "rps": round(n / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(float(np.percentile(lat, 50)), 1) if n else None,
+        "p95_ms": round(float(np.percentile(lat, 95)), 1) if n else None,
+        "p99_ms": round(float(np.percentile(lat, 99)), 1) if n else None,
+        "mean_ms": round(float(lat.mean()), 1) if n else None,
+    }
+
+
+async def drive(route: str, n: int, concurrency: int, send: Callable) -> Dict:
+    """Send n requests with `concurrency` workers; send(i) returns True on success."""
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(n))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                t0 = time.perf_counter()
+                try:
+                    ok = await send(client, i)
+                except Exception:
+                    ok = False
+                latencies.append(time.perf_counter() - t0)
+                errors += not ok
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarize(route, latencies, errors, elapsed)
+
+
+def bench_ask(base_url: str, n: int, concurrency: int, pdf_path: Optional[str]) -> Dict:
+    async def send(client, i):
+        query = ASK_QUERIES[i % len(ASK_QUERIES)]
+        payload = {"query": query, "uploaded_pdf_path": pdf_path if i % 5 == 4 else None}
+        resp = await client.post(f"{base_url}/ask", json=payload)
+        return resp.status_code == 200
+
+    return asyncio.run(drive("ask", n, concurrency, send))
+
+
+def bench_upload(base_url: str, n: int, concurrency: int, workdir: str, pages: int) -> Dict:
+    rng = random.Random(0)
+    paths = []
+    for i in range(n):
+        path = os.path.join(workdir, f"load_{i}.pdf")
+        make_pdf(path, pages, rng)
+        paths.append(path)
+
+    async def send(client, i):
+        with open(paths[i], "rb") as f:
+            files = {"file": (os.path.basename(paths[i]), f.read(), "application/pdf")}
+        resp = await client.post(f"{base_url}/upload_pdf", files=files)
+        return resp.status_code == 200
+
+    return asyncio.run(drive("upload_pdf", n, concurrency, send))
+
+
+def bench_build(n: int, concurrency: int) -> Dict:
+    # imported here so the scratch directories from the environment are picked up
+    sys.path.insert(0, ROOT)
+    from backend.pdf_rag_agent import build_or_update_index, get_emb_model
+    from backend.utils.config import SAMPLE_PDFS_DIR
+
+    get_emb_model()
+    pdfs = sorted(os.path.join(SAMPLE_PDFS_DIR, f) for f in os.listdir(SAMPLE_PDFS_DIR) if f.endswith(".pdf"))
+
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            build_or_update_index(pdfs, index_name=f"load_build_{i}")
+            return time.perf_counter() - t0, True
+        except Exception:
+            return time.perf_counter() - t0, False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n)))
+    elapsed = time.perf_counter() - start
+    return summarize("rag_build", [r[0] for r in results], sum(not r[1] for r in results), elapsed)
+
+
+def print_table(rows: List[Dict]):
+    cols = ["route", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "mean_ms"]
+    print(" ".join(f"{c:>10}" for c in cols))
+    for r in rows:
+        print(" ".join(f"{str(r[c]):>10}" for c in cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", default=",".join(ROUTES), help=f"comma-separated subset of {ROUTES}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per HTTP route")
+    parser.add_argument("--uploads", type=int, default=20, help="PDFs uploaded by the upload route")
+    parser.add_argument("--upload-pages", type=int, default=5)
+    parser.add_argument("--builds", type=int, default=3, help="index builds for the build route")
+    parser.add_argument("--base-url", default=None, help="use a running backend instead of starting one")
+    parser.add_argument("--no-cache", action="store_true", help="disable the LLM, web, arXiv and embedding caches")
+    parser.add_argument("--groq-ms", type=float, default=500)
+    parser.add_argument("--serpapi-ms", type=float, default=300)
+    parser.add_argument("--arxiv-ms", type=float, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for servers to start")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="nebula_load_")
+    procs = []
+    try:
+        stub_port = free_port()
+        stub_url = f"http://127.0.0.1:{stub_port}"
+        env = dict(
+            os.environ,
+            GROQ_API_KEY="stub",
+            SERPAPI_KEY="stub",
+            GROQ_BASE_URL=f"{stub_url}/openai/v1",
+            SERPAPI_BASE_URL=stub_url,
+            ARXIV_API_URL=f"{stub_url}/api/query",
+            SAMPLE_PDFS_DIR=os.path.join(workdir, "pdfs"),
+            RAG_INDEX_DIR=os.path.join(workdir, "rag_index"),
+            CACHE_DIR=os.path.join(workdir, "cache"),
+            LOGS_DIR=os.path.join(workdir, "logs"),
+        )
+        if args.no_cache:
+            env.update(LLM_CACHE_ENABLED="0", WEB_CACHE_ENABLED="0", ARXIV_CACHE_TTL_S="0", EMB_CACHE_ENABLED="0")
+        shutil.copytree(os.path.join(ROOT, "sample_pdfs"), env["SAMPLE_PDFS_DIR"])
+        os.environ.update(env)
+
+        base_url = args.base_url
+        if base_url is None:
+            procs.append(subprocess.Popen([
+                sys.executable, os.path.join(ROOT, "benchmarks", "stubs.py"), "--port", str(stub_port),
+                "--groq-ms", str(args.groq_ms), "--serpapi-ms", str(args.serpapi_ms),
+                "--arxiv-ms", str(args.arxiv_ms), "--error-rate", str(args.error_rate),
+            ], cwd=ROOT, env=env))
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+                cwd=ROOT, env=env,
+            ))
+            wait_for(f"{stub_url}/openai/v1/models", args.timeout)
+            wait_for(f"{base_url}/health", args.timeout, lambda body: body.get("warm"))
+
+        results = []
+        # every fifth /ask targets an uploaded PDF; only possible when the backend shares our scratch dir
+        pdf_path = None
+        if args.base_url is None:
+            pdf_path = os.path.join(env["SAMPLE_PDFS_DIR"], sorted(os.listdir(env["SAMPLE_PDFS_DIR"]))[0])
+        if "upload" in routes:
+            results.append(bench_upload(base_url, args.uploads, args.concurrency, workdir, args.upload_pages))
+        if "ask" in routes:
+            results.append(bench_ask(base_url, args.requests, args.concurrency, pdf_path))
+        if "build" in routes:
+            results.append(bench_build(args.builds, min(args.concurrency, args.builds)))
+
+        print_table(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"args": vars(args), "results": results}, f, indent=2)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Local stand-ins for the external APIs, for offline load tests.
+
+Replays the recorded responses in benchmarks/fixtures with configurable
+latency and error injection:
+
+  * Groq:     POST /openai/v1/chat/completions (JSON or SSE when "stream": true), GET /openai/v1/models
+  * SerpAPI:  GET /search
+  * arXiv:    GET /api/query (Atom feed, honours start / max_results)
+
+    python benchmarks/stubs.py --port 9100 --groq-ms 800 --serpapi-ms 300 --arxiv-ms 400 --error-rate 0.01
+
+Point the backend at it with
+    GROQ_BASE_URL=http://127.0.0.1:9100/openai/v1 SERPAPI_BASE_URL=http://127.0.0.1:9100
+    ARXIV_API_URL=http://127.0.0.1:9100/api/query GROQ_API_KEY=stub SERPAPI_KEY=stub
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _load(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class StubSettings:
+    """Mean latency per service (ms), relative jitter, error probability and status."""
+
+    def __init__(self, groq_ms: float = 0, serpapi_ms: float = 0, arxiv_ms: float = 0, token_ms: float = 0,
+                 jitter: float = 0.2, error_rate: float = 0.0, error_status: int = 503, seed: int = None):
+        self.latency_ms = {"groq": groq_ms, "serpapi": serpapi_ms, "arxiv": arxiv_ms}
+        self.token_ms = token_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+
+    async def delay(self, service: str):
+        mean = self.latency_ms[service]
+        if mean > 0:
+            await asyncio.sleep(max(0.0, self.rng.gauss(mean, mean * self.jitter)) / 1000)
+
+    def fail(self) -> bool:
+        return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+
+def create_app(settings: StubSettings = None) -> FastAPI:
+    settings = settings or StubSettings()
+    app = FastAPI(title="External API stubs")
+
+    chat = json.loads(_load("groq_chat.json"))
+    search = json.loads(_load("serpapi_search.json"))
+    feed = _load("arxiv_query.xml")
+    entries = re.findall(r"  <entry>.*?</entry>\n", feed, flags=re.S)
+    feed_head = feed[:feed.index("  <entry>")]
+    feed_tail = "</feed>\n"
+
+    def error(service: str) -> Response:
+        return JSONResponse({"error": {"message": f"injected {service} failure"}}, status_code=settings.error_status)
+
+    @app.get("/openai/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": chat["model"], "object": "model"}]}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        await settings.delay("groq")
+        if settings.fail():
+            return error("groq")
+        if not payload.get("stream"):
+            return chat
+
+        words = chat["choices"][0]["message"]["content"].split(" ")
+
+        async def events():
+            for i, word in enumerate(words):
+                delta = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+                yield f"data: {json.dumps(delta)}\n\n"
+                if settings.token_ms:
+                    await asyncio.sleep(settings.token_ms / 1000)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/search")
+    async def serpapi_search(q: str = "", num: int = 10):
+        await settings.delay("serpapi")
+        if settings.fail():
+            return error("serpapi")
+        body = dict(search)
+        body["search_parameters"] = {**search["search_parameters"], "q": q}
+        body["organic_results"] = search["organic_results"][:num]
+        return body
+
+    @app.get("/api/query")
+    async def arxiv_query(start: int = 0, max_results: int = 10):
+        await settings.delay("arxiv")
+        if settings.fail():
+            return Response("Service Unavailable", status_code=settings.error_status)
+        page = entries[start:start + max_results]
+        return Response(feed_head + "".join(page) + feed_tail, media_type="application/atom+xml")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--groq-ms", type=float, default=0, help="mean Groq latency (ms)")
+    parser.add_argument("--serpapi-ms", type=float, default=0, help="mean SerpAPI latency (ms)")
+    parser.add_argument("--arxiv-ms", type=float, default=0, help="mean arXiv latency (ms)")
+    parser.add_argument("--token-ms", type=float, default=0, help="delay between streamed Groq tokens (ms)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency std-dev as a fraction of the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of an injected error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        groq_ms=args.groq_ms,
+        serpapi_ms=args.serpapi_ms,
+        arxiv_ms=args.arxiv_ms,
+        token_ms=args.token_ms,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
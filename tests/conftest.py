@@ -0,0 +1,51 @@
+import hashlib
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# keep indexes, caches and logs written by the tests out of the working tree
+_TMP = tempfile.mkdtemp(prefix="nebula-tests-")
+for var in ("RAG_INDEX_DIR", "SAMPLE_PDFS_DIR", "LOGS_DIR", "CACHE_DIR"):
+    os.environ.setdefault(var, os.path.join(_TMP, var.lower()))
+    os.makedirs(os.environ[var], exist_ok=True)
+
+import fitz  # noqa: E402
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+
+class StubModel:
+    """Deterministic 16-d embeddings, so the tests need no model download."""
+
+    def encode(self, texts, **kwargs):
+        return np.stack([
+            np.random.default_rng(int(hashlib.sha1(t.encode()).hexdigest()[:16], 16)).standard_normal(16)
+            for t in texts
+        ]).astype("float32")
+
+    def get_sentence_embedding_dimension(self):
+        return 16
+
+
+def write_pdf(path, *pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def rag():
+    """backend.pdf_rag_agent with the stub embedding model and in-process PDF extraction."""
+    import backend.pdf_rag_agent as rag
+
+    mp = pytest.MonkeyPatch()
+    mp.setattr(rag.EMB_MODEL, "get", lambda: StubModel())
+    mp.setattr(rag, "RAG_BUILD_WORKERS", 1)
+    yield rag
+    mp.undo()
@@ -0,0 +1,24 @@
+import asyncio
+from types import SimpleNamespace
+
+from backend import controller_agent
+
+
+def _collect(gen):
+    async def run():
+        return [item async for item in gen]
+    return asyncio.run(run())
+
+
+def test_batch_reports_corpus_index_build(monkeypatch):
+    monkeypatch.setattr(controller_agent, "ensure_index", lambda: SimpleNamespace(id="job123"))
+
+    def no_answers(*args, **kwargs):
+        raise AssertionError("must not answer from an index that is not built")
+    monkeypatch.setattr(controller_agent, "query_rag_batch", no_answers)
+    monkeypatch.setattr(controller_agent, "agenerate_summary", no_answers)
+
+    items = _collect(controller_agent.astream_batch(["what is RAG?", "who wrote it?"]))
+    assert [it["index"] for it in items[:-1]] == [0, 1]
+    assert all(it["indexing_job"] == "job123" and "job123" in it["answer"] for it in items[:-1])
+    assert items[-1] == {"done": True, "trace_id": None, "indexing_job": "job123"}
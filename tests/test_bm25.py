@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+from backend.utils.bm25 import BM25Index, rrf, tokenize
+
+DOCS = {
+    1: "The cache returns error E-1042 when the cache file is corrupt.",
+    2: "Gradient descent updates the weights.",
+    3: "Error handling for the cache layer.",
+    4: "Gradient noise and gradient clipping.",
+}
+
+
+def _index(docs=DOCS):
+    idx = BM25Index(k1=1.2, b=0.75)
+    for vid, text in docs.items():
+        idx.add(vid, text)
+    return idx
+
+
+def test_joined_forms_are_indexed_whole_and_by_parts():
+    assert tokenize("Error E-1042 in v2.1") == ["error", "e-1042", "e", "1042", "in", "v2.1", "v2", "1"]
+
+
+def test_postings_and_scores_match_okapi_bm25():
+    idx = _index()
+    assert idx.stats() == {"chunks": 4, "terms": len({t for d in DOCS.values() for t in tokenize(d)}),
+                           "postings": sum(len(set(tokenize(d))) for d in DOCS.values())}
+
+    ids, scores = idx.search("gradient", 10)
+    lens = {vid: len(tokenize(text)) for vid, text in DOCS.items()}
+    avg = sum(lens.values()) / len(lens)
+    idf = math.log1p((4 - 2 + 0.5) / (2 + 0.5))
+
+    def bm25(tf, n):
+        return idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * n / avg))
+
+    assert ids.tolist() == [4, 2]
+    np.testing.assert_allclose(scores, [bm25(2, lens[4]), bm25(1, lens[2])], rtol=1e-5)
+
+
+def test_allowed_ids_restrict_search():
+    idx = _index()
+    assert idx.search("cache", 10)[0].tolist() == [1, 3]
+    assert idx.search("cache", 10, allowed=np.array([3, 4]))[0].tolist() == [3]
+    assert idx.search("e-1042", 10)[0].tolist() == [1]
+    assert idx.search("unknown words", 10)[0].tolist() == []
+
+
+def test_removed_and_replaced_chunks_leave_no_postings(tmp_path):
+    idx = _index()
+    idx.stats()  # compact the initial postings
+    idx.remove(1)
+    idx.add(3, "Completely rewritten text about orbits.")
+    assert idx.search("cache", 10)[0].tolist() == []
+    assert idx.search("orbits", 10)[0].tolist() == [3]
+    assert len(idx) == 3
+    # terms whose postings all went away are dropped from the vocabulary
+    assert not idx.matches("e-1042")
+
+    idx.save(tmp_path / "bm25.npz")
+    loaded = BM25Index.load(tmp_path / "bm25.npz", 1.2, 0.75)
+    assert loaded.stats() == idx.stats()
+    for query in ("gradient", "orbits", "the weights"):
+        a, b = loaded.search(query, 10), idx.search(query, 10)
+        assert a[0].tolist() == b[0].tolist()
+        np.testing.assert_allclose(a[1], b[1])
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    dense = np.array([10, 20, 30])
+    lexical = np.array([30, 40, 10])
+    ids, scores = rrf([dense, lexical], k=3)
+    # 10: ranks 1 and 3; 30: ranks 3 and 1; 20 and 40 appear once
+    assert set(ids[:2].tolist()) == {10, 30} and ids[2] in (20, 40)
+    np.testing.assert_allclose(scores[0], 1 / 61 + 1 / 63, rtol=1e-6)
+    assert rrf([np.array([], dtype="int64")], k=5)[0].tolist() == []
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from backend.utils.chunk_store import ChunkTable, doc_index, read_header, store_paths, write_header
+
+
+def _save(table, prefix: Path, docs):
+    header_path, rows_path, text_path = store_paths(prefix)
+    table.save(rows_path, text_path, doc_index(docs))
+    write_header(header_path, docs, next_id=100, extra={"generation": 1})
+    header = read_header(header_path)
+    return ChunkTable.open(rows_path, text_path, [(d["doc_id"], d["source"]) for d in header["docs"]]), header
+
+
+def test_round_trip_and_edits(tmp_path):
+    docs = {"docA": {"source": "a.pdf", "path": "/a.pdf"}, "docB": {"source": "b.pdf", "path": None}}
+    table = ChunkTable()
+    table.add(5, "späte Grüße ✓", {"source": "a.pdf", "chunk_id": 0, "doc_id": "docA", "page_start": 1, "page_end": 2})
+    table.add(2, "second doc", {"source": "b.pdf", "chunk_id": 0, "doc_id": "docB"})
+    table.add(9, "more of a", {"source": "a.pdf", "chunk_id": 1, "doc_id": "docA", "page_start": 3, "page_end": 3})
+
+    loaded, header = _save(table, tmp_path / "idx", docs)
+    assert header["next_id"] == 100 and header["generation"] == 1
+    assert [d["doc_id"] for d in header["docs"]] == ["docA", "docB"]
+    assert "ids" not in header["docs"][0]
+    assert len(loaded) == 3 and 5 in loaded and 7 not in loaded
+    assert list(loaded.items()) == [(2, "second doc"), (5, "späte Grüße ✓"), (9, "more of a")]
+    assert loaded.meta(5) == {"source": "a.pdf", "chunk_id": 0, "doc_id": "docA", "page_start": 1, "page_end": 2}
+    assert loaded.meta(2) == {"source": "b.pdf", "chunk_id": 0, "doc_id": "docB"}
+    assert {k: v.tolist() for k, v in loaded.doc_ids().items()} == {"docA": [5, 9], "docB": [2]}
+
+    # edits stay in memory until saved; docA is dropped, so docB moves to position 0
+    loaded.remove(5)
+    loaded.remove(9)
+    loaded.add(7, "new doc", {"source": "c.pdf", "chunk_id": 0, "doc_id": "docC"})
+    assert list(loaded.items()) == [(2, "second doc"), (7, "new doc")]
+    assert 5 not in loaded and len(loaded) == 2
+
+    docs = {"docB": docs["docB"], "docC": {"source": "c.pdf", "path": "/c.pdf"}}
+    reloaded, _ = _save(loaded, tmp_path / "idx2", docs)
+    assert list(reloaded.items()) == [(2, "second doc"), (7, "new doc")]
+    assert reloaded.meta(2)["doc_id"] == "docB" and reloaded.meta(7)["doc_id"] == "docC"
+    assert {k: v.tolist() for k, v in reloaded.doc_ids().items()} == {"docB": [2], "docC": [7]}
+
+
+def test_empty_table_round_trip(tmp_path):
+    loaded, header = _save(ChunkTable(), tmp_path / "idx", {})
+    assert len(loaded) == 0 and list(loaded.items()) == [] and loaded.doc_ids() == {}
+    assert header["docs"] == []
+
+
+def test_unknown_format_version_is_rejected(tmp_path):
+    path = tmp_path / "idx_meta.json"
+    path.write_text('{"version": 99, "docs": [], "next_id": 0}')
+    with pytest.raises(ValueError):
+        read_header(path)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from backend.utils.context_builder import build_context, estimate_tokens, merge_adjacent
+
+
+def _result(doc, chunk_id, text, score=1.0):
+    return {"text": text, "score": score, "meta": {"source": f"{doc}.pdf", "doc_id": doc, "chunk_id": chunk_id}}
+
+
+def _words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_context_stays_within_the_token_budget():
+    results = [_result(f"d{i}", 0, _words(f"w{i}_", 80)) for i in range(10)]
+    for budget in (100, 250, 600):
+        context, stats = build_context(None, results, None, budget, min_tail_tokens=32)
+        assert estimate_tokens(context) <= budget
+        assert stats["tokens_after"] == estimate_tokens(context) and 0 < stats["selected"] < 10
+
+    # a passage that does not fit whole is cut rather than dropped
+    context, stats = build_context(None, results, None, 100, min_tail_tokens=32)
+    assert stats["selected"] == 1 and context.endswith(" ...\n")
+    assert context.split("\n")[1].split()[:3] == ["w0_0", "w0_1", "w0_2"]
+
+
+def test_no_truncated_tail_below_min_tail_tokens():
+    results = [_result("a", 0, _words("a", 60)), _result("b", 0, _words("b", 60))]
+    first, _ = build_context(None, results[:1], None, 10_000)
+    budget = estimate_tokens(first) + 20
+    context, stats = build_context(None, results, None, budget, min_tail_tokens=64)
+    assert context == first and stats["selected"] == 1
+
+
+def test_everything_fits_in_a_large_budget():
+    results = [_result("a", 0, "alpha beta"), _result("b", 3, "gamma delta")]
+    context, stats = build_context(None, results, None, 10_000)
+    assert stats["selected"] == 2 and "..." not in context
+    assert context.index("alpha beta") < context.index("gamma delta")
+
+
+def test_neighbouring_chunks_merge_without_their_overlap():
+    first = _words("x", 10)
+    second = " ".join(first.split()[-3:]) + " " + _words("y", 5)
+    passages = merge_adjacent([_result("a", 1, second, 0.5), _result("a", 0, first, 0.9), _result("b", 0, "other")])
+    assert len(passages) == 2
+    merged = passages[0]
+    assert merged["text"] == first + " " + _words("y", 5)
+    assert merged["chunk_ids"] == [0, 1] and merged["rank"] == 0 and sorted(merged["ranks"]) == [0, 1]
+
+
+def test_mmr_prefers_diverse_passages():
+    results = [_result("a", 0, "one"), _result("b", 0, "two"), _result("c", 0, "three")]
+    query = np.array([1.0, 0.0, 0.0])
+    # b duplicates a; c is less relevant but different
+    vecs = np.array([[1.0, 0.1, 0.0], [1.0, 0.1, 0.0], [0.6, 0.0, 0.8]])
+    context, _ = build_context(query, results, vecs, 10_000, lam=0.5)
+    assert context.index("three") < context.index("two")
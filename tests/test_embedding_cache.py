@@ -0,0 +1,44 @@
+import numpy as np
+
+from backend.utils.embedding_cache import EmbeddingCache
+
+DIM = 4
+
+
+def _vecs(texts):
+    return np.asarray([[len(t), i, 0, 1] for i, t in enumerate(texts)], dtype="float32")
+
+
+def _present(cache, texts):
+    _, missing = cache.get_many(texts)
+    return [t for i, t in enumerate(texts) if i not in missing]
+
+
+def test_least_recently_used_entries_are_evicted_at_the_limit(tmp_path):
+    cache = EmbeddingCache("test/model", DIM, root=str(tmp_path), max_entries=10)
+    old = [f"old {i}" for i in range(8)]
+    cache.put_many(old, _vecs(old))
+    # touch the first half; the rest becomes least recently used
+    assert _present(cache, old[:4]) == old[:4]
+
+    new = [f"new {i}" for i in range(5)]
+    cache.put_many(new, _vecs(new))
+    # 2 free rows for 5 new entries: 3 evicted plus 10% of the limit
+    assert cache.stats()["evictions"] == 4
+    assert cache.stats()["entries"] == 9
+    assert _present(cache, old) == old[:4]
+    vectors, missing = cache.get_many(new)
+    assert missing == [] and np.array_equal(vectors, _vecs(new))
+
+
+def test_entries_survive_a_reopen(tmp_path):
+    texts = ["alpha", "beta"]
+    cache = EmbeddingCache("m", DIM, root=str(tmp_path), max_entries=10)
+    cache.put_many(texts, _vecs(texts))
+    cache.flush()
+
+    reopened = EmbeddingCache("m", DIM, root=str(tmp_path), max_entries=10)
+    vectors, missing = reopened.get_many(texts + ["gamma"])
+    assert missing == [2] and np.array_equal(vectors[:2], _vecs(texts))
+    # a different dimension means a different model: the cache starts empty
+    assert EmbeddingCache("m", DIM + 1, root=str(tmp_path)).stats()["entries"] == 0
@@ -0,0 +1,51 @@
+import faiss
+import numpy as np
+import pytest
+
+import backend.pdf_rag_agent as rag
+
+DIM = 32
+
+
+def _vectors(n, seed):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype("float32")
+
+
+def _self_retrieved(index, vectors, ids, k):
+    _, found = index.search(vectors, k, params=rag.search_params(index))
+    return [vid for vid, row in zip(ids.tolist(), found) if vid not in row[:k]]
+
+
+def _check_remove_readd(index, k):
+    first, second = _vectors(600, 0), _vectors(300, 1)
+    first_ids, second_ids = np.arange(600, dtype="int64"), np.arange(600, 900, dtype="int64")
+    if not index.is_trained:
+        index.train(first)
+    index.add_with_ids(first, first_ids)
+
+    # drop a block from the middle, then add new vectors under fresh ids
+    index, removed = rag._remove_ids(index, np.arange(100, 300, dtype="int64"))
+    assert removed == 200
+    index.add_with_ids(second, second_ids)
+
+    kept = np.r_[first_ids[:100], first_ids[300:]]
+    assert index.ntotal == len(kept) + len(second_ids)
+    assert _self_retrieved(index, first[kept], kept, k) == []
+    assert _self_retrieved(index, second, second_ids, k) == []
+    _, found = index.search(first[100:300], k, params=rag.search_params(index))
+    assert not np.isin(found, np.arange(100, 300)).any()
+
+
+@pytest.mark.parametrize("index_type", rag.INDEX_TYPES)
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_remove_then_readd_keeps_ids_valid(index_type, dtype):
+    index = rag.make_index(DIM, index_type, n_train=600, vector_dtype=dtype)
+    # PQ codes are lossy: the vector itself only has to be among the nearest few
+    _check_remove_readd(index, 10 if index_type == "ivf_pq" else 1)
+
+
+def test_id_mapped_ivf_of_older_builds_is_rebuilt_on_removal():
+    ivf = faiss.IndexIVFFlat(faiss.IndexFlatL2(DIM), DIM, 8)
+    ivf.nprobe = 8
+    index = faiss.IndexIDMap2(ivf)
+    _check_remove_readd(index, 1)
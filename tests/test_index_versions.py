@@ -0,0 +1,76 @@
+import pytest
+
+from conftest import write_pdf
+
+
+@pytest.fixture
+def index(rag, tmp_path):
+    name = f"test_versions_{tmp_path.name}"
+    paths = [write_pdf(tmp_path / f"{i}.pdf", f"Document {i} about topic {i}.") for i in range(3)]
+    rag.build_or_update_index(paths[:2], index_name=name)
+    yield name, paths
+    rag.INDEX_REGISTRY.invalidate(name)
+
+
+def _generations_on_disk(rag, name):
+    return sorted({gen for gen, _ in rag._version_files(name)})
+
+
+def test_each_write_publishes_a_new_version_and_drops_old_ones(rag, index, monkeypatch):
+    monkeypatch.setattr(rag, "RAG_INDEX_KEEP_VERSIONS", 2)
+    name, paths = index
+    assert rag._current_generation(name) == 1
+
+    rag.add_documents(paths[2:], index_name=name)
+    assert rag._current_generation(name) == 2
+    assert _generations_on_disk(rag, name) == [1, 2]
+
+    doc_id = rag.hash_file(paths[0])
+    assert rag.remove_document(doc_id, index_name=name) > 0
+    assert rag._current_generation(name) == 3
+    # the previous version stays for readers still opening it; older ones are gone
+    assert _generations_on_disk(rag, name) == [2, 3]
+    assert not list(rag._version_prefix(name, 1).parent.glob(f"{name}.v1*"))
+
+    index, meta = rag.load_index(name)
+    assert meta["generation"] == 3 and doc_id not in meta["docs"] and len(meta["docs"]) == 2
+    assert index.ntotal == len(meta["chunks"])
+
+
+def test_readers_keep_their_version_until_the_next_query(rag, index, monkeypatch):
+    name, paths = index
+    old_index, old_meta = rag.INDEX_REGISTRY.get(name)
+    assert old_meta["generation"] == 1
+
+    # publish as another worker process would: this process's registry is not told
+    doc_id = rag.hash_file(paths[1])
+    with monkeypatch.context() as m:
+        m.setattr(rag.INDEX_REGISTRY, "invalidate", lambda index_name=None: None)
+        rag.remove_document(doc_id, index_name=name)
+
+    # an index loaded earlier is untouched and still searchable
+    assert old_index.ntotal == len(old_meta["chunks"]) and doc_id in old_meta["docs"]
+    # the next lookup sees the files changed and loads the new version
+    new_index, new_meta = rag.INDEX_REGISTRY.get(name)
+    assert new_meta["generation"] == 2 and doc_id not in new_meta["docs"]
+    assert new_index.ntotal == old_index.ntotal - len(old_meta["docs"][doc_id]["ids"])
+
+
+def test_interrupted_writes_are_never_visible(rag, index, monkeypatch):
+    name, paths = index
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    # the new version's files are written but the header switch fails
+    monkeypatch.setattr(rag, "_publish", crash)
+    with pytest.raises(OSError):
+        rag.add_documents(paths[2:], index_name=name)
+    monkeypatch.undo()
+
+    rag.INDEX_REGISTRY.invalidate(name)
+    index, meta = rag.INDEX_REGISTRY.get(name)
+    assert meta["generation"] == 1 and len(meta["docs"]) == 2
+    # the next write reuses the generation number and succeeds
+    rag.add_documents(paths[2:], index_name=name)
+    assert rag.load_index(name)[1]["generation"] == 2
@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import write_pdf
+
+
+def _pdf(tmp_path, name, n_pages):
+    pages = [f"{name} page {p}. " + " ".join(f"{name}-{p}-{w}" for w in range(12)) + "." for p in range(n_pages)]
+    return write_pdf(tmp_path / f"{name}.pdf", *pages)
+
+
+def _misses(rag, name):
+    """Chunks whose own text does not retrieve them (or an identical chunk) first."""
+    _, meta = rag.INDEX_REGISTRY.get(name)
+    misses = []
+    for vid, text in meta["chunks"].items():
+        results = rag.query_rag(text, top_k=1, index_name=name, mode="dense")["results"]
+        if not results or results[0]["text"] != text:
+            misses.append(vid)
+    return misses
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat", "ivf_pq"])
+def test_add_remove_readd_keeps_every_chunk_retrievable(rag, tmp_path, monkeypatch, index_type):
+    monkeypatch.setattr(rag, "RAG_INDEX_TYPE", index_type)
+    monkeypatch.setattr(rag, "RAG_IVF_NLIST", 4)
+    monkeypatch.setattr(rag, "RAG_PQ_M", 4)
+    monkeypatch.setattr(rag, "RAG_CHUNK_WORDS", 10)
+    monkeypatch.setattr(rag, "RAG_CHUNK_OVERLAP", 0)
+    name = f"test_ingest_{index_type}"
+    a, b, c = (_pdf(tmp_path, n, 20) for n in ("alpha", "beta", "gamma"))
+
+    rag.build_or_update_index([a, b], index_name=name)
+    doc_a, doc_b = rag.hash_file(a), rag.hash_file(b)
+    # already indexed documents are skipped
+    assert rag.add_documents([a], index_name=name)["added"] == []
+
+    removed = rag.remove_document(doc_a, index_name=name)
+    assert removed > 0
+    rag.add_documents([c], index_name=name)
+    rag.add_documents([a], index_name=name)
+
+    index, meta = rag.INDEX_REGISTRY.get(name)
+    assert set(meta["docs"]) == {doc_a, doc_b, rag.hash_file(c)}
+    assert index.ntotal == len(meta["chunks"]) == sum(len(d["ids"]) for d in meta["docs"].values())
+    assert len(meta["docs"][doc_a]["ids"]) == removed
+    assert _misses(rag, name) == []
+    rag.INDEX_REGISTRY.invalidate(name)
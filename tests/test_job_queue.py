@@ -0,0 +1,99 @@
+import threading
+
+from backend.utils import job_queue
+from backend.utils.job_queue import JobQueue
+from backend.utils.job_store import JobStore
+from backend.utils.lazy import Lazy
+
+
+def _store(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    return Lazy(lambda: JobStore(path, 100))
+
+
+def test_job_state_is_visible_to_other_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "PROGRESS_SAVE_INTERVAL_S", 0)
+    # two queues with their own store connections stand in for two worker processes
+    worker_a, worker_b = JobQueue("a", 1, store=_store(tmp_path)), JobQueue("b", 1, store=_store(tmp_path))
+    advanced, release = threading.Event(), threading.Event()
+
+    def run(job):
+        job.advance(pages=3)
+        advanced.set()
+        release.wait(5)
+        return {"doc_id": "abc"}
+
+    job = worker_a.submit("ingest", run, key="idx:abc", path="x.pdf")
+    assert worker_b.get(job.id) is None
+    assert advanced.wait(5)
+    seen = worker_b.status(job.id)
+    assert seen["status"] == "running" and seen["progress"] == {"pages": 3}
+    assert seen["params"] == {"path": "x.pdf"}
+
+    release.set()
+    assert job.wait(5)
+    seen = worker_b.status(job.id)
+    assert seen["status"] == "done" and seen["result"] == {"doc_id": "abc"}
+    assert worker_b.recent()[0]["id"] == job.id
+    assert worker_b.stats() == {"done": 1}
+    assert worker_b.status("missing") is None
+
+
+def test_same_key_is_deduplicated_while_active():
+    queue = JobQueue("t", 2)
+    release = threading.Event()
+    first = queue.submit("ingest", lambda job: release.wait(5), key="idx:doc")
+    assert queue.submit("ingest", lambda job: None, key="idx:doc") is first
+    assert queue.active("idx:doc") is first
+    other = queue.submit("ingest", lambda job: None, key="idx:other")
+    assert other is not first
+
+    release.set()
+    assert first.wait(5) and other.wait(5)
+    assert queue.active("idx:doc") is None
+    # once finished, the same key queues a new job
+    again = queue.submit("ingest", lambda job: None, key="idx:doc")
+    assert again is not first and again.wait(5)
+
+
+def test_progress_counters_and_failures():
+    queue = JobQueue("t", 1)
+
+    def run(job):
+        for _ in range(3):
+            job.advance(pages=2, chunks=5)
+        job.advance(documents=1)
+        return "ok"
+
+    job = queue.submit("ingest", run)
+    assert job.wait(5)
+    state = queue.status(job.id)
+    assert state["status"] == "done" and state["result"] == "ok"
+    assert state["progress"] == {"pages": 6, "chunks": 15, "documents": 1}
+    assert state["started"] <= state["finished"]
+
+    def fail(job):
+        job.advance(pages=1)
+        raise RuntimeError("bad pdf")
+
+    failed = queue.submit("ingest", fail, key="k")
+    assert failed.wait(5)
+    assert failed.status == "failed" and failed.error == "bad pdf" and failed.progress == {"pages": 1}
+    assert queue.active("k") is None
+    assert queue.stats() == {"done": 1, "failed": 1}
+
+
+def test_history_drops_the_oldest_finished_jobs():
+    queue = JobQueue("t", 1, max_history=2)
+    release = threading.Event()
+    blocked = queue.submit("ingest", lambda job: release.wait(5))
+    # queued behind the blocked job: still active, so nothing can be dropped yet
+    queued = [queue.submit("ingest", lambda job: None) for _ in range(3)]
+    assert len(queue.recent()) == 4
+    release.set()
+    for job in [blocked, *queued]:
+        assert job.wait(5)
+    last = queue.submit("ingest", lambda job: None)
+    assert last.wait(5)
+    assert [j["id"] for j in queue.recent()] == [last.id, queued[2].id]
+    assert queue.get(blocked.id) is None
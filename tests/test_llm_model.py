@@ -0,0 +1,50 @@
+import asyncio
+import re
+
+from backend.utils import llm_model, metrics
+
+
+def _groq_errors() -> float:
+    m = re.search(r'^nebula_stage_errors_total\{stage="groq"\} (\S+)$', metrics.render(), re.M)
+    return float(m.group(1)) if m else 0.0
+
+
+def _down(*args, **kwargs):
+    raise ConnectionError("groq is down")
+
+
+def test_every_groq_failure_is_counted(monkeypatch):
+    monkeypatch.setattr(llm_model, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(llm_model, "_cache_get", lambda query, context: None)
+    monkeypatch.setattr(llm_model, "get_session", _down)
+    monkeypatch.setattr(llm_model, "get_async_client", _down)
+
+    async def stream():
+        return [t async for t in llm_model.astream_summary("q", "ctx")]
+
+    before = _groq_errors()
+    assert "groq is down" in llm_model.generate_summary("q", "ctx")
+    assert "groq is down" in asyncio.run(llm_model.agenerate_summary("q", "ctx"))
+    assert "groq is down" in asyncio.run(stream())[0]
+    assert _groq_errors() == before + 3
+
+
+def test_malformed_groq_response_is_counted(monkeypatch):
+    class Response:
+        status_code = 200
+        text = "<html>"
+
+        def json(self):
+            raise ValueError("not JSON")
+
+    class Session:
+        def post(self, *args, **kwargs):
+            return Response()
+
+    monkeypatch.setattr(llm_model, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(llm_model, "_cache_get", lambda query, context: None)
+    monkeypatch.setattr(llm_model, "get_session", lambda: Session())
+
+    before = _groq_errors()
+    assert "not JSON" in llm_model.generate_summary("q", "ctx")
+    assert _groq_errors() == before + 1
@@ -0,0 +1,25 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "LOGS_DIR", str(tmp_path))
+    for name in ("app.log", "app.log.2", "traces.sqlite", "traces.sqlite-wal", "traces.sqlite-shm", "notes.txt"):
+        (tmp_path / name).write_text(name)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("name", ["app.log", "app.log.2"])
+def test_log_files_are_served(client, name):
+    resp = client.get(f"/logs/{name}")
+    assert resp.status_code == 200 and resp.text == name
+
+
+@pytest.mark.parametrize("name", [
+    "traces.sqlite", "traces.sqlite-wal", "traces.sqlite-shm", "notes.txt", "app.log.x", "..%2Fapp.log",
+])
+def test_other_files_are_not_served(client, name):
+    assert client.get(f"/logs/{name}").status_code == 404
@@ -0,0 +1,64 @@
+import pytest
+
+from backend.utils.bm25 import is_keyword_query
+from conftest import write_pdf
+
+
+@pytest.fixture(scope="module")
+def index(rag, tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("pdfs")
+    paths = [
+        write_pdf(tmp / "a.pdf", "Gradient descent updates the weights of the network."),
+        write_pdf(tmp / "b.pdf", "Error E-1042 is raised when the cache file is corrupt."),
+    ]
+    rag.build_or_update_index(paths, index_name="test_retrieval")
+    yield "test_retrieval", [rag.hash_file(p) for p in paths]
+    rag.INDEX_REGISTRY.invalidate("test_retrieval")
+
+
+def test_summary_requests_are_not_keyword_queries():
+    assert not is_keyword_query("Summarize this PDF", 4)
+    assert not is_keyword_query("summary please", 4)
+    assert not is_keyword_query("transformers", 4)
+    assert is_keyword_query("E-1042", 4)
+    assert is_keyword_query("GPT-4 pricing", 4)
+
+
+def test_summary_query_scoped_to_doc_returns_chunks(rag, index):
+    name, (doc_a, _) = index
+    for query in ("summarize this", "Summarize this PDF", "summary please"):
+        out = rag.query_rag(query, index_name=name, doc_id=doc_a, mode="auto")
+        assert out["mode"] != "lexical"
+        assert out["results"]
+        assert {r["meta"]["doc_id"] for r in out["results"]} == {doc_a}
+
+
+def test_keyword_query_goes_lexical_when_it_matches(rag, index):
+    name, (_, doc_b) = index
+    out = rag.query_rag("E-1042", index_name=name, mode="auto")
+    assert out["mode"] == "lexical"
+    assert out["query_vec"] is None
+    assert [r["meta"]["doc_id"] for r in out["results"]] == [doc_b]
+
+
+def test_keyword_query_outside_scope_falls_back_to_vectors(rag, index):
+    name, (doc_a, _) = index
+    # the term exists in the corpus, but not in the document the query is scoped to
+    out = rag.query_rag("E-1042", index_name=name, doc_id=doc_a, mode="auto")
+    assert out["mode"] != "lexical"
+    assert out["results"]
+
+    # forcing lexical mode still falls back when BM25 has no match in scope
+    out = rag.query_rag("E-1042", index_name=name, doc_id=doc_a, mode="lexical")
+    assert out["mode"] == "dense"
+    assert out["results"]
+
+
+def test_hybrid_fuses_lexical_and_dense_rankings(rag, index):
+    name, (doc_a, doc_b) = index
+    out = rag.query_rag("corrupt cache file E-1042", index_name=name, mode="hybrid")
+    assert out["mode"] == "hybrid"
+    assert out["query_vec"] is not None and len(out["result_vecs"]) == len(out["results"])
+    # the only lexical match leads; dense-only candidates follow
+    assert out["results"][0]["meta"]["doc_id"] == doc_b
+    assert {r["meta"]["doc_id"] for r in out["results"]} == {doc_a, doc_b}
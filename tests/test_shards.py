@@ -0,0 +1,88 @@
+import pytest
+
+from conftest import write_pdf
+
+TOPICS = ["gradient descent", "cache eviction", "protein folding", "tax law", "orbital mechanics", "jazz harmony"]
+
+
+@pytest.fixture
+def index(rag, tmp_path):
+    name = f"test_shards_{tmp_path.name}"
+    paths = [write_pdf(tmp_path / f"{i}.pdf", f"Notes on {t}.", f"More about {t} and its history.")
+             for i, t in enumerate(TOPICS)]
+    rag.build_or_update_index(paths, index_name=name)
+    yield name, paths
+    rag.INDEX_REGISTRY.invalidate(name)
+
+
+def _all_chunks(rag, name):
+    _, meta = rag.load_index(name)
+    return {vid: text for vid, text in meta["chunks"].items()}
+
+
+def test_shards_built_separately_are_published_together(rag, index):
+    name, _ = index
+    chunks = _all_chunks(rag, name)
+    # as separate processes would: no lock, each shard on its own
+    sizes = [rag.build_shard(name, i, 3, "hash") for i in range(3)]
+    assert sum(sizes) == len(chunks)
+    # nothing is visible before the publish
+    assert rag.load_index(name)[1]["generation"] == 1
+
+    assert rag.publish_shards(name, 3, "hash") == 2
+    index, meta = rag.load_index(name)
+    assert len(index.shards) == 3 and index.by == "hash"
+    assert index.ntotal == len(chunks)
+    assert {vid: text for vid, text in meta["chunks"].items()} == chunks
+
+
+def test_shards_of_an_older_version_are_not_published(rag, index, tmp_path):
+    name, _ = index
+    for i in range(2):
+        rag.build_shard(name, i, 2, "doc")
+    rag.add_documents([write_pdf(tmp_path / "new.pdf", "Notes on bird migration.")], index_name=name)
+
+    with pytest.raises(FileNotFoundError):
+        rag.publish_shards(name, 2, "doc")
+    index, _ = rag.load_index(name)
+    assert rag._layout(index) == {"shards": 1}
+
+
+def test_missing_shard_is_not_published(rag, index):
+    name, _ = index
+    rag.build_shard(name, 0, 2, "doc")
+    with pytest.raises(FileNotFoundError):
+        rag.publish_shards(name, 2, "doc")
+    assert rag.load_index(name)[1]["generation"] == 1
+
+
+def _dense_ids(rag, name, queries, doc_id=None):
+    return [[r["id"] for r in rag.query_rag(q, top_k=4, index_name=name, doc_id=doc_id, mode="dense")["results"]]
+            for q in queries]
+
+
+@pytest.mark.parametrize("by", ["doc", "hash"])
+def test_reshard_places_vectors_by_key_and_keeps_results(rag, index, by):
+    from backend.utils.shards import shard_of_ids
+
+    name, paths = index
+    queries = [f"tell me about {t}" for t in TOPICS]
+    doc_id = rag.hash_file(paths[0])
+    before, before_doc = _dense_ids(rag, name, queries), _dense_ids(rag, name, queries[:2], doc_id)
+
+    out = rag.reshard(name, 3, by)
+    index, meta = rag.load_index(name)
+    assert rag._layout(index) == {"shards": 3, "shard_by": by}
+    assert [s.ntotal for s in index.shards] == out["sizes"] and sum(out["sizes"]) == len(meta["chunks"])
+    for doc, entry in meta["docs"].items():
+        for vid in entry["ids"].tolist():
+            home = index.shards_for_doc(doc)[0] if by == "doc" else int(shard_of_ids([vid], 3)[0])
+            index.shards[home].reconstruct(vid)  # raises if the vector is not in its shard
+
+    # exact search over the same vectors: sharding changes where they live, not the results
+    assert _dense_ids(rag, name, queries) == before
+    assert _dense_ids(rag, name, queries[:2], doc_id) == before_doc
+
+    rag.reshard(name, 1)
+    assert rag._layout(rag.load_index(name)[0]) == {"shards": 1}
+    assert _dense_ids(rag, name, queries) == before
@@ -0,0 +1,58 @@
+from backend.utils.trace_store import TraceStore
+
+
+def _store(tmp_path, **kwargs):
+    return TraceStore(str(tmp_path / "traces.sqlite"), kwargs.pop("retention_s", 0), kwargs.pop("max_rows", 0), **kwargs)
+
+
+def _trace(i, agents=("web_search",), source=None):
+    trace = {"input": f"q{i}", "agents_called": list(agents)}
+    if source:
+        trace["documents_retrieved"] = [{"source": source}]
+    return trace
+
+
+def _pages(store, **filters):
+    pages, cursor = [], None
+    while True:
+        page = store.query(limit=3, cursor=cursor, **filters)
+        pages.append([t["input"] for t in page["traces"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_walks_every_trace_once_newest_first(tmp_path):
+    store = _store(tmp_path)
+    ids = [store.put(_trace(i)) for i in range(8)]
+    assert ids == sorted(ids)
+    assert _pages(store) == [["q7", "q6", "q5"], ["q4", "q3", "q2"], ["q1", "q0"]]
+    # an exact multiple of the page size ends without an empty page
+    store.put(_trace(8))
+    assert _pages(store)[-1] == ["q2", "q1", "q0"]
+    # traces added while paging show up on the next walk, not in the middle of this one
+    first = store.query(limit=3)
+    store.put(_trace(9))
+    assert [t["input"] for t in store.query(limit=3, cursor=first["next_cursor"])["traces"]] == ["q5", "q4", "q3"]
+
+
+def test_filters_combine_with_pagination(tmp_path):
+    store = _store(tmp_path)
+    for i in range(10):
+        agents = ("pdf_rag",) if i % 2 else ("web_search", "arxiv")
+        store.put(_trace(i, agents, source="a.pdf" if i % 4 == 1 else None))
+    assert _pages(store, agent="pdf_rag") == [["q9", "q7", "q5"], ["q3", "q1"]]
+    assert _pages(store, source="a.pdf") == [["q9", "q5", "q1"]]
+    assert _pages(store, agent="arxiv", source="a.pdf") == [[]]
+    trace = store.get(store.query(limit=1)["traces"][0]["id"])
+    assert trace["input"] == "q9" and trace["agents_called"] == ["pdf_rag"]
+
+
+def test_compaction_keeps_the_newest_rows(tmp_path):
+    store = _store(tmp_path, max_rows=4, compact_every=1000)
+    for i in range(7):
+        store.put(_trace(i))
+    assert store.compact() == 3
+    assert _pages(store) == [["q6", "q5", "q4"], ["q3"]]
+    assert _pages(store, agent="web_search") == [["q6", "q5", "q4"], ["q3"]]
+    assert store.stats()["traces"] == 4
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from backend.utils.ttl_cache import TTLCache
+
+
+def _cache(tmp_path):
+    return TTLCache("t", str(tmp_path / "cache.db"), ttl_s=60, stale_s=0, max_entries=10)
+
+
+def test_cancelled_leader_does_not_cancel_followers(tmp_path):
+    cache = _cache(tmp_path)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "value", True
+
+    async def main():
+        # the leader's caller misses its deadline while a follower is coalesced on the same key
+        leader = asyncio.create_task(asyncio.wait_for(cache.aget_or_compute("k", compute), timeout=0.01))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.aget_or_compute("k", compute))
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "value"
+    assert calls == 1
+    assert cache.stats()["coalesced"] == 1
+
+
+def test_follower_computes_when_shared_work_is_cancelled(tmp_path):
+    cache = _cache(tmp_path)
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "value", True
+
+    async def main():
+        follower_started = asyncio.Event()
+
+        async def follower():
+            follower_started.set()
+            return await cache.aget_or_compute("k", compute)
+
+        first = asyncio.create_task(cache.aget_or_compute("k", compute))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(follower())
+        await follower_started.wait()
+        await asyncio.sleep(0)
+        for task in list(cache._tasks):
+            task.cancel()  # e.g. the loop shutting the shared computation down
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(main()) == ["value", "value"]
+
+
+def test_sync_and_async_paths_count_the_same(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    sync_cache, async_cache = _cache(tmp_path / "a"), _cache(tmp_path / "b")
+
+    async def acompute():
+        return "value", True
+
+    sync_cache.get_or_compute("k", lambda: ("value", True))
+    sync_cache.get_or_compute("k", lambda: ("value", True))
+
+    async def main():
+        await async_cache.aget_or_compute("k", acompute)
+        await async_cache.aget_or_compute("k", acompute)
+
+    asyncio.run(main())
+    expected = {"entries": 1, "hits": 1, "stale_hits": 0, "misses": 1, "coalesced": 0, "refreshes": 0}
+    assert sync_cache.stats() == async_cache.stats() == expected
@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+
+import pytest
+from starlette.requests import Request
+
+from backend.utils.multipart_upload import UploadTooLarge, receive_file
+
+BOUNDARY = "testboundary"
+
+
+def _request(chunks):
+    """A request whose body arrives in the given chunks, counting how many were read."""
+    sent = {"n": 0}
+    chunks = list(chunks)
+
+    async def receive():
+        i = sent["n"]
+        sent["n"] += 1
+        if i >= len(chunks):
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": chunks[i], "more_body": True}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/upload_pdf",
+        # chunked transfer: no Content-Length
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }
+    return Request(scope, receive), sent
+
+
+def _body(filename, data, field="file"):
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhello\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _split(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def _receive(request, tmp_path, limit=10_000):
+    return asyncio.run(receive_file(request, "file", tmp_path, limit, {".pdf"}, 4096))
+
+
+def test_file_is_streamed_to_disk_and_hashed(tmp_path):
+    data = bytes(range(256)) * 30
+    request, _ = _request(_split(_body("paper.PDF", data), 100))
+    filename, path, digest, size = _receive(request, tmp_path)
+    assert filename == "paper.PDF"
+    assert path.read_bytes() == data
+    assert digest == hashlib.sha256(data).hexdigest() and size == len(data)
+
+
+def test_oversized_chunked_upload_is_cut_off_early(tmp_path):
+    data = b"x" * 10_000_000
+    request, sent = _request(_split(_body("big.pdf", data), 1024))
+    with pytest.raises(UploadTooLarge):
+        _receive(request, tmp_path)
+    # stopped reading right after the limit, not at the end of the 10 MB body
+    assert sent["n"] < 20
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("body", [
+    _body("notes.txt", b"hello"),
+    _body("paper.pdf", b"hello", field="other"),
+    _body("paper.pdf", b"hello")[:-20],
+])
+def test_bad_uploads_are_rejected(tmp_path, body):
+    request, _ = _request(_split(body, 64))
+    with pytest.raises(ValueError):
+        _receive(request, tmp_path)
+    assert list(tmp_path.iterdir()) == []